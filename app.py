@@ -1,14 +1,35 @@
 import os
 import re
 import json
+import math
+import gc
 import time
 import boto3
-import random
 import threading
 from flask_cors import CORS
 from environment import ColorEnv
+from train_worker import TrainingWorker
+from model_store import MODEL_FILENAME, ModelStore, ModelRouter, ModelRegistry
+from dedup import SnapshotIndex
+from filter import filter_rrweb_data
+from ingest_pipeline import stream_ingest
+from memory_budget import (LOW_WATER, MB, SOFT_LIMIT, BatchSizer, MemoryTracker, estimated_json_bytes,
+                           memory_tracking_enabled, stage_budget, tree_rss)
+from training import PPO_PARAMS
+from profiling import ProfilerBusy, run_exclusive, sample_stacks, collapsed_stacks, tracemalloc_top
+from rrweb_replay import REPLAY_MUTATIONS, replay_rrweb_data
+from quantized_policy import quantize_checked
+from scheme_ranking import AdaptiveK, best_of_k, scheme_colors
+from shared_corpus import SHARED_CORPUS, CorpusWriter, ensure_corpus
+from recording_index import RecordingIndex
+from trajectory_log import TRAJECTORY_LOG_DIR, TrajectoryLog
+from sites import DEFAULT_SITE, clean_site, list_sites, site_dir, site_from_key, site_from_recording
+from scheme_stream import SchemeBroadcaster, parse_last_event_id, scheme_etag
+from recordings import is_recording, list_recordings, recording_stem, recording_filename, load_recording, dump_recording, save_stream
 from stable_baselines3 import PPO
-from flask import Flask, jsonify, abort
+import torch
+import numpy as np
+from flask import Flask, Response, jsonify, abort, request
 from dotenv import load_dotenv
 import ssl
 import logging
@@ -34,6 +55,49 @@ os.makedirs(s3_recordings_dir, exist_ok=True)
 os.makedirs(s3_filtered_recordings_dir, exist_ok=True)
 os.makedirs(new_json_folder, exist_ok=True)
 
+# Model store and training worker configuration. Training runs in a separate process pinned
+# to TRAINING_CPU_SET (e.g. "2,3" or "2-3") so it doesn't compete with request handling.
+# CANDIDATE_VERSION / CANDIDATE_MODE ("ab" or "shadow") / CANDIDATE_FRACTION route part of
+# /run-rl traffic to a candidate model version.
+model_dir = "saved_model"
+staging_model_path = os.path.join(model_dir, "staging", "ppo_model.zip")
+MODEL_RETENTION = int(os.getenv('MODEL_RETENTION', '5'))
+CANDIDATE_VERSION = os.getenv('CANDIDATE_VERSION')
+CANDIDATE_MODE = os.getenv('CANDIDATE_MODE', 'shadow')
+CANDIDATE_FRACTION = float(os.getenv('CANDIDATE_FRACTION', '0.1'))
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+TRAINING_CPU_SET = os.getenv('TRAINING_CPU_SET')
+TRAINING_TORCH_THREADS = int(os.getenv('TRAINING_TORCH_THREADS', '1'))
+SERVE_TORCH_THREADS = int(os.getenv('SERVE_TORCH_THREADS', '1'))
+# 'stream' fuses download and filtering; 'batch' downloads everything, then filters from disk
+INGEST_MODE = os.getenv('INGEST_MODE', 'stream')
+KEEP_RAW_RECORDINGS = os.getenv('KEEP_RAW_RECORDINGS', '1') == '1'
+SCHEME_HISTORY = int(os.getenv('SCHEME_HISTORY', '256'))
+# How long browsers / CDNs may serve /scheme/current without revalidating
+SCHEME_MAX_AGE = int(os.getenv('SCHEME_MAX_AGE', '60'))
+# Every open /schemes/stream connection holds a server thread; past this many, clients are
+# sent to /schemes/poll or the cacheable /scheme/current instead (0 = no cap)
+SCHEME_STREAM_MAX_SUBSCRIBERS = int(os.getenv('SCHEME_STREAM_MAX_SUBSCRIBERS', '100'))
+MAX_PROFILE_SECONDS = float(os.getenv('MAX_PROFILE_SECONDS', '60'))
+# 'float32' (default), 'int8', 'fp16' or 'torch-int8' (see quantized_policy.py)
+INFERENCE_PRECISION = os.getenv('INFERENCE_PRECISION', 'float32')
+# Best-of-K serving (see scheme_ranking.py): sample up to RANK_CANDIDATES actions per scheme and
+# serve the highest scoring one; K shrinks when ranking takes longer than RANK_BUDGET_MS
+RANK_CANDIDATES = int(os.getenv('RANK_CANDIDATES', '1'))
+RANK_BUDGET_MS = float(os.getenv('RANK_BUDGET_MS', '0'))
+RANK_MIN_CONTRAST = float(os.getenv('RANK_MIN_CONTRAST', '0'))
+# Per-site recordings and models (see sites.py): sites come from events/<site>/ key prefixes or
+# the recordings' metadata, and /run-rl?site=... serves that site's model
+SITE_PARTITIONING = os.getenv('SITE_PARTITIONING', '0') == '1'
+SITE_MODEL_CAPACITY = int(os.getenv('SITE_MODEL_CAPACITY', '8'))
+SITE_MODEL_MEMORY_MB = float(os.getenv('SITE_MODEL_MEMORY_MB', '512'))
+# Train only on the recordings of the last N days (0 = all), see recording_index.py
+TRAINING_WINDOW_DAYS = float(os.getenv('TRAINING_WINDOW_DAYS', '0'))
+# Day partitions of ingested recordings older than this are archived (or deleted without an archive dir)
+RECORDING_RETENTION_DAYS = float(os.getenv('RECORDING_RETENTION_DAYS', '0'))
+RECORDING_ARCHIVE_DIR = os.getenv('RECORDING_ARCHIVE_DIR')
+torch.set_num_threads(SERVE_TORCH_THREADS)
+
 # S3 client initialization
 s3 = boto3.client(
     's3',
@@ -120,7 +184,8 @@ def generate_self_signed_cert():
     except Exception as e:
         logging.error(f"Certificate generation error: {e}")
 
-# Initialize RL environment
+# Initialize RL environment (on the shared corpus with SHARED_CORPUS=1, see shared_corpus.py)
+ensure_corpus(filtered_recordings)
 env = ColorEnv(json_folder=filtered_recordings)
 
 # File sanitization
@@ -137,6 +202,8 @@ def download_from_s3(bucket_name, prefix):
         print(f"No objects found in S3 bucket with prefix: {prefix}")
         return
 
+    # Raw recordings are indexed by day too, for retention (one index per site folder)
+    recording_indexes = {}
     for obj in response['Contents']:
         key = obj['Key']
 
@@ -147,219 +214,566 @@ def download_from_s3(bucket_name, prefix):
 
             if size > 256000:  # Check if the file size is greater than 250KB
                 sanitized_filename = sanitize_filename(os.path.basename(key))  # Sanitize file name
-                local_file_path = os.path.join(s3_recordings_dir, sanitized_filename)
+                local_dir = site_dir(s3_recordings_dir, site_from_key(key, prefix)) if SITE_PARTITIONING else s3_recordings_dir
+                os.makedirs(local_dir, exist_ok=True)
+                # Stream the object body straight into a (compressed) local file
+                local_file_path = os.path.join(local_dir, recording_filename(recording_stem(sanitized_filename)))
                 print(f"Downloading: {key} ({size} bytes) to {local_file_path}")
-                s3.download_file(bucket_name, key, local_file_path)
+                save_stream(s3.get_object(Bucket=bucket_name, Key=key)['Body'], local_file_path)
+                if local_dir not in recording_indexes:
+                    recording_indexes[local_dir] = RecordingIndex(local_dir)
+                recording_indexes[local_dir].add(os.path.basename(local_file_path))
             else:
                 print(f"Deleting: {key} ({size} bytes) as it is smaller than 250KB")
                 s3.delete_object(Bucket=bucket_name, Key=key)  # Delete the small file
+    for recording_index in recording_indexes.values():
+        recording_index.save()
     print("All files processed successfully.")
 
 
-# rrweb filtering logic
-def filter_rrweb_data(events, colors, fonts):
-    filtered_events = []
-
-    def process_node(node, elements):
-        attributes = node.get("attributes", {})
-        class_list = attributes.get("class", "").split()
-
-        if node.get("tagName") == "nav":
-            elements.append({
-                "type": "navbar",
-                "id": node.get("id") or random.randint(200, 1200),
-                "attributes": {
-                    "style": {
-                        "background-color": colors.get("navbar", "rgb(0, 0, 255)"),
-                        "color": "rgb(255, 255, 255)",
-                        "font-family": fonts.get("navbar", "Arial, sans-serif")
-                    }
-                }
-            })
-        elif node.get("tagName") in ["button", "a"] and "btn" in class_list:
-            if colors.get("buttons"):
-                button_color = colors["buttons"].pop(0)
-            else:
-                button_color = {"backgroundColor": "rgb(255, 0, 0)", "color": "rgb(255, 255, 255)"}
-            
-            elements.append({
-                "type": "button",
-                "id": node.get("id") or random.randint(100, 1100),
-                "attributes": {
-                    "style": {
-                        "background-color": button_color.get("backgroundColor", "rgb(255, 0, 0)"),
-                        "color": button_color.get("color", "rgb(255, 255, 255)"),
-                        "font-family": fonts.get("button", "Arial, sans-serif")  # Default button font family
-                    }
-                }
-            })
-        elif node.get("tagName") in ["p", "span", "div"]:
-            elements.append({
-                "type": "text",
-                "id": node.get("id") or random.randint(300, 1300),
-                "attributes": {
-                    "style": {
-                        "color": colors.get("text", "rgb(0, 0, 0)"),  # Default text color
-                        "font-family": fonts.get("text", "Arial, sans-serif")  # Default text font family
-                    }
-                }
-            })
-        elif "shepherd-header" in class_list and node.get("tagName") == "header":
-            elements.append({
-                "type": "shepherdHeader",
-                "id": node.get("id") or random.randint(400, 1400),
-                "attributes": {
-                    "style": {
-                        "background-color": colors.get("backgroundColor", "rgb(100, 100, 100)"),
-                    }
-                }
-            })
-        elif "shepherd-button" in class_list and node.get("tagName") == "button":
-            elements.append({
-                "type": "shepherdButtons",
-                "id": node.get("id") or random.randint(500, 1500),
-                "attributes": {
-                    "style": {
-                        "background-color": colors.get("backgroundColor", "rgb(0, 128, 0)"),
-                    }
-                }
-            })
-        elif "shepherd-button-secondary" in class_list and node.get("tagName") == "button":
-            elements.append({
-                "type": "shepherdSecondaryButtons",
-                "id": node.get("id") or random.randint(600, 1600),
-                "attributes": {
-                    "style": {
-                        "background-color": colors.get("backgroundColor", "rgb(200, 200, 200)"),
-                    }
-                }
-            })
-
-        if "childNodes" in node:
-            for child in node["childNodes"]:
-                process_node(child, elements)
-
-    for event in events:
-        if event.get("type") == 2:  # Full snapshot
-            timestamp = event.get("timestamp")
-            elements = []
-
-            process_node(event.get("data", {}).get("node", {}), elements)
-
-            elements.append({
-                "type": "background",
-                "id": 301,
-                "attributes": {
-                    "style": {
-                        "background-color": colors.get("background", "rgb(245, 245, 245)")
-                    }
-                }
-            })
-
-            if elements:
-                filtered_events.append({
-                    "timestamp": timestamp,
-                    "data": {"elements": elements}
-                })
-
-    return filtered_events
+# rrweb filtering logic (shared with filter.py, see feature_schema.py)
+def fits_filter_budget(raw_file_path, budget):
+    """Whether loading a raw recording should stay within the filter stage's memory budget."""
+    needed = estimated_json_bytes(raw_file_path)
+    if sum(tree_rss()) + needed <= budget:
+        return True
+    gc.collect()
+    if sum(tree_rss()) + needed <= budget:
+        return True
+    # Left in the raw folder, so it is retried next cycle
+    print(f"Skipping {raw_file_path} this cycle: loading it (~{needed / MB:.0f} MB) would exceed the filter memory budget")
+    return False
 
 def filter_all_recordings():
-    for filename in os.listdir(s3_recordings_dir):
-        if filename.endswith(".json"):
-            raw_file_path = os.path.join(s3_recordings_dir, filename)
-            filtered_file_path = os.path.join(s3_filtered_recordings_dir, filename.replace(".json", "-filtered.json"))
-            with open(raw_file_path, 'r') as raw_file:
-                raw_data = json.load(raw_file)
-                events = raw_data.get("events", [])
-                colors = raw_data.get("colors", {})
-                fonts = raw_data.get("font-family", {})
-            filtered_events = filter_rrweb_data(events, colors, fonts)
-            with open(filtered_file_path, 'w') as filtered_file:
-                json.dump(filtered_events, filtered_file, indent=2)
+    filter_budget = stage_budget("filter")
+    # Identical snapshots are stored once, with a multiplicity count in the snapshot index
+    # (one index per site folder, next to the day-partitioned recording index)
+    snapshot_indexes = {}
+    recording_indexes = {}
+    raw_sites = list_sites(s3_recordings_dir) if SITE_PARTITIONING else [DEFAULT_SITE]
+    for raw_site in raw_sites:
+        raw_dir = site_dir(s3_recordings_dir, raw_site)
+        for filename in os.listdir(raw_dir):
+            if not is_recording(filename):  # .json, .json.gz or .json.zst
+                continue
+            raw_file_path = os.path.join(raw_dir, filename)
+            if filter_budget and not fits_filter_budget(raw_file_path, filter_budget):
+                continue
+            raw_data = load_recording(raw_file_path)
+            site = raw_site
+            if SITE_PARTITIONING and site == DEFAULT_SITE:
+                site = site_from_recording(raw_data) or DEFAULT_SITE
+            output_dir = site_dir(s3_filtered_recordings_dir, site)
+            if output_dir not in snapshot_indexes:
+                os.makedirs(output_dir, exist_ok=True)
+                snapshot_indexes[output_dir] = SnapshotIndex(output_dir)
+                recording_indexes[output_dir] = RecordingIndex(output_dir)
+
+            filtered_filename = recording_filename(recording_stem(filename) + "-filtered")
+            filtered_file_path = os.path.join(output_dir, filtered_filename)
+            events = raw_data.get("events", [])
+            colors = raw_data.get("colors", {})
+            fonts = raw_data.get("font-family", {})
+            if REPLAY_MUTATIONS:
+                filtered_events = replay_rrweb_data(events, colors, fonts)
+            else:
+                filtered_events = filter_rrweb_data(events, colors, fonts)
+            if not snapshot_indexes[output_dir].add(filtered_events, filtered_filename):
+                print(f"Duplicate snapshot, not saved: {filtered_file_path}")
+                continue
+            dump_recording(filtered_events, filtered_file_path)
+            recording_indexes[output_dir].add(filtered_filename)
             print(f"Filtered recording saved: {filtered_file_path}")
+    for output_dir, recording_index in recording_indexes.items():
+        # Date each stored snapshot by its newest duplicate, so time windows still pick it up
+        recording_index.redate(snapshot_indexes[output_dir].last_seen())
+        recording_index.save()
+    for output_dir, snapshot_index in snapshot_indexes.items():
+        snapshot_index.save()
+        print(f"Snapshot dedup stats for {output_dir}: {snapshot_index.stats()}")
 
 # RL training and testing
+# Versioned models; the router keeps the current (and candidate) model loaded in memory
+model_store = ModelStore(model_dir, keep=MODEL_RETENTION)
+def load_model_file(path, json_folder=filtered_recordings):
+    model = PPO.load(path)
+    if INFERENCE_PRECISION == 'float32':
+        return model
+    # Falls back to the float32 model if served colors would drift by more than 1 RGB level
+    return quantize_checked(model, INFERENCE_PRECISION, json_folder)
+
+def load_serving_model(version):
+    return load_model_file(model_store.path(version))
+
+model_router = ModelRouter(load_serving_model)
+
+# Models of the other sites live in saved_model/sites/<site>/ stores and are loaded on demand
+site_stores = {}
+site_stores_lock = threading.Lock()
+
+def site_store(site, create=False):
+    with site_stores_lock:
+        if site not in site_stores:
+            root = site_dir(model_dir, site)
+            # Don't create store folders for arbitrary ?site= values
+            if not create and not os.path.isdir(root):
+                return None
+            site_stores[site] = ModelStore(root, keep=MODEL_RETENTION)
+        return site_stores[site]
+
+def load_site_model(site):
+    store = site_store(site)
+    version = store.current_version() if store is not None else None
+    if version is None:
+        raise ValueError(f"No published model for site '{site}'")
+    recordings_dir = site_dir(s3_filtered_recordings_dir, site)
+    if not (os.path.isdir(recordings_dir) and list_recordings(recordings_dir)):
+        # Serve the site's model on the shared recordings until it has its own
+        recordings_dir = filtered_recordings
+    return {
+        "version": version,
+        "model": load_model_file(store.path(version), recordings_dir),
+        "env": ColorEnv(json_folder=recordings_dir),
+    }
+
+# Keeps the SITE_MODEL_CAPACITY most recently used site models resident within SITE_MODEL_MEMORY_MB
+site_registry = ModelRegistry(load_site_model, capacity=SITE_MODEL_CAPACITY,
+                              memory_budget=int(SITE_MODEL_MEMORY_MB * 1024 * 1024) or None)
+# Peak memory per pipeline stage, reported at the end of every cycle (see memory_budget.py). The
+# sampler thread only runs with a MEMORY_BUDGET_*_MB, MEMORY_TRACKING=1 or MEMORY_TRACEMALLOC=1
+memory_tracker = MemoryTracker()
+if memory_tracking_enabled():
+    memory_tracker.start()
+# Training uses smaller PPO batches after a cycle whose training came close to its memory budget
+train_batch_sizer = BatchSizer(stage_budget("train"),
+                               {"n_steps": PPO_PARAMS["n_steps"], "batch_size": PPO_PARAMS["batch_size"]},
+                               {"n_steps": 512, "batch_size": 32})
+
+def shed_serving_memory(pressure):
+    # Fewer resident site models while serving nears its budget, back up to SITE_MODEL_CAPACITY once it drops
+    if pressure > SOFT_LIMIT and site_registry.capacity > 1:
+        evicted = site_registry.set_capacity(site_registry.capacity // 2)
+        print(f"Serving memory at {pressure:.0%} of budget, keeping {site_registry.capacity} site models (evicted {evicted})")
+    elif pressure < LOW_WATER and site_registry.capacity < SITE_MODEL_CAPACITY:
+        site_registry.set_capacity(site_registry.capacity + 1)
+
+memory_tracker.add_guard("serve", shed_serving_memory)
+# Every served step is recorded for offline analysis when TRAJECTORY_LOG_DIR is set (see trajectory_log.py)
+trajectory_log = TrajectoryLog(TRAJECTORY_LOG_DIR, source="serve") if TRAJECTORY_LOG_DIR else None
+# Candidates sampled per scheme, adjusted to keep best-of-K ranking within RANK_BUDGET_MS
+rank_k = AdaptiveK(RANK_CANDIDATES, budget_ms=RANK_BUDGET_MS or None)
+
+# Pushes each newly generated scheme to /schemes/stream and /schemes/poll subscribers
+scheme_broadcaster = SchemeBroadcaster(history=SCHEME_HISTORY, max_subscribers=SCHEME_STREAM_MAX_SUBSCRIBERS)
+# Rendered /scheme/current response for the latest broadcast scheme, rebuilt only when it changes
+current_scheme_cache = {"id": None}
+
+def publish_model(path):
+    version = model_store.publish(path, metadata={"training_report": training_worker.status.get("report")}, move=True)
+    model_router.set_current(version)
+    print(f"Model version {version} is now being served")
+    broadcast_scheme()
+
+training_worker = TrainingWorker(
+    filtered_recordings,
+    model_path=staging_model_path,
+    total_timesteps=50000,
+    cpu_set=TRAINING_CPU_SET,
+    torch_threads=TRAINING_TORCH_THREADS,
+    on_progress=lambda event: print(f"Training progress: {event['timesteps']}/{event['total_timesteps']} timesteps"),
+    on_publish=publish_model,
+    last_days=TRAINING_WINDOW_DAYS or None,
+)
+
+training_start_lock = threading.Lock()
+
+def start_training():
+    """Start the training worker in the background unless it is already running."""
+    with training_start_lock:
+        if training_worker.is_running():
+            return False
+        print("Starting model training in a worker process...")
+        training_worker.ppo_overrides = train_batch_sizer.overrides()
+        training_worker.start()
+        return True
+
 def train_model():
     try:
-        print("Starting model training...")
-        model = PPO(
-            policy="MlpPolicy",
-            env=env,
-            n_steps=4096,
-            batch_size=128,
-            n_epochs=20,
-            learning_rate=1e-4,
-            gamma=0.995,
-            gae_lambda=0.95,
-            clip_range=0.2,
-            verbose=1
-        )
-        model.learn(total_timesteps=50000)
-        model.save("saved_model/ppo_model")
+        # Stops early once the reward on held-out recordings plateaus (see training.train_until_converged);
+        # a run already started by a request is waited for instead of started again
+        start_training()
+        status = training_worker.wait()
+        if status["state"] != "published":
+            print(f"Model training failed: {status.get('error')}")
+            return None
         print("Model training complete and saved.")
-        return model
+        return model_router.current[1]
     except Exception as e:
         print(f"Error during training: {e}")
         return None
 
+# One training worker per site, created on first use
+site_training_workers = {}
+
+def publish_site_model(site, path):
+    worker = site_training_workers[site]
+    version = site_store(site, create=True).publish(
+        path, metadata={"site": site, "training_report": worker.status.get("report")}, move=True)
+    site_registry.reload(site)
+    print(f"Model version {version} is now being served for site {site}")
+
+def train_site_model(site):
+    if site == DEFAULT_SITE:
+        return train_model()
+    if site not in site_training_workers:
+        site_training_workers[site] = TrainingWorker(
+            site_dir(s3_filtered_recordings_dir, site),
+            model_path=os.path.join(site_dir(model_dir, site), "staging", MODEL_FILENAME),
+            total_timesteps=50000,
+            cpu_set=TRAINING_CPU_SET,
+            torch_threads=TRAINING_TORCH_THREADS,
+            on_publish=lambda path: publish_site_model(site, path),
+            last_days=TRAINING_WINDOW_DAYS or None,
+        )
+    print(f"Starting model training for site {site}...")
+    site_training_workers[site].ppo_overrides = train_batch_sizer.overrides()
+    status = site_training_workers[site].start().wait()
+    if status["state"] != "published":
+        print(f"Model training for site {site} failed: {status.get('error')}")
+
 def load_or_train_model():
-    model_path = "saved_model/ppo_model.zip"
-    if os.path.exists(model_path):
-        print("Model found, loading the model...")
-        return PPO.load(model_path)
+    if model_router.current is None:
+        version = model_store.current_version()
+        if version is None and os.path.exists(model_store.legacy_path):
+            print("Importing existing model into the model store...")
+            version = model_store.publish(model_store.legacy_path)
+        if version is not None:
+            print(f"Model found, loading version {version}...")
+            model_router.set_current(version)
+            if CANDIDATE_VERSION:
+                set_candidate(CANDIDATE_VERSION, CANDIDATE_MODE, CANDIDATE_FRACTION)
+        else:
+            # Requests must not wait for a whole training run: they get 503 until it publishes
+            start_training()
+    return model_router.current[1] if model_router.current else None
+
+def set_candidate(version, mode, fraction):
+    model_store.pinned = {version}
+    model_router.set_candidate(version, mode=mode, fraction=fraction)
+    print(f"Serving candidate model {version} in {mode} mode")
+
+def require_admin():
+    # Model management endpoints are disabled unless ADMIN_TOKEN is configured
+    if not ADMIN_TOKEN or request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+        abort(403, description="Admin token required")
+
+@app.route("/models", methods=["GET"])
+def list_models():
+    return jsonify({"versions": model_store.list_versions(), "router": model_router.summary(),
+                    "ranking": rank_k.stats(), "sites": site_registry.summary()})
+
+@app.route("/models/rollback", methods=["POST"])
+def rollback_model():
+    require_admin()
+    try:
+        version = model_store.rollback()
+    except ValueError as e:
+        abort(409, description=str(e))
+    model_router.set_current(version)
+    return jsonify({"message": "Rolled back", "version": version})
+
+@app.route("/models/candidate", methods=["POST", "DELETE"])
+def candidate_model():
+    require_admin()
+    if request.method == "DELETE":
+        model_store.pinned = set()
+        model_router.clear_candidate()
+        return jsonify({"message": "Candidate removed"})
+
+    body = request.get_json(silent=True) or {}
+    version = body.get("version")
+    if version not in model_store.list_versions():
+        abort(404, description=f"Unknown model version: {version}")
+    try:
+        set_candidate(version, body.get("mode", "shadow"), body.get("fraction", 0.1))
+    except ValueError as e:
+        abort(400, description=str(e))
+    return jsonify({"message": "Candidate set", "router": model_router.summary()})
+
+@app.route("/models/promote", methods=["POST"])
+def promote_candidate():
+    require_admin()
+    if model_router.candidate is None:
+        abort(409, description="No candidate model to promote")
+    version = model_router.candidate[0]
+    model_store.set_current(version)
+    model_router.set_current(version)
+    model_store.pinned = set()
+    model_router.clear_candidate()
+    return jsonify({"message": "Candidate promoted", "version": version})
+
+@app.route("/training/status", methods=["GET"])
+def training_status():
+    return jsonify(training_worker.status)
+
+class ModelNotReady(RuntimeError):
+    pass
+
+def generate_scheme(top_n=1, site=DEFAULT_SITE):
+    load_or_train_model()
+    site = clean_site(site)
+    # A site whose model is still loading (or that has no model store at all) is served by
+    # the default model meanwhile; unknown sites never reach the registry
+    entry = site_registry.get(site) if site != DEFAULT_SITE and site_store(site) is not None else None
+    if entry is None:
+        site = DEFAULT_SITE
+        serving, shadow = model_router.route()
+        if serving is None:
+            # e.g. the first training run, started by load_or_train_model(), is still in progress
+            raise ModelNotReady("Model not ready yet, try again later")
+        version, model = serving
+        scheme_env = env
     else:
-        print("Model not found, starting training...")
-        return train_model()
+        version, model, scheme_env, shadow = entry["version"], entry["model"], entry["env"], None
+    obs, _ = scheme_env.reset()
+    initial_obs = obs.copy()
+    ranked = []
+    if RANK_CANDIDATES > 1 or top_n > 1:
+        start = time.perf_counter()
+        ranked = best_of_k(model, obs, max(rank_k.current(), top_n), top_n, RANK_MIN_CONTRAST)
+        rank_k.observe((time.perf_counter() - start) * 1000)
+        action = ranked[0]["action"]
+    else:
+        action, _ = model.predict(obs)
+    obs, reward, terminated, truncated, info = scheme_env.step(action)
+    if trajectory_log is not None:
+        trajectory_log.record(initial_obs, action, reward, version if site == DEFAULT_SITE else f"{site}/{version}",
+                              info.get("recording"))
+    if site == DEFAULT_SITE:
+        model_router.record(version, env.calculate_reward(obs))
+
+    # Shadow mode: score the candidate on the same observation without serving it
+    if shadow is not None:
+        shadow_version, shadow_model = shadow
+        shadow_action, _ = shadow_model.predict(initial_obs)
+        shadow_obs = initial_obs.copy()
+        shadow_obs[:15] = np.clip(shadow_obs[:15] + shadow_action, 0, 1)
+        model_router.record(shadow_version, env.calculate_reward(shadow_obs), shadow_action, action)
+
+    output_data = scheme_colors(obs)
+
+    # Save to `new_files` folder
+    current_time = int(time.time())
+    filename = f"{current_time}_colors.json"
+    with open(os.path.join(new_json_folder, filename), 'w') as f:
+        json.dump(output_data, f)
+    if top_n > 1:
+        # Runner-up schemes are returned to the caller but not saved
+        output_data = {**output_data, "alternatives": [
+            {"data": scheme_colors(candidate["obs"]), "reward": candidate["reward"],
+             "passes_contrast": candidate["passes_contrast"]}
+            for candidate in ranked[1:]
+        ]}
+    return output_data, version, site
+
+def broadcast_scheme():
+    # Generate one scheme and push it to every subscriber, instead of each client polling /run-rl
+    try:
+        output_data, version, _ = generate_scheme()
+        event_id = scheme_broadcaster.publish({"data": output_data, "model_version": version})
+        print(f"Broadcast color scheme {event_id} from model {version}")
+    except Exception as e:
+        print(f"Error broadcasting color scheme: {e}")
+
+def debug_request_args():
+    require_admin()
+    try:
+        seconds = float(request.args.get("seconds", 10))
+    except ValueError:
+        abort(400, description="seconds must be a number")
+    # nan and inf would pass min() unchanged
+    if not math.isfinite(seconds) or seconds <= 0:
+        abort(400, description="seconds must be a positive number")
+    seconds = min(seconds, MAX_PROFILE_SECONDS)
+    target = request.args.get("target", "serve")
+    if target not in ("serve", "train"):
+        abort(400, description="target must be 'serve' or 'train'")
+    return seconds, target
+
+def run_debug_command(seconds, command):
+    try:
+        return training_worker.request({**command, "seconds": seconds}, timeout=seconds + 60)
+    except RuntimeError as e:
+        abort(409, description=str(e))
+    except TimeoutError as e:
+        abort(504, description=str(e))
+
+@app.route("/debug/profile", methods=["GET"])
+def debug_profile():
+    # Nothing is installed until a session is requested, so idle overhead is zero
+    seconds, target = debug_request_args()
+    if target == "train":
+        # The training worker supports sampling and cProfile (pstats text) sessions
+        mode = request.args.get("mode", "cprofile")
+        if mode not in ("sample", "cprofile"):
+            abort(400, description="mode must be 'sample' or 'cprofile'")
+        result = run_debug_command(seconds, {"type": "profile", "mode": mode})
+    else:
+        # Request threads are short-lived, so the serving process is sampled as a whole
+        try:
+            result = collapsed_stacks(run_exclusive(sample_stacks, seconds))
+        except ProfilerBusy as e:
+            abort(409, description=str(e))
+    return Response(result, mimetype="text/plain")
+
+@app.route("/debug/memory", methods=["GET"])
+def debug_memory():
+    seconds, target = debug_request_args()
+    if target == "train":
+        return jsonify(run_debug_command(seconds, {"type": "memory"}))
+    try:
+        return jsonify(run_exclusive(tracemalloc_top, seconds))
+    except ProfilerBusy as e:
+        abort(409, description=str(e))
+
+@app.route("/debug/memory/stages", methods=["GET"])
+def debug_memory_stages():
+    # Peak memory by stage for the cycle in progress and the last completed cycles
+    require_admin()
+    if not memory_tracker.running:
+        abort(404, description="Memory tracking is off (set MEMORY_TRACKING=1 or a MEMORY_BUDGET_*_MB)")
+    return jsonify({"current": memory_tracker.report(reset=False), "cycles": list(memory_tracker.reports)})
 
 @app.route("/run-rl", methods=["GET"])
 def run_rl_service():
     try:
         print("Running RL service...")
-        model = load_or_train_model()
-        obs, _ = env.reset()
-        action, _ = model.predict(obs)
-        obs, reward, terminated, truncated, info = env.step(action)
-
-        output_data = {
-            "button_color": [int(obs[i] * 255) for i in range(0, 3)],
-            "navbar_color": [int(obs[i] * 255) for i in range(3, 6)],
-            "background_color": [int(obs[i] * 255) for i in range(6, 9)],
-            "shepherd_header_color": [int(obs[i] * 255) for i in range(9, 12)],
-            "shepherd_button_color": [int(obs[i] * 255) for i in range(12, 15)],
-        }
-
-        # Save to `new_files` folder
-        current_time = int(time.time())
-        filename = f"{current_time}_colors.json"
-        with open(os.path.join(new_json_folder, filename), 'w') as f:
-            json.dump(output_data, f)
-
-        return jsonify({"message": "New color scheme generated", "data": output_data})
+        output_data, version, site = generate_scheme(top_n=min(max(request.args.get("top_n", 1, type=int), 1), 32),
+                                                     site=request.args.get("site", DEFAULT_SITE))
+        return jsonify({"message": "New color scheme generated", "data": output_data, "model_version": version,
+                        "site": site})
+    except ModelNotReady as e:
+        abort(503, description=str(e))
     except Exception as e:
         print(f"Error occurred: {e}")
         abort(500, description=str(e))
 
+def current_scheme():
+    """The latest published scheme with its serialized body and ETag, or None before the first one."""
+    global current_scheme_cache
+    latest = scheme_broadcaster.latest()
+    if latest is None:
+        return None
+    cache = current_scheme_cache
+    if cache["id"] != latest["id"]:
+        # Swap in a new dict so concurrent readers never see a half-updated one
+        cache = current_scheme_cache = {
+            "id": latest["id"],
+            "etag": scheme_etag(latest["data"]),
+            "body": json.dumps({"event_id": latest["id"], **latest["data"]}),
+            "last_modified": latest["time"],
+        }
+    return cache
+
+@app.route("/scheme/current", methods=["GET"])
+def get_current_scheme():
+    # Read-only and cacheable; /run-rl remains the endpoint that generates a new scheme
+    scheme = current_scheme()
+    if scheme is None:
+        abort(503, description="No color scheme published yet")
+
+    if request.if_none_match.contains(scheme["etag"]):
+        response = Response(status=304)
+    else:
+        response = Response(scheme["body"], mimetype="application/json")
+    response.set_etag(scheme["etag"])
+    response.last_modified = scheme["last_modified"]
+    response.headers["Cache-Control"] = f"public, max-age={SCHEME_MAX_AGE}, stale-while-revalidate={SCHEME_MAX_AGE}"
+    return response
+
+@app.route("/schemes/stream", methods=["GET"])
+def stream_schemes():
+    # Server-Sent Events; browsers send Last-Event-ID automatically when reconnecting
+    last_id = parse_last_event_id(request.headers.get("Last-Event-ID") or request.args.get("last_event_id"))
+    if not scheme_broadcaster.subscribe():
+        # Large fleets of clients should poll /scheme/current (cacheable) or long-poll /schemes/poll
+        response = jsonify({"error": "Too many open scheme streams", "poll": "/schemes/poll",
+                            "current": "/scheme/current"})
+        response.status_code = 503
+        response.headers["Retry-After"] = "30"
+        return response
+    response = Response(
+        scheme_broadcaster.stream(last_id),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # Runs when the client disconnects, whether or not the stream was ever iterated
+    response.call_on_close(scheme_broadcaster.unsubscribe)
+    return response
+
+@app.route("/schemes/poll", methods=["GET"])
+def poll_schemes():
+    # Long-poll fallback for clients without EventSource
+    last_id = parse_last_event_id(request.args.get("last_event_id"))
+    try:
+        timeout = float(request.args.get("timeout", 30))
+    except ValueError:
+        abort(400, description="timeout must be a number of seconds")
+    if not math.isfinite(timeout):
+        abort(400, description="timeout must be a number of seconds")
+    timeout = min(max(timeout, 0.0), 60.0)
+    events = scheme_broadcaster.wait(last_id, timeout=timeout)
+    last_event_id = events[-1]["id"] if events else (last_id if last_id is not None else scheme_broadcaster.last_id)
+    return jsonify({"events": events, "last_event_id": last_event_id})
+
+def apply_recording_retention():
+    folders = [site_dir(root, site) for root in (s3_recordings_dir, s3_filtered_recordings_dir) for site in list_sites(root)]
+    for folder in folders:
+        index = RecordingIndex(folder)
+        index.sync()
+        archive_dir = os.path.join(RECORDING_ARCHIVE_DIR, os.path.relpath(folder, ".")) if RECORDING_ARCHIVE_DIR else None
+        expired = index.apply_retention(RECORDING_RETENTION_DAYS, archive_dir)
+        if expired and SHARED_CORPUS and os.path.isdir(os.path.join(folder, ".corpus")):
+            # Compact the shared corpus so it stops carrying the dropped recordings
+            CorpusWriter(folder).rebuild()
 
 def run_full_cycle():
     while True:
         print("Cycle started: Downloading and filtering at 90 minutes...")
-        # Step 1: Download from S3
-        download_from_s3(S3_BUCKET_NAME, "events/")
-        # Step 2: Filter recordings
-        filter_all_recordings()
+        if INGEST_MODE == 'stream':
+            # Steps 1+2: Stream recordings from S3 straight into the filter workers
+            with memory_tracker.stage("ingest"):
+                stream_ingest(s3, S3_BUCKET_NAME, "events/", s3_filtered_recordings_dir,
+                              raw_dir=s3_recordings_dir if KEEP_RAW_RECORDINGS else None, delete_small=True,
+                              partition_sites=SITE_PARTITIONING, memory_budget=stage_budget("ingest"))
+        else:
+            # Step 1: Download from S3
+            with memory_tracker.stage("download"):
+                download_from_s3(S3_BUCKET_NAME, "events/")
+            # Step 2: Filter recordings
+            with memory_tracker.stage("filter"):
+                filter_all_recordings()
         print("Download and filtering completed.")
+        if RECORDING_RETENTION_DAYS:
+            apply_recording_retention()
 
         # Wait until the 100th minute to train the model
         time.sleep(10 * 60)
         print("Starting model training...")
-        train_model()
+        with memory_tracker.stage("train"):
+            train_model()
+            if SITE_PARTITIONING:
+                for site in list_sites(s3_filtered_recordings_dir)[1:]:
+                    train_site_model(site)
+        train_batch_sizer.observe(memory_tracker.peak("train"))
 
         # Wait until the 120th minute to hit RL API
         time.sleep(20 * 60)
-        print("Hitting RL API to generate new color scheme...")
-        response = run_rl_service()
-        print(f"RL API Response: {response.json()}")
+        print("Generating and broadcasting new color scheme...")
+        with memory_tracker.stage("serve"):
+            broadcast_scheme()
+        if memory_tracker.running:
+            print(f"Cycle memory report: {json.dumps(memory_tracker.report())}")
 
 # Background thread for the RL API service
 def start_rl_api():
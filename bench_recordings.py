@@ -0,0 +1,64 @@
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from recordings import list_recordings, load_recording, dump_recording, recording_filename, recording_stem, zstandard
+
+# Formats compared by the benchmark; zstd is skipped when zstandard isn't installed
+FORMATS = ["none", "gzip", "zstd"]
+
+
+def bench_format(recordings, compression, work_dir, repeat=3):
+    """Write every recording in `compression`, then time reading it back `repeat` times."""
+    paths = []
+    for name, data in recordings:
+        path = os.path.join(work_dir, recording_filename(recording_stem(name), compression))
+        dump_recording(data, path)
+        paths.append(path)
+
+    total_bytes = sum(os.path.getsize(path) for path in paths)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for path in paths:
+            load_recording(path)
+        timings.append(time.perf_counter() - start)
+
+    best = min(timings)
+    return {
+        "format": compression,
+        "recordings": len(paths),
+        "total_bytes": total_bytes,
+        "bytes_per_recording": round(total_bytes / len(paths), 1),
+        "parse_ms_per_recording": round(best / len(paths) * 1000, 4),
+        "total_parse_seconds": round(best, 4),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark bytes on disk and parse time of compressed recordings.")
+    parser.add_argument("folder", nargs="?", default="./filtered_recordings")
+    parser.add_argument("--limit", type=int, default=None, help="only use the first N recordings")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    names = sorted(list_recordings(args.folder))[:args.limit]
+    recordings = [(name, load_recording(os.path.join(args.folder, name))) for name in names]
+    print(f"Benchmarking {len(recordings)} recordings from {args.folder}")
+
+    work_dir = tempfile.mkdtemp(prefix="bench_recordings_")
+    try:
+        results = []
+        for compression in FORMATS:
+            if compression == "zstd" and zstandard is None:
+                print("zstandard is not installed, skipping zstd")
+                continue
+            format_dir = os.path.join(work_dir, compression)
+            os.makedirs(format_dir)
+            results.append(bench_format(recordings, compression, format_dir, repeat=args.repeat))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(json.dumps(results, indent=2))
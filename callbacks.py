@@ -0,0 +1,128 @@
+import os
+import json
+import time
+import numpy as np
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.evaluation import evaluate_policy
+from stable_baselines3.common.vec_env import DummyVecEnv
+from environment import ColorEnv
+
+
+def make_eval_env(json_folder, files, n_envs=4, max_episode_steps=64):
+    """Build a vectorized env over `files`, spreading the recordings across `n_envs` copies of ColorEnv."""
+    n_envs = max(1, min(n_envs, len(files)))
+    shards = [files[i::n_envs] for i in range(n_envs)]
+
+    def make_env(shard):
+        return lambda: ColorEnv(json_folder=json_folder, files=shard, max_episode_steps=max_episode_steps)
+
+    return DummyVecEnv([make_env(shard) for shard in shards])
+
+
+class ConvergenceStopCallback(BaseCallback):
+    """
+    Periodically score the policy on a held-out vectorized env and stop training once
+    the best mean reward has improved by less than `min_delta` for `patience` evaluations.
+    The eval env is reseeded with `eval_seed` before every evaluation, so each one plays
+    the same episodes and the random engagement terms of the reward don't hide (or fake)
+    an improvement.
+    """
+
+    def __init__(self, eval_env, eval_freq=4096, n_eval_episodes=16, min_delta=0.05, patience=3,
+                 report_path=None, verbose=1, eval_seed=0):
+        super().__init__(verbose)
+        self.eval_env = eval_env
+        self.eval_seed = eval_seed
+        self.eval_freq = eval_freq
+        self.n_eval_episodes = n_eval_episodes
+        self.min_delta = min_delta
+        self.patience = patience
+        self.report_path = report_path
+
+        self.best_mean_reward = -np.inf
+        self.evaluations_without_improvement = 0
+        self.evaluations = []
+        self.converged = False
+        self.report = None
+        self._last_eval_timestep = 0
+        self._start_timestep = 0
+        self._total_timesteps = None
+        self._start_time = None
+
+    def _on_training_start(self):
+        self._total_timesteps = int(self.locals.get("total_timesteps", 0))
+        self._start_timestep = self.num_timesteps
+        self._last_eval_timestep = self.num_timesteps
+        self._start_time = time.time()
+
+    def _on_step(self):
+        if self.num_timesteps - self._last_eval_timestep < self.eval_freq:
+            return True
+        self._last_eval_timestep = self.num_timesteps
+
+        self.eval_env.seed(self.eval_seed)
+        mean_reward, std_reward = evaluate_policy(
+            self.model, self.eval_env, n_eval_episodes=self.n_eval_episodes, deterministic=True, warn=False
+        )
+        improvement = mean_reward - self.best_mean_reward
+        self.evaluations.append({
+            "timesteps": int(self.num_timesteps),
+            "mean_reward": float(mean_reward),
+            "std_reward": float(std_reward),
+        })
+
+        if improvement >= self.min_delta:
+            self.best_mean_reward = mean_reward
+            self.evaluations_without_improvement = 0
+        else:
+            self.evaluations_without_improvement += 1
+
+        if self.verbose:
+            print(f"Eval at {self.num_timesteps} timesteps: mean reward {mean_reward:.3f} "
+                  f"(best {self.best_mean_reward:.3f}, {self.evaluations_without_improvement}/{self.patience} without improvement)")
+
+        if self.evaluations_without_improvement >= self.patience:
+            self.converged = True
+            return False
+        return True
+
+    def _on_training_end(self):
+        if self.converged:
+            reason = (f"converged: mean reward improved by less than {self.min_delta} "
+                      f"for {self.patience} consecutive evaluations")
+        else:
+            reason = "timestep budget exhausted"
+
+        self.report = {
+            "stop_reason": reason,
+            "converged": self.converged,
+            "stopped_at_timestep": int(self.num_timesteps),
+            "total_timesteps": self._total_timesteps,
+            "timesteps_saved": max(0, self._total_timesteps - int(self.num_timesteps)),
+            "best_mean_reward": float(self.best_mean_reward) if self.evaluations else None,
+            "training_seconds": round(time.time() - self._start_time, 2),
+            "evaluations": self.evaluations,
+        }
+        print(f"Training stopped: {reason} ({self.report['timesteps_saved']} timesteps saved)")
+
+        if self.report_path:
+            os.makedirs(os.path.dirname(self.report_path) or ".", exist_ok=True)
+            with open(self.report_path, 'w') as f:
+                json.dump(self.report, f, indent=2)
+
+
+class TrajectoryCallback(BaseCallback):
+    """Record every rollout step (observation before the step, action, reward, recording) in a TrajectoryLog."""
+
+    def __init__(self, trajectory_log, model_version="training"):
+        super().__init__()
+        self.trajectory_log = trajectory_log
+        self.model_version = model_version
+
+    def _on_step(self):
+        obs = self.model._last_obs  # Still the observation the actions were taken on
+        actions = self.locals.get("clipped_actions", self.locals.get("actions"))
+        for i, info in enumerate(self.locals["infos"]):
+            self.trajectory_log.record(obs[i], actions[i], self.locals["rewards"][i], self.model_version,
+                                       info.get("recording"))
+        return True
@@ -0,0 +1,135 @@
+import os
+import sys
+import json
+import hashlib
+from recordings import list_recordings, load_recording
+from feature_schema import extract_colors
+from samplers import recording_timestamp
+
+INDEX_FILENAME = ".snapshot_index.json"
+
+
+def snapshot_hash(filtered_events):
+    """
+    Canonical hash of the features ColorEnv extracts from a filtered recording, so two
+    recordings that only differ in element ids, ordering or whitespace hash the same.
+    Every row counts, so replayed recordings (see rrweb_replay.py) that share their
+    first row are still told apart. Returns None if the features can't be extracted.
+    """
+    rows = filtered_events if isinstance(filtered_events, list) and filtered_events else [filtered_events]
+    try:
+        colors = b"".join(bytes(extract_colors(row)) for row in rows)
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+    return hashlib.sha1(colors).hexdigest()
+
+
+class SnapshotIndex:
+    """
+    Index of unique snapshots in a filtered recordings folder, stored next to them as
+    .snapshot_index.json: {hash: {"file": representative file, "count": n, "sources": [...],
+    "latest": timestamp of the newest recording with this snapshot}}.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.path = os.path.join(folder, INDEX_FILENAME)
+        self.snapshots = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                self.snapshots = json.load(f)
+
+    def add(self, filtered_events, filename):
+        """
+        Register a filtered recording. Returns True if it is a new unique snapshot (and
+        should be written as `filename`), False if it only bumped an existing count. A
+        snapshot whose stored file is gone (e.g. dropped by retention) counts as new again.
+        """
+        digest = snapshot_hash(filtered_events)
+        if digest is None:
+            # Unhashable snapshots are always kept
+            digest = f"unhashed:{filename}"
+
+        timestamp = recording_timestamp(filename)
+        entry = self.snapshots.get(digest)
+        if entry is None:
+            self.snapshots[digest] = {"file": filename, "count": 1, "sources": [filename], "latest": timestamp}
+            return True
+        if filename not in entry["sources"]:
+            entry["count"] += 1
+            entry["sources"].append(filename)
+        if timestamp is not None and timestamp > (self._latest(entry) or 0):
+            entry["latest"] = timestamp
+
+        if entry["file"] == filename:
+            # Re-ingesting the representative recording itself
+            return True
+        if not os.path.exists(os.path.join(self.folder, entry["file"])):
+            entry["file"] = filename
+            return True
+        return False
+
+    @staticmethod
+    def _latest(entry):
+        # Indexes written before "latest" was tracked only know the representative's time
+        return entry.get("latest") or recording_timestamp(entry["file"])
+
+    def last_seen(self):
+        """{representative file: time its snapshot was last recorded} for the snapshots with a known time."""
+        return {entry["file"]: self._latest(entry) for entry in self.snapshots.values()
+                if self._latest(entry) is not None}
+
+    def forget(self, filenames):
+        """Drop the snapshots stored as any of `filenames` (e.g. after retention removed them)."""
+        filenames = set(filenames)
+        forgotten = [digest for digest, entry in self.snapshots.items() if entry["file"] in filenames]
+        for digest in forgotten:
+            del self.snapshots[digest]
+        return len(forgotten)
+
+    def save(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshots, f)
+        os.replace(tmp_path, self.path)
+
+    def counts(self):
+        """{representative file: multiplicity} for every unique snapshot still on disk."""
+        return {
+            entry["file"]: entry["count"]
+            for entry in self.snapshots.values()
+            if os.path.exists(os.path.join(self.folder, entry["file"]))
+        }
+
+    def stats(self):
+        unique = len(self.snapshots)
+        total = sum(entry["count"] for entry in self.snapshots.values())
+        return {
+            "unique_snapshots": unique,
+            "total_recordings": total,
+            "duplicates": total - unique,
+            "dedup_ratio": round(1 - unique / total, 4) if total else 0.0,
+        }
+
+
+def build_index(folder, prune=False):
+    """Index the recordings already in `folder`; with `prune`, delete the duplicate files."""
+    index = SnapshotIndex(folder)
+    removed = 0
+    for filename in sorted(list_recordings(folder)):
+        filtered_events = load_recording(os.path.join(folder, filename))
+        if not index.add(filtered_events, filename) and prune:
+            os.remove(os.path.join(folder, filename))
+            removed += 1
+    index.save()
+    return index, removed
+
+
+if __name__ == "__main__":
+    # Usage: python dedup.py [folder] [--prune]
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    folder = args[0] if args else "./filtered_recordings"
+    index, removed = build_index(folder, prune="--prune" in sys.argv)
+    print(json.dumps(index.stats(), indent=2))
+    if removed:
+        print(f"Removed {removed} duplicate recordings from {folder}")
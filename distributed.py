@@ -0,0 +1,327 @@
+import os
+import math
+import time
+import queue
+import argparse
+import threading
+import multiprocessing
+from multiprocessing.connection import Listener, Client
+import numpy as np
+from shared_corpus import ensure_corpus
+
+# Note: torch / stable-baselines3 are imported inside the functions so that worker
+# processes can apply their thread limits first (see train_worker._limit_resources).
+
+DEFAULT_ADDRESS = ("127.0.0.1", 6100)
+# Shared secret of the learner and its workers. Connections exchange pickled messages,
+# so anyone who knows it can run code on the other end: the built-in fallback is only
+# accepted on loopback addresses (see authkey()).
+DISTRIBUTED_AUTHKEY = os.getenv("DISTRIBUTED_AUTHKEY")
+LOCAL_AUTHKEY = "color-rl"
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+# RolloutBuffer fields a worker ships to the learner, each shaped (n_steps, 1, ...)
+ROLLOUT_FIELDS = ("observations", "actions", "rewards", "episode_starts", "values", "log_probs",
+                  "returns", "advantages")
+
+
+def parse_address(value):
+    """'host:port' -> (host, port)."""
+    host, _, port = value.rpartition(":")
+    return (host or DEFAULT_ADDRESS[0], int(port))
+
+
+def authkey(address):
+    """Key for connections on `address`; DISTRIBUTED_AUTHKEY is required unless it is a loopback address."""
+    if DISTRIBUTED_AUTHKEY:
+        return DISTRIBUTED_AUTHKEY.encode()
+    if address[0] not in LOOPBACK_HOSTS:
+        raise ValueError(f"DISTRIBUTED_AUTHKEY must be set to train over a non-loopback address ({address[0]})")
+    return LOCAL_AUTHKEY.encode()
+
+
+def policy_weights(model):
+    return {name: tensor.detach().cpu().numpy() for name, tensor in model.policy.state_dict().items()}
+
+
+def load_policy_weights(model, weights):
+    import torch
+    model.policy.load_state_dict({name: torch.as_tensor(array) for name, array in weights.items()})
+
+
+def run_worker(address, json_folder="./filtered_recordings", rollout_steps=1024, seed=None, torch_threads=1,
+               worker_id=None):
+    """
+    Rollout worker: keep a local ColorEnv and a copy of the policy, collect `rollout_steps`
+    transitions with the latest weights received from the learner and send them back.
+    Runs until the learner says stop or the connection drops, so workers can join and
+    leave at any time.
+    """
+    key = authkey(address)
+    from train_worker import _limit_resources
+    _limit_resources(None, torch_threads)
+
+    from stable_baselines3.common.callbacks import BaseCallback
+    from environment import ColorEnv
+    from training import build_model, split_recordings
+
+    class NoopCallback(BaseCallback):
+        def _on_step(self):
+            return True
+
+    worker_id = worker_id or f"{os.uname().nodename}-{os.getpid()}"
+    train_files, _ = split_recordings(json_folder)
+    env = ColorEnv(json_folder=json_folder, files=train_files)
+    model = build_model(env, verbose=0, n_steps=rollout_steps, seed=seed)
+    callback = NoopCallback()
+    model._setup_learn(total_timesteps=rollout_steps, callback=callback)
+    callback.init_callback(model)
+
+    conn = Client(address, authkey=key)
+    conn.send({"type": "hello", "worker": worker_id})
+    version, quota, sent = None, 0, 0
+    try:
+        while True:
+            # Block once this version's quota is used up (or before the first weights),
+            # otherwise only pick up messages that have already arrived
+            while version is None or sent >= quota or conn.poll():
+                message = conn.recv()
+                if message["type"] == "stop":
+                    return
+                if message["type"] == "weights":
+                    load_policy_weights(model, message["weights"])
+                    version, sent = message["version"], 0
+                if message["version"] == version:
+                    quota = message["quota"]
+
+            model.collect_rollouts(model.env, callback, model.rollout_buffer, n_rollout_steps=rollout_steps)
+            buffer = model.rollout_buffer
+            conn.send({
+                "type": "rollout",
+                "worker": worker_id,
+                "version": version,
+                **{field: getattr(buffer, field) for field in ROLLOUT_FIELDS},
+            })
+            sent += 1
+    except (EOFError, ConnectionError):
+        pass
+    finally:
+        conn.close()
+        print(f"Worker {worker_id} stopped")
+
+
+class Learner:
+    """
+    Central PPO learner. Accepts rollout workers on `address`, gathers
+    `rollouts_per_update` rollouts generated by weights at most `max_staleness` updates
+    old, fills the model's RolloutBuffer with them (one rollout per buffer column), runs
+    PPO's train() and broadcasts the new weights to every connected worker. Each
+    weights message carries a quota of rollouts per worker, so workers don't run ahead
+    and produce rollouts that would be discarded as stale.
+    """
+
+    def __init__(self, json_folder="./filtered_recordings", address=DEFAULT_ADDRESS, rollout_steps=1024,
+                 rollouts_per_update=4, max_staleness=1, verbose=1, **overrides):
+        from stable_baselines3.common.logger import configure
+        from stable_baselines3.common.vec_env import DummyVecEnv
+        from environment import ColorEnv
+        from training import build_model, split_recordings
+
+        key = authkey(address)
+        # Materialize the shared corpus once here; the workers only map it (with SHARED_CORPUS=1)
+        ensure_corpus(json_folder)
+        train_files, _ = split_recordings(json_folder)
+        # The env is only used for the spaces and to size the buffer: n_envs = rollouts per update
+        env = DummyVecEnv([lambda: ColorEnv(json_folder=json_folder, files=train_files)] * rollouts_per_update)
+        self.model = build_model(env, verbose=0, n_steps=rollout_steps, **overrides)
+        self.model.set_logger(configure(None, ["stdout"] if verbose > 1 else []))
+
+        self.rollout_steps = rollout_steps
+        self.rollouts_per_update = rollouts_per_update
+        self.max_staleness = max_staleness
+        self.verbose = verbose
+        self.version = 0
+        self.rollouts = queue.Queue()
+        self.workers = {}
+        self._workers_lock = threading.Lock()
+        self._listener = Listener(address, authkey=key)
+        self.address = self._listener.address
+        self._closed = False
+        self.stats = {"updates": 0, "rollouts": 0, "stale_rollouts": 0, "workers_joined": 0, "workers_left": 0}
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                conn = self._listener.accept()
+            except (OSError, EOFError):
+                if self._closed:
+                    return
+                continue
+            threading.Thread(target=self._serve_worker, args=(conn,), daemon=True).start()
+
+    def _serve_worker(self, conn):
+        worker_id = None
+        try:
+            hello = conn.recv()
+            worker_id = hello["worker"]
+            with self._workers_lock:
+                self.workers[worker_id] = (conn, threading.Lock())
+                self.stats["workers_joined"] += 1
+            if self.verbose:
+                print(f"Worker {worker_id} joined ({len(self.workers)} connected)")
+            self._send(worker_id, {"type": "weights", "version": self.version, "quota": self._quota(),
+                                   "weights": policy_weights(self.model)})
+            while True:
+                self.rollouts.put(conn.recv())
+        except (EOFError, ConnectionError, OSError):
+            pass
+        with self._workers_lock:
+            if self.workers.pop(worker_id, None) is not None:
+                self.stats["workers_left"] += 1
+        conn.close()
+        if self.verbose:
+            print(f"Worker {worker_id} left ({len(self.workers)} connected)")
+        # The remaining workers have to cover for the one that left
+        self.broadcast({"type": "quota", "version": self.version, "quota": self._quota()})
+
+    def _quota(self):
+        return math.ceil(self.rollouts_per_update / max(1, len(self.workers)))
+
+    def _send(self, worker_id, message):
+        with self._workers_lock:
+            conn, lock = self.workers.get(worker_id, (None, None))
+        if conn is None:
+            return
+        try:
+            with lock:
+                conn.send(message)
+        except (OSError, ConnectionError):
+            pass
+
+    def broadcast(self, message):
+        with self._workers_lock:
+            worker_ids = list(self.workers)
+        for worker_id in worker_ids:
+            self._send(worker_id, message)
+
+    def _gather(self):
+        """Block until `rollouts_per_update` fresh enough rollouts have arrived."""
+        batch = []
+        while len(batch) < self.rollouts_per_update:
+            rollout = self.rollouts.get()
+            if self.version - rollout["version"] > self.max_staleness:
+                self.stats["stale_rollouts"] += 1
+                continue
+            batch.append(rollout)
+        return batch
+
+    def _fill_buffer(self, batch):
+        buffer = self.model.rollout_buffer
+        buffer.reset()
+        for column, rollout in enumerate(batch):
+            for field in ROLLOUT_FIELDS:
+                getattr(buffer, field)[:, column] = rollout[field][:, 0]
+        buffer.pos = buffer.buffer_size
+        buffer.full = True
+
+    def learn(self, total_timesteps):
+        """Run updates until `total_timesteps` transitions were trained on; returns the model."""
+        threading.Thread(target=self._accept, daemon=True).start()
+        if self.verbose:
+            print(f"Learner listening on {self.address[0]}:{self.address[1]}")
+
+        start = time.time()
+        while self.model.num_timesteps < total_timesteps:
+            batch = self._gather()
+            self._fill_buffer(batch)
+            self.model.num_timesteps += self.rollout_steps * len(batch)
+            self.model._current_progress_remaining = 1.0 - self.model.num_timesteps / total_timesteps
+            self.model.train()
+
+            self.version += 1
+            self.stats["updates"] += 1
+            self.stats["rollouts"] += len(batch)
+            self.broadcast({"type": "weights", "version": self.version, "quota": self._quota(),
+                            "weights": policy_weights(self.model)})
+            if self.verbose:
+                mean_reward = float(np.mean([rollout["rewards"].mean() for rollout in batch]))
+                print(f"Update {self.version}: {self.model.num_timesteps}/{total_timesteps} timesteps, "
+                      f"mean step reward {mean_reward:.3f}, {len(self.workers)} workers, "
+                      f"{self.model.num_timesteps / (time.time() - start):.0f} steps/s")
+        return self.model
+
+    def close(self):
+        self._closed = True
+        self.broadcast({"type": "stop"})
+        self._listener.close()
+
+
+def save_model(model, model_path):
+    # Write to a temporary file first so readers never see a partially written zip
+    os.makedirs(os.path.dirname(model_path) or ".", exist_ok=True)
+    tmp_path = f"{model_path}.{os.getpid()}.tmp.zip"
+    model.save(tmp_path)
+    os.replace(tmp_path, model_path)
+
+
+def run_local(n_workers, json_folder, total_timesteps, model_path, rollout_steps=1024,
+              rollouts_per_update=4, max_staleness=1, address=("127.0.0.1", 0)):
+    """Learner in this process plus `n_workers` local worker processes standing in for nodes."""
+    learner = Learner(json_folder, address=address, rollout_steps=rollout_steps,
+                      rollouts_per_update=rollouts_per_update, max_staleness=max_staleness)
+    ctx = multiprocessing.get_context("spawn")
+    workers = [
+        ctx.Process(target=run_worker, args=(learner.address, json_folder, rollout_steps, i), daemon=True)
+        for i in range(n_workers)
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        model = learner.learn(total_timesteps)
+    finally:
+        learner.close()
+        for worker in workers:
+            worker.join(timeout=10)
+    save_model(model, model_path)
+    print(f"Distributed training finished: {learner.stats}")
+    return model, learner.stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Actor/learner PPO training over several processes or machines.")
+    parser.add_argument("role", choices=["learner", "worker", "local"])
+    parser.add_argument("--address", default=f"{DEFAULT_ADDRESS[0]}:{DEFAULT_ADDRESS[1]}", help="learner host:port")
+    parser.add_argument("--json-folder", default="./filtered_recordings")
+    parser.add_argument("--total-timesteps", type=int, default=50000)
+    parser.add_argument("--rollout-steps", type=int, default=1024, help="transitions per worker rollout")
+    parser.add_argument("--rollouts-per-update", type=int, default=4)
+    parser.add_argument("--max-staleness", type=int, default=1, help="oldest weight version accepted, in updates")
+    parser.add_argument("--workers", type=int, default=2, help="local worker processes (role=local)")
+    parser.add_argument("--torch-threads", type=int, default=1)
+    parser.add_argument("--model-path", default="saved_model/staging/ppo_model.zip")
+    parser.add_argument("--publish", action="store_true", help="publish the trained model to the model store")
+    args = parser.parse_args()
+
+    if args.role == "worker":
+        run_worker(parse_address(args.address), args.json_folder, args.rollout_steps, torch_threads=args.torch_threads)
+    else:
+        if args.role == "local":
+            run_local(args.workers, args.json_folder, args.total_timesteps, args.model_path,
+                      rollout_steps=args.rollout_steps, rollouts_per_update=args.rollouts_per_update,
+                      max_staleness=args.max_staleness)
+        else:
+            learner = Learner(args.json_folder, address=parse_address(args.address), rollout_steps=args.rollout_steps,
+                              rollouts_per_update=args.rollouts_per_update, max_staleness=args.max_staleness)
+            try:
+                model = learner.learn(args.total_timesteps)
+            finally:
+                learner.close()
+            save_model(model, args.model_path)
+            print(f"Distributed training finished: {learner.stats}")
+
+        if args.publish:
+            from model_store import ModelStore
+            version = ModelStore().publish(args.model_path, metadata={"trainer": "distributed"}, move=True)
+            print(f"Published model version {version}")
+        else:
+            print(f"Model saved to {args.model_path}")
@@ -1,15 +1,75 @@
 import numpy as np
 import gymnasium as gym
-import json
 import os
+from samplers import make_sampler, CountSampler
+from recordings import extract_rgb, list_recordings, load_recording
+from feature_schema import DEFAULT_SCHEMA, extract_colors
+from dedup import SnapshotIndex
+from rrweb_replay import REPLAY_MUTATIONS
+from shared_corpus import SHARED_CORPUS, SharedCorpus
+from recording_index import recording_window
+
+# Order of the 5 elements (3 RGB values each) in the first 15 observation values
+ELEMENT_NAMES = DEFAULT_SCHEMA.names
+
+
+def calculate_reward_batch(obs):
+    """Vectorized ColorEnv.calculate_reward over an (N, 18) array of observations."""
+    obs = np.atleast_2d(obs)
+    reward = np.where(np.all(obs[:, 3:6] > 0.3, axis=1), 5.0, -5.0)
+
+    navbar_avg = obs[:, 3:6].sum(axis=1) / 3
+    background_avg = obs[:, 6:9].sum(axis=1) / 3
+    reward -= np.where(np.abs(navbar_avg - background_avg) < 0.2, 10.0, 0.0)
+
+    reward += np.where(np.all(obs[:, 12:15] > 0.3, axis=1), 5.0, -5.0)
+    return reward
+
 
 class ColorEnv(gym.Env):
-    def __init__(self, json_folder='./filtered_recordings'):
+    def __init__(self, json_folder='./filtered_recordings', files=None, sampler=None, max_episode_steps=64,
+                 unique_snapshots=False, count_weighted=False, sample_rows=None, corpus=None, last_days=None,
+                 since=None):
         super(ColorEnv, self).__init__()
         self.json_folder = json_folder
-        self.files = os.listdir(json_folder)
+        # Optionally only play the recordings of the last `last_days` days / since an epoch time,
+        # looked up in the day-partitioned index (see recording_index.py)
+        if files is None and (last_days is not None or since is not None):
+            files = recording_window(json_folder, last_days=last_days, since=since)
+        # Optionally restrict the env to a subset of the recordings (e.g. a held-out slice)
+        self.files = list(files) if files is not None else list_recordings(json_folder)
         self.current_file_index = 0
 
+        # Optionally play each unique snapshot once (see dedup.py), weighting it by how many
+        # recordings it stands for when `count_weighted` is set
+        if unique_snapshots:
+            counts = SnapshotIndex(json_folder).counts()
+            if counts:
+                self.files = [f for f in self.files if f in counts] if files is not None else sorted(counts)
+                if count_weighted and sampler is None:
+                    sampler = CountSampler(counts)
+
+        # Recording sampler ('uniform', 'recency', 'priority' or a RecordingSampler);
+        # None keeps the sequential cycling through self.files
+        self.sampler = make_sampler(sampler)
+        if self.sampler is not None:
+            self.sampler.add_files(self.files)
+
+        # Recordings filtered with mutation replay (see rrweb_replay.py) hold one row per color
+        # change; with `sample_rows` each episode starts from a random row instead of the first
+        self.sample_rows = REPLAY_MUTATIONS if sample_rows is None else sample_rows
+
+        # Read features from the memory-mapped corpus shared by every process (see shared_corpus.py)
+        # instead of parsing each recording on every reset; files not in it are still parsed
+        if corpus is None and SHARED_CORPUS:
+            corpus = SharedCorpus(json_folder)
+        self.corpus = corpus
+
+        # Episodes are truncated after `max_episode_steps` steps (None disables the cap)
+        self.max_episode_steps = max_episode_steps
+        self.episode_steps = 0
+        self.episode_reward = 0.0
+
         # Observation space: 18 elements (15 color values + 3 engagement metrics)
         self.observation_space = gym.spaces.Box(low=0, high=1, shape=(18,), dtype=np.float32)
 
@@ -24,65 +84,66 @@ class ColorEnv(gym.Env):
 
     def load_json(self, file_index):
         """Load and parse a JSON file and extract color information."""
+        if self.corpus is not None:
+            filename = self.files[file_index]
+            if filename not in self.corpus:
+                self.corpus.refresh()
+            if filename in self.corpus:
+                rows = self.corpus.rows(filename)
+                row = rows[self.np_random.integers(len(rows))] if self.sample_rows and len(rows) > 1 else rows[0]
+                return np.array(row, dtype=np.float64) / 255.0
+
         filepath = os.path.join(self.json_folder, self.files[file_index])
-        with open(filepath, 'r') as f:
-            data = json.load(f)
-
-        # Ensure 'data' is a dictionary, if not, handle as list
-        if isinstance(data, list):
-            data = data[0]  # Assuming the first item in the list is relevant
-
-        # Safeguard for missing or incorrect structure
-        elements = data.get('data', {}).get('elements', [])
-        button_color = [0, 0, 0]
-        navbar_color = [200, 200, 200]
-        background_color = [0, 0, 0]
-        shepherd_header_color = [200, 200, 200]
-        shepherd_button_color = [200, 200, 200]
-
-        # Extract color information if elements are available
-        for element in elements:
-            style = element.get('attributes', {}).get('style', {})
-            if element['type'] == 'button':
-                button_color = self.extract_rgb(style.get('background-color', 'rgb(0,0,0)'))
-            elif element['type'] == 'navbar':
-                navbar_color = self.extract_rgb(style.get('background-color', 'rgb(0,0,0)'))
-            elif element['type'] == 'background':
-                background_color = self.extract_rgb(style.get('background-color', 'rgb(255,255,255)'))  # Default white
-            elif element['type'] == 'shepherd-header':
-                shepherd_header_color = self.extract_rgb(style.get('background-color', 'rgb(0,0,0)'))
-            elif element['type'] == 'shepherd-button':
-                shepherd_button_color = self.extract_rgb(style.get('background-color', 'rgb(0,0,0)'))
+        data = load_recording(filepath)  # .json, .json.gz or .json.zst
+        if self.sample_rows and isinstance(data, list) and len(data) > 1:
+            data = data[self.np_random.integers(len(data))]
 
         # Normalize to [0, 1] and return as a flat array
-        return np.array(
-            button_color + navbar_color + background_color +
-            shepherd_header_color + shepherd_button_color
-        ) / 255.0
+        return np.array(extract_colors(data)) / 255.0
 
     def extract_rgb(self, color_str):
         """Extract RGB values from 'rgb(x,x,x)' or 'rgba(x,x,x,x)' string."""
-        # Remove 'rgb(' or 'rgba(' and the closing ')'
-        color_str = color_str.replace('rgba(', '').replace('rgb(', '').replace(')', '')
-
-        # Split the color values by commas and take the first 3 values (R, G, B)
-        rgb_values = color_str.split(',')[:3]  # Ignore alpha channel if present
-
-        return [int(x.strip()) for x in rgb_values]
+        return extract_rgb(color_str)
 
     def load_engagement_data(self, file_index):
         """Load historical engagement data for reward calculation (dummy implementation)."""
         return {
-            'user_clicks': np.random.rand(),      # Random for now, but should be actual data
-            'scroll_depth': np.random.rand(),     # Random for now, but should be actual data
-            'bounce_rate': np.random.rand()       # Random for now, but should be actual data
+            'user_clicks': self.np_random.random(),      # Random for now, but should be actual data
+            'scroll_depth': self.np_random.random(),     # Random for now, but should be actual data
+            'bounce_rate': self.np_random.random()       # Random for now, but should be actual data
         }
 
+    def add_files(self, files):
+        """Make new recordings available to the env (and its sampler) without rebuilding it."""
+        known = set(self.files)
+        new_files = [f for f in files if f not in known]
+        self.files.extend(new_files)
+        if self.sampler is not None:
+            self.sampler.add_files(new_files)
+        return new_files
+
+    def refresh_files(self):
+        """Pick up recordings added to json_folder since the env was created."""
+        if self.corpus is not None:
+            self.corpus.refresh()
+        return self.add_files(sorted(list_recordings(self.json_folder)))
+
     def reset(self, seed=None, options=None):
         if seed is not None:
+            # A seeded reset starts over: same random draws and the same recording sequence
             self.seed(seed)
+            self.current_file_index = 0
 
-        self.current_file_index = (self.current_file_index + 1) % len(self.files)
+        # Report the finished episode back to the sampler (used by priority sampling)
+        if self.sampler is not None and self.episode_steps > 0:
+            self.sampler.update(self.current_file_index, self.episode_reward)
+        self.episode_steps = 0
+        self.episode_reward = 0.0
+
+        if self.sampler is not None:
+            self.current_file_index = self.sampler.sample(self.np_random)
+        else:
+            self.current_file_index = (self.current_file_index + 1) % len(self.files)
         state = self.load_json(self.current_file_index)
         self.engagement_data = self.load_engagement_data(self.current_file_index)
 
@@ -142,10 +203,14 @@ class ColorEnv(gym.Env):
         ]
         self.state = np.concatenate([self.state[:15], engagement_metrics])
 
-        terminated = np.all(np.abs(action) < 0.01)
-        truncated = False
-        return self.state, float(reward), terminated, truncated, {}
+        self.episode_steps += 1
+        self.episode_reward += float(reward)
+
+        terminated = bool(np.all(np.abs(action) < 0.01))
+        truncated = self.max_episode_steps is not None and self.episode_steps >= self.max_episode_steps
+        return self.state, float(reward), terminated, truncated, {"recording": self.files[self.current_file_index]}
 
     def seed(self, seed=None):
-        """Set the random seed for the environment."""
-        np.random.seed(seed)
\ No newline at end of file
+        """Seed the environment's own random generator (the global np.random is left alone)."""
+        self.np_random, seed = gym.utils.seeding.np_random(seed)
+        return [seed]
\ No newline at end of file
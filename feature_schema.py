@@ -0,0 +1,109 @@
+from recordings import extract_rgb
+
+# Element types written by the filter and read by the env
+NAVBAR = "navbar"
+BUTTON = "button"
+BACKGROUND = "background"
+SHEPHERD_HEADER = "shepherdHeader"
+SHEPHERD_BUTTONS = "shepherdButtons"
+
+# Other spellings of the element types found in older code and data
+ELEMENT_ALIASES = {
+    "shepherd-header": SHEPHERD_HEADER,
+    "shepherd_header": SHEPHERD_HEADER,
+    "shepherd-button": SHEPHERD_BUTTONS,
+    "shepherd_button": SHEPHERD_BUTTONS,
+}
+
+# The features ColorEnv observes, in observation order (3 RGB values each):
+# `default` is used when no element of the type is present, `missing` when an element
+# lacks the property, and `aggregate` picks the value among repeated elements.
+FEATURES = [
+    {"name": "button_color", "element": BUTTON, "property": "background-color",
+     "default": [0, 0, 0], "missing": "rgb(0,0,0)", "aggregate": "last"},
+    {"name": "navbar_color", "element": NAVBAR, "property": "background-color",
+     "default": [200, 200, 200], "missing": "rgb(0,0,0)", "aggregate": "last"},
+    {"name": "background_color", "element": BACKGROUND, "property": "background-color",
+     "default": [0, 0, 0], "missing": "rgb(255,255,255)", "aggregate": "last"},
+    {"name": "shepherd_header_color", "element": SHEPHERD_HEADER, "property": "background-color",
+     "default": [200, 200, 200], "missing": "rgb(0,0,0)", "aggregate": "last"},
+    {"name": "shepherd_button_color", "element": SHEPHERD_BUTTONS, "property": "background-color",
+     "default": [200, 200, 200], "missing": "rgb(0,0,0)", "aggregate": "last"},
+]
+
+AGGREGATES = {
+    "first": lambda values: values[0],
+    "last": lambda values: values[-1],
+    "mean": lambda values: [round(sum(channel) / len(values)) for channel in zip(*values)],
+}
+
+
+class FeatureSchema:
+    """
+    Declares which element types and style properties the env consumes. The filter uses
+    it to drop everything else (`keeps` / `project`), and the env uses it to turn a
+    filtered snapshot into features (`extract`), so both sides agree on the names.
+    """
+
+    def __init__(self, features=FEATURES, aliases=ELEMENT_ALIASES):
+        for feature in features:
+            if feature["aggregate"] not in AGGREGATES:
+                raise ValueError(f"Unknown aggregate '{feature['aggregate']}', expected one of {sorted(AGGREGATES)}")
+        self.features = features
+        self.aliases = aliases
+        self.names = [feature["name"] for feature in features]
+        self.properties = {}
+        for feature in features:
+            self.properties.setdefault(feature["element"], set()).add(feature["property"])
+
+    def element_type(self, name):
+        return self.aliases.get(name, name)
+
+    def keeps(self, element_type):
+        return self.element_type(element_type) in self.properties
+
+    def project(self, element):
+        """Return `element` with only the style properties the schema reads, or None if unused."""
+        element_type = self.element_type(element.get("type"))
+        if element_type not in self.properties:
+            return None
+        style = element.get("attributes", {}).get("style", {})
+        return {
+            "type": element_type,
+            "id": element.get("id"),
+            "attributes": {"style": {p: style[p] for p in self.properties[element_type] if p in style}},
+        }
+
+    def extract_named(self, data):
+        """{feature name: [r, g, b]} for a filtered snapshot (or a list whose first entry is one)."""
+        if isinstance(data, list):
+            data = data[0] if data else {}
+        values = {}
+        for element in data.get("data", {}).get("elements", []):
+            element_type = self.element_type(element.get("type"))
+            if element_type in self.properties:
+                values.setdefault(element_type, []).append(element.get("attributes", {}).get("style", {}))
+
+        named = {}
+        for feature in self.features:
+            styles = values.get(feature["element"])
+            if not styles:
+                named[feature["name"]] = list(feature["default"])
+                continue
+            # A null property (seen in some recordings) counts as missing
+            colors = [extract_rgb(style.get(feature["property"]) or feature["missing"]) for style in styles]
+            named[feature["name"]] = AGGREGATES[feature["aggregate"]](colors)
+        return named
+
+    def extract(self, data):
+        """Flat list of every feature's RGB values (0-255), in schema order."""
+        named = self.extract_named(data)
+        return [value for name in self.names for value in named[name]]
+
+
+DEFAULT_SCHEMA = FeatureSchema()
+
+
+def extract_colors(data, schema=DEFAULT_SCHEMA):
+    """Extract the 15 RGB values (0-255) ColorEnv observes from a filtered recording."""
+    return schema.extract(data)
@@ -1,88 +1,109 @@
 import os
-import json
 import random
+from dedup import SnapshotIndex
+from recording_index import RecordingIndex
+from feature_schema import DEFAULT_SCHEMA, NAVBAR, BUTTON, BACKGROUND, SHEPHERD_HEADER, SHEPHERD_BUTTONS
+from rrweb_replay import REPLAY_MUTATIONS, replay_rrweb_data
+from recordings import is_recording, recording_stem, recording_filename, load_recording, dump_recording
 
 # Define paths
 recordings_dir = "../Backend/recordings"
 filtered_recordings_dir = "./filtered_recordings"
 
-def filter_rrweb_data(events, colors, fonts):
+def filter_rrweb_data(events, colors, fonts, schema=DEFAULT_SCHEMA):
+    """
+    Reduce rrweb full snapshots to the elements the env reads. Only element types and
+    style properties declared in `schema` (see feature_schema.py) are written.
+    """
     filtered_events = []
+    colors = colors or {}
+    fonts = fonts or {}
+
+    def emit(elements, element):
+        elements.append(schema.project(element))
 
     def process_node(node, elements):
         attributes = node.get("attributes", {})
-        class_list = attributes.get("class", "").split()  # Split class names into a list
-
-        if node.get("tagName") == "nav":
-            elements.append({
-                "type": "navbar",
-                "id": node.get("id") or random.randint(200, 1200),
-                "attributes": {
-                    "style": {
-                        "background-color": colors.get("navbar", "rgb(0, 0, 255)"),
-                        "color": "rgb(255, 255, 255)",  # Default text color
-                        "font-family": fonts.get("navbar", "Arial, sans-serif")  # Default font family
+        class_list = str(attributes.get("class", "")).split()  # Split class names into a list
+        tag_name = node.get("tagName")
+
+        if tag_name == "nav":
+            if schema.keeps(NAVBAR):
+                emit(elements, {
+                    "type": NAVBAR,
+                    "id": node.get("id") or random.randint(200, 1200),
+                    "attributes": {
+                        "style": {
+                            "background-color": colors.get("navbar", "rgb(0, 0, 255)"),
+                            "color": "rgb(255, 255, 255)",  # Default text color
+                            "font-family": fonts.get("navbar", "Arial, sans-serif")  # Default font family
+                        }
                     }
-                }
-            })
-        elif node.get("tagName") in ["button", "a"] and "btn" in class_list:
+                })
+        elif tag_name in ["button", "a"] and "btn" in class_list:
             if colors.get("buttons"):
                 button_color = colors["buttons"].pop(0)
             else:
                 button_color = {"backgroundColor": "rgb(255, 0, 0)", "color": "rgb(255, 255, 255)"}
-            
-            elements.append({
-                "type": "button",
-                "id": node.get("id") or random.randint(100, 1100),
-                "attributes": {
-                    "style": {
-                        "background-color": button_color.get("backgroundColor", "rgb(255, 0, 0)"),
-                        "color": button_color.get("color", "rgb(255, 255, 255)"),
-                        "font-family": fonts.get("button", "Arial, sans-serif")  # Default button font family
+
+            if schema.keeps(BUTTON):
+                emit(elements, {
+                    "type": BUTTON,
+                    "id": node.get("id") or random.randint(100, 1100),
+                    "attributes": {
+                        "style": {
+                            "background-color": button_color.get("backgroundColor", "rgb(255, 0, 0)"),
+                            "color": button_color.get("color", "rgb(255, 255, 255)"),
+                            "font-family": fonts.get("button", "Arial, sans-serif")  # Default button font family
+                        }
                     }
-                }
-            })
-        elif node.get("tagName") in ["p", "span", "div"]:
-            elements.append({
-                "type": "text",
-                "id": node.get("id") or random.randint(300, 1300),
-                "attributes": {
-                    "style": {
-                        "color": colors.get("text", "rgb(0, 0, 0)"),  # Default text color
-                        "font-family": fonts.get("text", "Arial, sans-serif")  # Default text font family
+                })
+        elif tag_name in ["p", "span", "div"]:
+            # Text elements are by far the most common; skip building them unless the schema reads them
+            if schema.keeps("text"):
+                emit(elements, {
+                    "type": "text",
+                    "id": node.get("id") or random.randint(300, 1300),
+                    "attributes": {
+                        "style": {
+                            "color": colors.get("text", "rgb(0, 0, 0)"),  # Default text color
+                            "font-family": fonts.get("text", "Arial, sans-serif")  # Default text font family
+                        }
                     }
-                }
-            })
-        elif "shepherd-header" in class_list and node.get("tagName") == "header":
-            elements.append({
-                "type": "shepherdHeader",
-                "id": node.get("id") or random.randint(400, 1400),
-                "attributes": {
-                    "style": {
-                        "background-color": colors.get("backgroundColor", "rgb(100, 100, 100)"),
+                })
+        elif "shepherd-header" in class_list and tag_name == "header":
+            if schema.keeps(SHEPHERD_HEADER):
+                emit(elements, {
+                    "type": SHEPHERD_HEADER,
+                    "id": node.get("id") or random.randint(400, 1400),
+                    "attributes": {
+                        "style": {
+                            "background-color": colors.get("backgroundColor", "rgb(100, 100, 100)"),
+                        }
                     }
-                }
-            })
-        elif "shepherd-button" in class_list and node.get("tagName") == "button":
-            elements.append({
-                "type": "shepherdButtons",
-                "id": node.get("id") or random.randint(500, 1500),
-                "attributes": {
-                    "style": {
-                        "background-color": colors.get("backgroundColor", "rgb(0, 128, 0)"),
+                })
+        elif "shepherd-button" in class_list and tag_name == "button":
+            if schema.keeps(SHEPHERD_BUTTONS):
+                emit(elements, {
+                    "type": SHEPHERD_BUTTONS,
+                    "id": node.get("id") or random.randint(500, 1500),
+                    "attributes": {
+                        "style": {
+                            "background-color": colors.get("backgroundColor", "rgb(0, 128, 0)"),
+                        }
                     }
-                }
-            })
-        elif "shepherd-button-secondary" in class_list and node.get("tagName") == "button":
-            elements.append({
-                "type": "shepherdSecondaryButtons",
-                "id": node.get("id") or random.randint(600, 1600),
-                "attributes": {
-                    "style": {
-                        "background-color": colors.get("backgroundColor", "rgb(200, 200, 200)"),
+                })
+        elif "shepherd-button-secondary" in class_list and tag_name == "button":
+            if schema.keeps("shepherdSecondaryButtons"):
+                emit(elements, {
+                    "type": "shepherdSecondaryButtons",
+                    "id": node.get("id") or random.randint(600, 1600),
+                    "attributes": {
+                        "style": {
+                            "background-color": colors.get("backgroundColor", "rgb(200, 200, 200)"),
+                        }
                     }
-                }
-            })
+                })
 
         if "childNodes" in node:
             for child in node["childNodes"]:
@@ -95,15 +116,16 @@ def filter_rrweb_data(events, colors, fonts):
 
             process_node(event.get("data", {}).get("node", {}), elements)
 
-            elements.append({
-                "type": "background",
-                "id": 301,
-                "attributes": {
-                    "style": {
-                        "background-color": colors.get("background", "rgb(245, 245, 245)")
+            if schema.keeps(BACKGROUND):
+                emit(elements, {
+                    "type": BACKGROUND,
+                    "id": 301,
+                    "attributes": {
+                        "style": {
+                            "background-color": colors.get("background", "rgb(245, 245, 245)")
+                        }
                     }
-                }
-            })
+                })
 
             if elements:
                 filtered_events.append({
@@ -115,26 +137,43 @@ def filter_rrweb_data(events, colors, fonts):
 
 # Filter all recordings
 def filter_all_recordings():
+    # Identical snapshots are stored once, with a multiplicity count in the snapshot index
+    snapshot_index = SnapshotIndex(filtered_recordings_dir)
+    recording_index = RecordingIndex(filtered_recordings_dir)
     for filename in os.listdir(recordings_dir):
-        if filename.endswith(".json"):
+        if is_recording(filename):  # .json, .json.gz or .json.zst
             raw_file_path = os.path.join(recordings_dir, filename)
-            filtered_file_path = os.path.join(filtered_recordings_dir, filename.replace(".json", "-filtered.json"))
-
-            # Load raw data
-            with open(raw_file_path, 'r') as raw_file:
-                raw_data = json.load(raw_file)
-                events = raw_data.get("events", [])
-                colors = raw_data.get("colors", {})
-                fonts = raw_data.get("font-family", {})
+            filtered_filename = recording_filename(recording_stem(filename) + "-filtered")
+            filtered_file_path = os.path.join(filtered_recordings_dir, filtered_filename)
+
+            # Load raw data (compressed or not)
+            raw_data = load_recording(raw_file_path)
+            events = raw_data.get("events", [])
+            colors = raw_data.get("colors", {})
+            fonts = raw_data.get("font-family", {})
+
+            # Filter data, optionally replaying mutations for one row per color change
+            if REPLAY_MUTATIONS:
+                filtered_events = replay_rrweb_data(events, colors, fonts)
+            else:
+                filtered_events = filter_rrweb_data(events, colors, fonts)
 
-            # Filter data
-            filtered_events = filter_rrweb_data(events, colors, fonts)
+            # Skip snapshots we already have, only bumping their count
+            if not snapshot_index.add(filtered_events, filtered_filename):
+                print(f"Duplicate snapshot, not saved: {filtered_file_path}")
+                continue
 
-            # Save filtered data
-            with open(filtered_file_path, 'w') as filtered_file:
-                json.dump(filtered_events, filtered_file, indent=2)
+            # Save filtered data, compressed according to RECORDING_COMPRESSION
+            dump_recording(filtered_events, filtered_file_path)
+            recording_index.add(filtered_filename)
             print(f"Filtered recording saved: {filtered_file_path}")
 
+    # Date each stored snapshot by its newest duplicate, so time windows still pick it up
+    recording_index.redate(snapshot_index.last_seen())
+    recording_index.save()
+    snapshot_index.save()
+    print(f"Snapshot dedup stats: {snapshot_index.stats()}")
+
 # Ensure the filtered recordings directory exists
 os.makedirs(filtered_recordings_dir, exist_ok=True)
 
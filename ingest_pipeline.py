@@ -0,0 +1,247 @@
+import os
+import gzip
+import json
+import time
+import queue
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dedup import SnapshotIndex
+from memory_budget import MemoryGovernor
+from recording_index import RecordingIndex
+from filter import filter_rrweb_data
+from rrweb_replay import REPLAY_MUTATIONS, replay_rrweb_data
+from sites import DEFAULT_SITE, site_dir, site_from_key, site_from_recording
+from recordings import sanitize_filename, recording_filename, recording_stem, open_recording, dump_recording
+
+# Sentinel marking the end of a queue
+_DONE = object()
+
+
+def iter_objects(client, bucket_name, prefix):
+    """Yield every object under `prefix`, following list_objects_v2 pagination."""
+    kwargs = {"Bucket": bucket_name, "Prefix": prefix}
+    while True:
+        response = client.list_objects_v2(**kwargs)
+        for obj in response.get("Contents", []):
+            yield obj
+        if not response.get("IsTruncated"):
+            return
+        kwargs["ContinuationToken"] = response["NextContinuationToken"]
+
+
+def filter_raw_bytes(data, with_site=False):
+    """
+    Parse a raw (optionally gzipped) rrweb recording and return its filtered events, or
+    (events, site named in its metadata) with `with_site`.
+    """
+    if data[:2] == b"\x1f\x8b":
+        data = gzip.decompress(data)
+    raw_data = json.loads(data)
+    if REPLAY_MUTATIONS:
+        events = replay_rrweb_data(raw_data.get("events", []), raw_data.get("colors", {}), raw_data.get("font-family", {}))
+    else:
+        events = filter_rrweb_data(raw_data.get("events", []), raw_data.get("colors", {}), raw_data.get("font-family", {}))
+    return (events, site_from_recording(raw_data)) if with_site else events
+
+
+def stream_ingest(client, bucket_name, prefix, filtered_dir, raw_dir=None, download_workers=4,
+                  filter_workers=2, queue_size=8, min_size=256000, delete_small=False, partition_sites=False,
+                  memory_budget=None):
+    """
+    Fused download-and-filter ingest. A lister feeds object keys into a bounded queue,
+    `download_workers` threads stream object bodies from S3 and hand them to
+    `filter_workers` processes, and the calling thread writes the filtered snapshots
+    (deduplicated via SnapshotIndex). Both queues are bounded by `queue_size`, so a slow
+    stage pauses the ones before it instead of buffering whole recordings in memory.
+    Raw recordings are only written to `raw_dir` when it is given.
+
+    With `partition_sites`, each recording goes to its site's folder (see sites.py): the
+    site is taken from the key (`<prefix><site>/<file>.json`), else from the recording's
+    metadata, else the default site.
+
+    With a `memory_budget` (bytes, for this process and its filter workers), the number
+    of recordings downloaded but not yet written shrinks while memory nears the budget
+    (see memory_budget.MemoryGovernor) instead of always allowing a full pipeline.
+    """
+    os.makedirs(filtered_dir, exist_ok=True)
+    if raw_dir:
+        os.makedirs(raw_dir, exist_ok=True)
+
+    keys = queue.Queue(maxsize=queue_size)
+    results = queue.Queue(maxsize=queue_size)
+    stats = {"listed": 0, "skipped_small": 0, "downloaded": 0, "bytes": 0, "filtered": 0,
+             "duplicates": 0, "errors": 0, "sites": {}}
+    stats_lock = threading.Lock()
+    # Every recording in flight holds its raw body (and parsed events in a filter worker)
+    governor = MemoryGovernor(memory_budget, download_workers + queue_size)
+    start = time.perf_counter()
+
+    def count(name, amount=1):
+        with stats_lock:
+            stats[name] += amount
+
+    def list_keys():
+        try:
+            for obj in iter_objects(client, bucket_name, prefix):
+                key = obj["Key"]
+                if not key.endswith(".json"):
+                    continue
+                count("listed")
+                if obj.get("Size", 0) <= min_size:
+                    count("skipped_small")
+                    if delete_small:
+                        print(f"Deleting: {key} ({obj.get('Size', 0)} bytes) as it is smaller than {min_size} bytes")
+                        client.delete_object(Bucket=bucket_name, Key=key)
+                    continue
+                keys.put(key)
+        finally:
+            for _ in range(download_workers):
+                keys.put(_DONE)
+
+    def download(filter_pool):
+        while True:
+            key = keys.get()
+            if key is _DONE:
+                results.put(_DONE)
+                return
+            governor.acquire()
+            try:
+                body = client.get_object(Bucket=bucket_name, Key=key)["Body"]
+                data = body.read()
+                body.close()
+                count("downloaded")
+                count("bytes", len(data))
+
+                stem = recording_stem(sanitize_filename(os.path.basename(key)))
+                key_site = site_from_key(key, prefix) if partition_sites else None
+                if raw_dir:
+                    site_raw_dir = site_dir(raw_dir, key_site)
+                    os.makedirs(site_raw_dir, exist_ok=True)
+                    with open_recording(os.path.join(site_raw_dir, recording_filename(stem)), 'wb') as f:
+                        f.write(data)
+                    recording_index(site_raw_dir).add(recording_filename(stem))
+
+                if filter_pool is not None:
+                    future = filter_pool.submit(filter_raw_bytes, data, partition_sites)
+                else:
+                    future = filter_raw_bytes(data, partition_sites)
+                results.put((key, stem, key_site, future))
+            except Exception as e:
+                print(f"Error downloading {key}: {e}")
+                count("errors")
+                governor.release()
+
+    # One snapshot index per output folder (i.e. per site), and one day-partitioned recording
+    # index per folder written to (raw ones included, shared by the download threads)
+    snapshot_indexes = {}
+    recording_indexes = {}
+    recording_indexes_lock = threading.Lock()
+
+    def recording_index(folder):
+        with recording_indexes_lock:
+            if folder not in recording_indexes:
+                recording_indexes[folder] = RecordingIndex(folder)
+            return recording_indexes[folder]
+
+    filter_pool = None
+    if filter_workers > 0:
+        # spawn rather than fork: the caller (e.g. the Flask app) already runs threads and torch
+        filter_pool = ProcessPoolExecutor(max_workers=filter_workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        threads = [threading.Thread(target=list_keys, daemon=True)]
+        threads += [threading.Thread(target=download, args=(filter_pool,), daemon=True) for _ in range(download_workers)]
+        for thread in threads:
+            thread.start()
+
+        finished_downloaders = 0
+        while finished_downloaders < download_workers:
+            item = results.get()
+            if item is _DONE:
+                finished_downloaders += 1
+                continue
+
+            key, stem, key_site, future = item
+            try:
+                filtered_events = future.result() if filter_pool is not None else future
+            except Exception as e:
+                print(f"Error filtering {key}: {e}")
+                count("errors")
+                continue
+            finally:
+                governor.release()
+
+            site = DEFAULT_SITE
+            if partition_sites:
+                filtered_events, metadata_site = filtered_events
+                site = key_site or metadata_site or DEFAULT_SITE
+            output_dir = site_dir(filtered_dir, site)
+            if output_dir not in snapshot_indexes:
+                os.makedirs(output_dir, exist_ok=True)
+                snapshot_indexes[output_dir] = SnapshotIndex(output_dir)
+
+            filtered_filename = recording_filename(stem + "-filtered")
+            if not snapshot_indexes[output_dir].add(filtered_events, filtered_filename):
+                count("duplicates")
+                continue
+            dump_recording(filtered_events, os.path.join(output_dir, filtered_filename))
+            recording_index(output_dir).add(filtered_filename)
+            count("filtered")
+            with stats_lock:
+                stats["sites"][site] = stats["sites"].get(site, 0) + 1
+            print(f"Filtered recording saved: {os.path.join(output_dir, filtered_filename)}")
+
+        for thread in threads:
+            thread.join()
+    finally:
+        if filter_pool is not None:
+            filter_pool.shutdown()
+        for output_dir, snapshot_index in snapshot_indexes.items():
+            # Date each stored snapshot by its newest duplicate, so time windows still pick it up
+            recording_index(output_dir).redate(snapshot_index.last_seen())
+            snapshot_index.save()
+        for index in recording_indexes.values():
+            index.save()
+
+    if memory_budget:
+        stats["memory"] = governor.stats()
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    print(f"Streaming ingest complete: {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream recordings from S3 straight into filtered snapshots.")
+    parser.add_argument("--bucket", default=os.getenv("S3_BUCKET_NAME"))
+    parser.add_argument("--prefix", default="events/")
+    parser.add_argument("--filtered-dir", default="./s3_filter_rec")
+    parser.add_argument("--raw-dir", default=None, help="also keep the raw recordings here")
+    parser.add_argument("--download-workers", type=int, default=4)
+    parser.add_argument("--filter-workers", type=int, default=2)
+    parser.add_argument("--queue-size", type=int, default=8)
+    parser.add_argument("--min-size", type=int, default=256000, help="skip objects of at most this many bytes")
+    parser.add_argument("--partition-sites", action="store_true", help="write each site's recordings to its own folder")
+    parser.add_argument("--memory-budget-mb", type=float, default=0,
+                        help="throttle in-flight recordings to stay within this much memory")
+    parser.add_argument("--local-s3", default=None, help="read from a local directory instead of S3 (<dir>/<bucket>/<key>)")
+    args = parser.parse_args()
+
+    if args.local_s3:
+        from local_s3 import LocalS3Client
+        client = LocalS3Client(args.local_s3)
+    else:
+        import boto3
+        from dotenv import load_dotenv
+        load_dotenv()
+        client = boto3.client(
+            's3',
+            aws_access_key_id=os.getenv('AWS_ACCESS_KEY'),
+            aws_secret_access_key=os.getenv('AWS_SECRET_KEY'),
+            region_name=os.getenv('AWS_REGION')
+        )
+
+    stream_ingest(client, args.bucket, args.prefix, args.filtered_dir, raw_dir=args.raw_dir,
+                  download_workers=args.download_workers, filter_workers=args.filter_workers,
+                  queue_size=args.queue_size, min_size=args.min_size, partition_sites=args.partition_sites,
+                  memory_budget=int(args.memory_budget_mb * 1024 * 1024) or None)
@@ -0,0 +1,177 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import importlib
+import threading
+import contextlib
+import http.client
+from urllib.parse import urlsplit
+import numpy as np
+
+# Endpoints exercised by default, as path:weight
+DEFAULT_MIX = {"app": "/run-rl:1", "rl_api": "/run-rl:1"}
+
+
+class StubPolicy:
+    """Stand-in for the PPO model with the same predict() signature and action shape."""
+
+    def __init__(self, action_space, seed=0):
+        self.action_space = action_space
+        self.rng = np.random.default_rng(seed)
+
+    def predict(self, obs, state=None, episode_start=None, deterministic=False):
+        low, high = self.action_space.low, self.action_space.high
+        return self.rng.uniform(low, high).astype(self.action_space.dtype), None
+
+
+def parse_mix(mix):
+    """Parse "/run-rl:1,/scheme/current:4" into ([paths], [weights])."""
+    paths, weights = [], []
+    for part in mix.split(","):
+        path, _, weight = part.strip().partition(":")
+        paths.append(path)
+        weights.append(float(weight or 1))
+    return paths, weights
+
+
+def boot_app(target, stub=False):
+    """Import app.py / rl_api.py, optionally swap in a stub policy, and serve it on a free port."""
+    from werkzeug.serving import make_server
+
+    module = importlib.import_module(target)
+    if stub:
+        policy = StubPolicy(module.env.action_space)
+        if target == "app":
+            module.model_router.load_fn = lambda version: policy
+            module.model_router.current = ("stub", policy)
+        else:
+            module.current_model = policy
+    else:
+        module.load_or_train_model()
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}", module
+
+
+def run_load(url, paths, weights, concurrency, duration, warmup=0.0, timeout=30.0, seed=0):
+    """
+    Drive `concurrency` client threads, each with a keep-alive connection, for
+    `warmup + duration` seconds. Only requests finished after the warmup are recorded.
+    Returns {path: [(latency_seconds, ok), ...]}.
+    """
+    parts = urlsplit(url)
+    connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+    start = time.perf_counter()
+    measure_from = start + warmup
+    stop_at = measure_from + duration
+    results = {path: [] for path in paths}
+    lock = threading.Lock()
+
+    def client(index):
+        rng = random.Random(seed + index)
+        connection = connection_class(parts.hostname, parts.port, timeout=timeout)
+        samples = []
+        while time.perf_counter() < stop_at:
+            path = rng.choices(paths, weights)[0]
+            sent = time.perf_counter()
+            try:
+                connection.request("GET", path)
+                response = connection.getresponse()
+                response.read()
+                ok = response.status < 400
+            except (OSError, http.client.HTTPException):
+                ok = False
+                connection.close()
+                connection = connection_class(parts.hostname, parts.port, timeout=timeout)
+            finished = time.perf_counter()
+            if sent >= measure_from:
+                samples.append((path, finished - sent, ok))
+        connection.close()
+        with lock:
+            for path, latency, ok in samples:
+                results[path].append((latency, ok))
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def summarize(samples, duration):
+    latencies = np.array([latency for latency, _ in samples]) * 1000
+    errors = sum(1 for _, ok in samples if not ok)
+    summary = {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+        "throughput_rps": round(len(samples) / duration, 2),
+    }
+    if len(latencies):
+        summary["latency_ms"] = {
+            "mean": round(float(latencies.mean()), 2),
+            "p50": round(float(np.percentile(latencies, 50)), 2),
+            "p95": round(float(np.percentile(latencies, 95)), 2),
+            "p99": round(float(np.percentile(latencies, 99)), 2),
+            "max": round(float(latencies.max()), 2),
+        }
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the RL serving endpoints and report latency percentiles.")
+    parser.add_argument("--target", choices=["app", "rl_api"], default="app", help="which Flask app to boot")
+    parser.add_argument("--url", default=None, help="test an already running server instead of booting one")
+    parser.add_argument("--stub", action="store_true", help="serve a stub policy instead of saved_model/ppo_model.zip")
+    parser.add_argument("--mix", default=None, help="weighted request mix, e.g. /run-rl:1,/scheme/current:4")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=20.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unmeasured seconds before the measurement")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep-outputs", action="store_true", help="keep the new_files/ written during the run")
+    parser.add_argument("--out", default=None, help="also write the JSON report here")
+    args = parser.parse_args()
+
+    paths, weights = parse_mix(args.mix or DEFAULT_MIX[args.target])
+    existing_outputs = set(os.listdir("new_files")) if os.path.isdir("new_files") else set()
+
+    # Silence the per-request prints of the app while measuring
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        server = None
+        url = args.url
+        if url is None:
+            server, url, _ = boot_app(args.target, stub=args.stub)
+        try:
+            results = run_load(url, paths, weights, args.concurrency, args.duration,
+                               warmup=args.warmup, seed=args.seed)
+        finally:
+            if server is not None:
+                server.shutdown()
+
+    if not args.keep_outputs and os.path.isdir("new_files"):
+        for filename in set(os.listdir("new_files")) - existing_outputs:
+            os.remove(os.path.join("new_files", filename))
+
+    all_samples = [sample for samples in results.values() for sample in samples]
+    report = {
+        "target": args.url or args.target,
+        "model": "stub" if args.stub else "saved_model",
+        "concurrency": args.concurrency,
+        "duration_s": args.duration,
+        "mix": dict(zip(paths, weights)),
+        "cpu_count": os.cpu_count(),
+        "python": sys.version.split()[0],
+        **summarize(all_samples, args.duration),
+        "endpoints": {path: summarize(samples, args.duration) for path, samples in results.items()},
+    }
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
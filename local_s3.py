@@ -0,0 +1,55 @@
+import os
+import shutil
+
+
+class LocalS3Client:
+    """
+    Minimal stand-in for the boto3 S3 client backed by a local directory, where
+    `root/<bucket>/<key>` holds each object. Implements the calls the ingest code uses.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, bucket, key):
+        return os.path.join(self.root, bucket, *key.split("/"))
+
+    def list_objects_v2(self, Bucket, Prefix="", ContinuationToken=None, MaxKeys=1000):
+        bucket_dir = os.path.join(self.root, Bucket)
+        keys = []
+        for dirpath, _, filenames in os.walk(bucket_dir):
+            for filename in filenames:
+                key = os.path.relpath(os.path.join(dirpath, filename), bucket_dir).replace(os.sep, "/")
+                if key.startswith(Prefix):
+                    keys.append(key)
+        keys.sort()
+
+        start = int(ContinuationToken) if ContinuationToken else 0
+        page = keys[start:start + MaxKeys]
+        response = {"KeyCount": len(page), "IsTruncated": start + MaxKeys < len(keys)}
+        if page:
+            response["Contents"] = [
+                {"Key": key, "Size": os.path.getsize(self._path(Bucket, key))} for key in page
+            ]
+        if response["IsTruncated"]:
+            response["NextContinuationToken"] = str(start + MaxKeys)
+        return response
+
+    def head_object(self, Bucket, Key):
+        return {"ContentLength": os.path.getsize(self._path(Bucket, Key))}
+
+    def get_object(self, Bucket, Key):
+        path = self._path(Bucket, Key)
+        return {"Body": open(path, 'rb'), "ContentLength": os.path.getsize(path)}
+
+    def put_object(self, Bucket, Key, Body):
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(Body if isinstance(Body, bytes) else Body.encode())
+
+    def download_file(self, Bucket, Key, Filename):
+        shutil.copyfile(self._path(Bucket, Key), Filename)
+
+    def delete_object(self, Bucket, Key):
+        os.remove(self._path(Bucket, Key))
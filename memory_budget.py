@@ -0,0 +1,381 @@
+import os
+import json
+import time
+import argparse
+import resource
+import threading
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+# Memory budget of the whole process tree (app + filter / training workers) in MB, 0 = none.
+# A stage can have its own: MEMORY_BUDGET_DOWNLOAD_MB, _FILTER_, _INGEST_, _TRAIN_, _SERVE_MB
+MEMORY_BUDGET_MB = float(os.getenv('MEMORY_BUDGET_MB', '0'))
+# Also trace Python allocations per stage (costs CPU, so off by default)
+MEMORY_TRACEMALLOC = os.getenv('MEMORY_TRACEMALLOC', '0') == '1'
+# Track and report per-stage memory even without a budget
+MEMORY_TRACKING = os.getenv('MEMORY_TRACKING', '0') == '1'
+MEMORY_SAMPLE_INTERVAL = float(os.getenv('MEMORY_SAMPLE_INTERVAL', '0.5'))
+
+# 'ingest' is the fused stream download + filter; 'serve' is everything outside the other stages
+STAGES = ("download", "filter", "ingest", "train", "serve")
+# Guardrails back off above SOFT_LIMIT of a budget and recover below LOW_WATER
+SOFT_LIMIT = 0.8
+LOW_WATER = 0.6
+
+MB = 1024 * 1024
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def stage_budget(stage):
+    """Budget of `stage` in bytes (its own, else MEMORY_BUDGET_MB), None without one."""
+    mb = float(os.getenv(f"MEMORY_BUDGET_{stage.upper()}_MB", '0')) or MEMORY_BUDGET_MB
+    return int(mb * MB) or None
+
+
+def memory_tracking_enabled():
+    """Whether tracking was asked for: MEMORY_TRACKING, MEMORY_TRACEMALLOC or any budget."""
+    return MEMORY_TRACKING or MEMORY_TRACEMALLOC or any(stage_budget(stage) for stage in STAGES)
+
+
+def process_rss(pid):
+    """Resident set size of `pid` in bytes (0 if it is gone)."""
+    try:
+        with open(f"/proc/{pid}/statm", 'r') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def _descendants(pid):
+    parents = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return []
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", 'r') as f:
+                # The command name may contain spaces, so split after its closing parenthesis
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        parents.setdefault(ppid, []).append(int(entry))
+    found, stack = [], [pid]
+    while stack:
+        children = parents.get(stack.pop(), [])
+        found.extend(children)
+        stack.extend(children)
+    return found
+
+
+def tree_rss(pid=None):
+    """(own RSS, RSS of all descendant processes) in bytes, e.g. filter pools and the training worker."""
+    pid = pid or os.getpid()
+    if not os.path.exists("/proc"):
+        # No procfs: fall back to the process's lifetime peak (kilobytes on Linux, bytes on macOS)
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return (maxrss if os.uname().sysname == "Darwin" else maxrss * 1024), 0
+    return process_rss(pid), sum(process_rss(child) for child in _descendants(pid))
+
+
+def _reset_peak_rss():
+    """Reset the kernel's high-water mark of this process (VmHWM), where supported."""
+    try:
+        with open("/proc/self/clear_refs", 'w') as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss():
+    """VmHWM of this process in bytes (0 if unavailable)."""
+    try:
+        with open("/proc/self/status", 'r') as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+class MemoryTracker:
+    """
+    Per-stage memory accounting for the pipeline. A sampler thread reads the RSS of this
+    process and its descendants every `interval` seconds and charges it to the innermost
+    active stage(); time outside any stage counts as 'serve'. The process's own peak also
+    comes from the kernel high-water mark, reset at each stage boundary, so short spikes
+    between samples are not missed. With `trace`, tracemalloc's peak and top allocation
+    sites are kept per stage too (this process only). report() closes a cycle.
+    Until start() is called nothing is sampled and stage() does nothing.
+
+    Guards registered with add_guard(stage, fn) are called with the budget pressure
+    (tree RSS / budget) after every sample taken during that stage, so it can shed memory
+    before the budget is exceeded.
+    """
+
+    def __init__(self, interval=MEMORY_SAMPLE_INTERVAL, trace=MEMORY_TRACEMALLOC, history=10):
+        self.interval = interval
+        self.trace = trace
+        self.reports = deque(maxlen=history)
+        self._stack = []
+        self._guards = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._cycle_started = time.time()
+        self._stages = {}
+        self._hwm = False
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        if self._thread is None:
+            self._hwm = _reset_peak_rss()
+            if self.trace and not tracemalloc.is_tracing():
+                tracemalloc.start()
+            self._thread = threading.Thread(target=self._run, name="memory-tracker", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def add_guard(self, stage, fn):
+        self._guards.setdefault(stage, []).append(fn)
+
+    def current_stage(self):
+        with self._lock:
+            return self._stack[-1] if self._stack else "serve"
+
+    def _entry(self, stage):
+        entry = self._stages.get(stage)
+        if entry is None:
+            entry = self._stages[stage] = {"runs": 0, "seconds": 0.0, "peak_rss": 0, "peak_rss_self": 0,
+                                           "peak_rss_children": 0, "traced_peak": 0, "top_allocations": None}
+        return entry
+
+    def _charge(self, stage, own, children):
+        entry = self._entry(stage)
+        entry["peak_rss"] = max(entry["peak_rss"], own + children)
+        entry["peak_rss_self"] = max(entry["peak_rss_self"], own)
+        entry["peak_rss_children"] = max(entry["peak_rss_children"], children)
+
+    def sample(self):
+        own, children = tree_rss()
+        with self._lock:
+            stage = self._stack[-1] if self._stack else "serve"
+            self._charge(stage, own, children)
+        budget = stage_budget(stage)
+        if budget:
+            for guard in self._guards.get(stage, []):
+                try:
+                    guard((own + children) / budget)
+                except Exception as e:
+                    print(f"Error in memory guard for stage {stage}: {e}")
+        return own + children
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def _close_segment(self, stage):
+        """Charge the kernel / tracemalloc peaks since the last stage boundary to `stage` and reset them."""
+        entry = self._entry(stage)
+        if self._hwm:
+            entry["peak_rss_self"] = max(entry["peak_rss_self"], _peak_rss())
+            entry["peak_rss"] = max(entry["peak_rss"], entry["peak_rss_self"] + entry["peak_rss_children"])
+            _reset_peak_rss()
+        if self.trace and tracemalloc.is_tracing():
+            entry["traced_peak"] = max(entry["traced_peak"], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+
+    @contextmanager
+    def stage(self, name):
+        """Charge the memory used until the block exits to stage `name`."""
+        if not self.running:
+            yield self
+            return
+        with self._lock:
+            self._close_segment(self._stack[-1] if self._stack else "serve")
+            self._stack.append(name)
+            self._entry(name)["runs"] += 1
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.sample()
+            with self._lock:
+                self._close_segment(name)
+                entry = self._entry(name)
+                entry["seconds"] += time.perf_counter() - start
+                if self.trace and tracemalloc.is_tracing():
+                    # Allocations still live when the stage ends, i.e. what it left behind
+                    snapshot = tracemalloc.take_snapshot().filter_traces([
+                        tracemalloc.Filter(False, tracemalloc.__file__),
+                        tracemalloc.Filter(False, __file__),
+                        tracemalloc.Filter(False, threading.__file__),
+                    ])
+                    entry["top_allocations"] = [
+                        {"location": str(stat.traceback[0]), "size_mb": round(stat.size / MB, 3)}
+                        for stat in snapshot.statistics("lineno")[:5]]
+                self._stack.remove(name)
+
+    def peak(self, stage):
+        """Peak tree RSS of `stage` in the current cycle, in bytes (0 if it hasn't run)."""
+        with self._lock:
+            return self._stages.get(stage, {}).get("peak_rss", 0)
+
+    def report(self, reset=True):
+        """Peak memory by stage since the last report; starts a new cycle when `reset`."""
+        self.sample()
+        with self._lock:
+            self._close_segment(self._stack[-1] if self._stack else "serve")
+            stages = {}
+            for stage, entry in self._stages.items():
+                budget = stage_budget(stage)
+                stages[stage] = {
+                    "runs": entry["runs"],
+                    "seconds": round(entry["seconds"], 3),
+                    "peak_rss_mb": round(entry["peak_rss"] / MB, 1),
+                    "peak_rss_self_mb": round(entry["peak_rss_self"] / MB, 1),
+                    "peak_rss_children_mb": round(entry["peak_rss_children"] / MB, 1),
+                    "budget_mb": round(budget / MB, 1) if budget else None,
+                    "over_budget": bool(budget and entry["peak_rss"] > budget),
+                }
+                if self.trace:
+                    stages[stage]["traced_peak_mb"] = round(entry["traced_peak"] / MB, 1)
+                    stages[stage]["top_allocations"] = entry["top_allocations"]
+            report = {"started_at": self._cycle_started, "ended_at": time.time(), "stages": stages}
+            if reset:
+                self.reports.append(report)
+                self._stages = {}
+                self._cycle_started = report["ended_at"]
+        return report
+
+
+class MemoryGovernor:
+    """
+    Concurrency limit for a stage under a memory budget: work items acquire() a slot
+    before allocating (e.g. downloading a recording) and release() it once their memory
+    is freed. While the process tree's RSS is above SOFT_LIMIT of the budget the limit
+    halves, and it grows back by one while RSS stays under LOW_WATER. Without a budget
+    the limit stays at `limit`.
+    """
+
+    def __init__(self, budget, limit, min_limit=1, interval=0.2):
+        self.budget = budget
+        self.max_limit = max(min_limit, limit)
+        self.min_limit = min_limit
+        self.limit = self.max_limit
+        self.interval = interval
+        self.in_flight = 0
+        self.throttled = 0
+        self.peak_rss = 0
+        self._checked_at = 0.0
+        self._cond = threading.Condition()
+
+    def _check(self):
+        now = time.monotonic()
+        if not self.budget or now - self._checked_at < self.interval:
+            return
+        self._checked_at = now
+        rss = sum(tree_rss())
+        self.peak_rss = max(self.peak_rss, rss)
+        if rss > self.budget * SOFT_LIMIT:
+            if self.limit > self.min_limit:
+                self.limit = max(self.min_limit, self.limit // 2)
+                self.throttled += 1
+                print(f"Memory at {rss / MB:.0f}/{self.budget / MB:.0f} MB, limiting concurrency to {self.limit}")
+        elif rss < self.budget * LOW_WATER and self.limit < self.max_limit:
+            self.limit += 1
+
+    def acquire(self):
+        with self._cond:
+            self._check()
+            while self.in_flight >= self.limit:
+                self._cond.wait(self.interval)
+                self._check()
+            self.in_flight += 1
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {"limit": self.limit, "max_limit": self.max_limit, "throttled": self.throttled,
+                    "peak_rss_mb": round(self.peak_rss / MB, 1),
+                    "budget_mb": round(self.budget / MB, 1) if self.budget else None}
+
+
+class BatchSizer:
+    """
+    Batch parameters for a stage that can't change them mid-run (PPO's rollout and
+    minibatch sizes are fixed once training starts): after each run, observe() its peak
+    RSS; above SOFT_LIMIT of the budget the next run uses half the batch sizes (down to
+    `minimums`), below LOW_WATER they double back towards `params`.
+    """
+
+    def __init__(self, budget, params, minimums):
+        self.budget = budget
+        self.params = dict(params)
+        self.minimums = dict(minimums)
+        self.scale = 1.0
+        self.min_scale = max(self.minimums[name] / value for name, value in self.params.items())
+
+    def overrides(self):
+        """Batch parameters for the next run ({} at full size)."""
+        if self.scale >= 1.0:
+            return {}
+        return {name: max(self.minimums[name], int(value * self.scale)) for name, value in self.params.items()}
+
+    def observe(self, peak_rss):
+        if not self.budget or not peak_rss:
+            return self.overrides()
+        if peak_rss > self.budget * SOFT_LIMIT and self.scale > self.min_scale:
+            self.scale = max(self.min_scale, self.scale / 2)
+            print(f"Peak memory {peak_rss / MB:.0f}/{self.budget / MB:.0f} MB, next run uses {self.overrides()}")
+        elif peak_rss < self.budget * LOW_WATER and self.scale < 1.0:
+            self.scale = min(1.0, self.scale * 2)
+        return self.overrides()
+
+
+def estimated_json_bytes(path, expansion=8):
+    """
+    Rough memory needed to json.load a recording: its uncompressed size times `expansion`
+    (Python objects are several times larger than the text). Gzip files store their
+    uncompressed size (mod 4 GiB) in the last 4 bytes; zstd is assumed to compress 10x.
+    """
+    size = os.path.getsize(path)
+    if path.endswith(".gz") and size >= 4:
+        with open(path, 'rb') as f:
+            f.seek(-4, os.SEEK_END)
+            size = max(size, int.from_bytes(f.read(4), "little"))
+    elif path.endswith(".zst"):
+        size *= 10
+    return size * expansion
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show the configured memory budgets and current usage.")
+    parser.add_argument("--pid", type=int, default=None, help="measure this process tree instead of this one")
+    args = parser.parse_args()
+
+    own, children = tree_rss(args.pid)
+    print(json.dumps({
+        "rss_mb": round(own / MB, 1),
+        "children_rss_mb": round(children / MB, 1),
+        "budgets_mb": {stage: (round(stage_budget(stage) / MB, 1) if stage_budget(stage) else None)
+                       for stage in STAGES},
+    }, indent=2))
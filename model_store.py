@@ -0,0 +1,355 @@
+import os
+import json
+import time
+import random
+import shutil
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+MODEL_FILENAME = "ppo_model.zip"
+
+
+def _atomic_write_json(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+class ModelStore:
+    """
+    Versioned model artifacts under `root`:
+
+        root/versions/<version>/ppo_model.zip   immutable published models
+        root/versions/<version>/meta.json
+        root/current.json                       {"version": ..., "history": [...]}
+        root/ppo_model.zip                      copy of the current model for legacy readers
+
+    Versions are published by building the directory under a temporary name and
+    renaming it into place, and the current pointer is swapped with os.replace(), so
+    readers never see a partially written model. A `read_only` store only looks up
+    versions and never creates or changes anything under `root`.
+    """
+
+    def __init__(self, root="saved_model", keep=5, read_only=False):
+        self.root = root
+        self.keep = keep
+        self.read_only = read_only
+        self.versions_dir = os.path.join(root, "versions")
+        self.pointer_path = os.path.join(root, "current.json")
+        self.legacy_path = os.path.join(root, MODEL_FILENAME)
+        self.pinned = set()  # Versions that must survive pruning (e.g. a live candidate)
+        self._lock = threading.Lock()
+        if not read_only:
+            os.makedirs(self.versions_dir, exist_ok=True)
+
+    def path(self, version):
+        return os.path.join(self.versions_dir, version, MODEL_FILENAME)
+
+    def metadata(self, version):
+        with open(os.path.join(self.versions_dir, version, "meta.json"), 'r') as f:
+            return json.load(f)
+
+    def list_versions(self):
+        """Published versions, oldest first."""
+        if not os.path.isdir(self.versions_dir):
+            return []
+        versions = [v for v in os.listdir(self.versions_dir)
+                    if not v.startswith('.') and os.path.exists(self.path(v))]
+        return sorted(versions)
+
+    def _read_pointer(self):
+        if not os.path.exists(self.pointer_path):
+            return {"version": None, "history": []}
+        with open(self.pointer_path, 'r') as f:
+            return json.load(f)
+
+    def current_version(self):
+        return self._read_pointer()["version"]
+
+    def publish(self, source_path, metadata=None, make_current=True, move=False):
+        """Add the model at `source_path` as a new version and (optionally) make it current."""
+        self._check_writable()
+        with self._lock:
+            version = f"v{int(time.time() * 1000)}"
+            while os.path.exists(os.path.join(self.versions_dir, version)):
+                version = f"v{int(version[1:]) + 1}"
+
+            staging_dir = os.path.join(self.versions_dir, f".{version}.tmp")
+            os.makedirs(staging_dir, exist_ok=True)
+            (shutil.move if move else shutil.copyfile)(source_path, os.path.join(staging_dir, MODEL_FILENAME))
+            _atomic_write_json(os.path.join(staging_dir, "meta.json"), {
+                "version": version,
+                "published_at": time.time(),
+                **(metadata or {}),
+            })
+            os.replace(staging_dir, os.path.join(self.versions_dir, version))
+            print(f"Published model version {version}")
+
+        if make_current:
+            self.set_current(version)
+        return version
+
+    def _check_writable(self):
+        if self.read_only:
+            raise ValueError(f"Model store {self.root} is read-only")
+
+    def set_current(self, version, record_history=True):
+        self._check_writable()
+        with self._lock:
+            if not os.path.exists(self.path(version)):
+                raise ValueError(f"Unknown model version: {version}")
+            pointer = self._read_pointer()
+            history = pointer["history"]
+            if record_history and pointer["version"] and pointer["version"] != version:
+                history.append(pointer["version"])
+            _atomic_write_json(self.pointer_path, {"version": version, "history": history[-50:]})
+
+            # Keep the legacy single-file path in sync for scripts that still read it
+            tmp_path = f"{self.legacy_path}.{os.getpid()}.tmp"
+            shutil.copyfile(self.path(version), tmp_path)
+            os.replace(tmp_path, self.legacy_path)
+        self.prune()
+        return version
+
+    def rollback(self):
+        """Make the previously current version current again and return it."""
+        self._check_writable()
+        pointer = self._read_pointer()
+        history = [v for v in pointer["history"] if os.path.exists(self.path(v))]
+        if not history:
+            raise ValueError("No previous model version to roll back to")
+        previous = history.pop()
+        with self._lock:
+            _atomic_write_json(self.pointer_path, {"version": pointer["version"], "history": history})
+        self.set_current(previous, record_history=False)
+        print(f"Rolled back model from {pointer['version']} to {previous}")
+        return previous
+
+    def prune(self):
+        """Delete all but the newest `keep` versions, never touching the current or pinned ones."""
+        if not self.keep or self.read_only:
+            return []
+        keep = set(self.list_versions()[-self.keep:]) | {self.current_version()} | self.pinned
+        removed = [v for v in self.list_versions() if v not in keep]
+        for version in removed:
+            shutil.rmtree(os.path.join(self.versions_dir, version), ignore_errors=True)
+        return removed
+
+
+class ModelRouter:
+    """
+    Keep the current model and an optional candidate resident and decide which one serves
+    each request. In "ab" mode a `fraction` of requests is served by the candidate; in
+    "shadow" mode the current model always serves and the candidate is evaluated on the
+    same observation for comparison only.
+    """
+
+    def __init__(self, load_fn):
+        self.load_fn = load_fn
+        self.current = None
+        self.candidate = None
+        self.mode = "off"
+        self.fraction = 0.0
+        self._lock = threading.Lock()
+        self.stats = {}
+
+    def set_current(self, version):
+        model = self.load_fn(version)
+        with self._lock:
+            self.current = (version, model)
+        return version
+
+    def set_candidate(self, version, mode="shadow", fraction=0.1):
+        if mode not in ("ab", "shadow"):
+            raise ValueError("Candidate mode must be 'ab' or 'shadow'")
+        model = self.load_fn(version)
+        with self._lock:
+            self.candidate = (version, model)
+            self.mode = mode
+            self.fraction = float(fraction)
+            self.stats = {}
+        return version
+
+    def clear_candidate(self):
+        with self._lock:
+            self.candidate = None
+            self.mode = "off"
+            self.stats = {}
+
+    def route(self):
+        """Return (serving, shadow) where each is a (version, model) pair or None."""
+        with self._lock:
+            current, candidate, mode, fraction = self.current, self.candidate, self.mode, self.fraction
+        if candidate is None or mode == "off":
+            return current, None
+        if mode == "ab":
+            return (candidate if random.random() < fraction else current), None
+        return current, candidate
+
+    def record(self, version, reward, action=None, reference_action=None):
+        """Accumulate per-version reward statistics (and action distance for shadow runs)."""
+        with self._lock:
+            stats = self.stats.setdefault(version, {"requests": 0, "reward_sum": 0.0, "action_distance_sum": 0.0})
+            stats["requests"] += 1
+            stats["reward_sum"] += float(reward)
+            if action is not None and reference_action is not None:
+                stats["action_distance_sum"] += float(np.abs(np.asarray(action) - np.asarray(reference_action)).mean())
+
+    def summary(self):
+        with self._lock:
+            return {
+                "current": self.current[0] if self.current else None,
+                "candidate": self.candidate[0] if self.candidate else None,
+                "mode": self.mode,
+                "fraction": self.fraction,
+                "stats": {
+                    version: {
+                        "requests": s["requests"],
+                        "mean_reward": s["reward_sum"] / s["requests"],
+                        "mean_action_distance": s["action_distance_sum"] / s["requests"],
+                    }
+                    for version, s in self.stats.items()
+                },
+            }
+
+
+def model_nbytes(model):
+    """Approximate resident size of a served model: policy weights plus optimizer state."""
+    if hasattr(model, "nbytes"):
+        return model.nbytes()  # QuantizedPolicy
+    policy = model.policy
+    total = sum(t.numel() * t.element_size() for t in policy.state_dict().values())
+    optimizer = getattr(policy, "optimizer", None)
+    if optimizer is not None:
+        for state in optimizer.state.values():
+            total += sum(t.numel() * t.element_size() for t in state.values() if hasattr(t, "numel"))
+    return total
+
+
+class ModelRegistry:
+    """
+    Per-site models kept resident in LRU order. At most `capacity` sites stay loaded and
+    their total size (`size_fn`) stays within `memory_budget` bytes; the least recently
+    used sites are evicted first. A site that isn't resident is loaded by `load_fn(site)`
+    in a background thread, and get() returns None until it is ready, so a cold site
+    never blocks a request unless the caller asks to wait.
+    """
+
+    def __init__(self, load_fn, capacity=8, memory_budget=None, size_fn=model_nbytes, load_workers=2,
+                 retry_after=60.0, max_failed=256):
+        self.load_fn = load_fn
+        self.capacity = capacity
+        self.memory_budget = memory_budget
+        self.size_fn = size_fn
+        self.retry_after = retry_after
+        self.max_failed = max_failed
+        self.entries = OrderedDict()  # site -> {"model", "version", "nbytes", ...}, least recent first
+        self._loading = {}            # site -> Future
+        self._failed = OrderedDict()  # site -> (time, error), not retried for `retry_after` seconds
+        self._executor = ThreadPoolExecutor(max_workers=load_workers, thread_name_prefix="model-load")
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "loads": 0, "load_errors": 0, "evictions": 0}
+
+    def get(self, site, wait=None):
+        """The resident entry for `site`, or None while it loads (waiting up to `wait` seconds)."""
+        with self._lock:
+            entry = self.entries.get(site)
+            if entry is not None:
+                self.entries.move_to_end(site)
+                self.stats["hits"] += 1
+                return entry
+            self.stats["misses"] += 1
+            future = self._loading.get(site)
+            if future is None:
+                failed = self._failed.get(site)
+                if failed is not None and time.time() - failed[0] < self.retry_after:
+                    return None
+                future = self._loading[site] = self._executor.submit(self._load, site)
+        if wait:
+            try:
+                return future.result(timeout=wait)
+            except Exception:
+                return None
+        return None
+
+    def _load(self, site):
+        start = time.perf_counter()
+        try:
+            entry = dict(self.load_fn(site))
+            entry["nbytes"] = self.size_fn(entry["model"])
+        except Exception as e:
+            with self._lock:
+                self._loading.pop(site, None)
+                self._record_failure(site, str(e))
+                self.stats["load_errors"] += 1
+            print(f"Error loading model for site {site}: {e}")
+            raise
+        entry["loaded_at"] = time.time()
+        with self._lock:
+            self.entries[site] = entry
+            self.entries.move_to_end(site)
+            self._loading.pop(site, None)
+            self._failed.pop(site, None)
+            self.stats["loads"] += 1
+            evicted = self._evict(keep=site)
+        print(f"Loaded model {entry.get('version')} for site {site} ({entry['nbytes']} bytes) "
+              f"in {time.perf_counter() - start:.2f}s" + (f", evicted {evicted}" if evicted else ""))
+        return entry
+
+    def _record_failure(self, site, error):
+        # Failures only matter until they may be retried; expire those and keep at most `max_failed`
+        now = time.time()
+        self._failed.pop(site, None)
+        self._failed[site] = (now, error)
+        while self._failed:
+            oldest, (failed_at, _) = next(iter(self._failed.items()))
+            if now - failed_at < self.retry_after and len(self._failed) <= self.max_failed:
+                break
+            del self._failed[oldest]
+
+    def _evict(self, keep):
+        evicted = []
+        while len(self.entries) > 1 and (
+                len(self.entries) > self.capacity
+                or (self.memory_budget and self.resident_bytes() > self.memory_budget)):
+            victim = next(site for site in self.entries if site != keep)
+            del self.entries[victim]
+            self.stats["evictions"] += 1
+            evicted.append(victim)
+        return evicted
+
+    def resident_bytes(self):
+        return sum(entry["nbytes"] for entry in self.entries.values())
+
+    def reload(self, site):
+        """Drop `site`'s resident model (e.g. after publishing a new one) and load it again."""
+        with self._lock:
+            self.entries.pop(site, None)
+            self._failed.pop(site, None)
+            future = self._loading.get(site)
+        if future is not None:
+            # A load already in flight may have read the old version; load again once it is done
+            future.add_done_callback(lambda _: self.reload(site))
+            return
+        self.get(site)
+
+    def set_capacity(self, capacity):
+        """Change how many sites may stay resident, evicting the least recently used ones right away."""
+        with self._lock:
+            self.capacity = max(1, capacity)
+            return self._evict(keep=None)
+
+    def summary(self):
+        with self._lock:
+            return {
+                "capacity": self.capacity,
+                "memory_budget": self.memory_budget,
+                "resident_bytes": self.resident_bytes(),
+                "resident": {site: {"version": e.get("version"), "nbytes": e["nbytes"]} for site, e in self.entries.items()},
+                "loading": sorted(self._loading),
+                "failed": {site: error for site, (_, error) in self._failed.items()},
+                "stats": dict(self.stats),
+            }
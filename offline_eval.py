@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+from stable_baselines3 import PPO
+from environment import ColorEnv, ELEMENT_NAMES, calculate_reward_batch, list_recordings
+from model_store import ModelStore
+
+json_folder = "./filtered_recordings"
+model_dir = "saved_model"
+
+PERCENTILES = [5, 25, 50, 75, 95]
+
+
+def resolve_model_path(model):
+    """Accept a model zip path or a version id from the model store."""
+    if os.path.exists(model):
+        return model
+    store = ModelStore(model_dir, keep=0, read_only=True)
+    if model == "current":
+        model = store.current_version()
+    if model and os.path.exists(store.path(model)):
+        return store.path(model)
+    raise FileNotFoundError(f"No model file or store version named '{model}'")
+
+
+def load_corpus(folder=json_folder, seed=0):
+    """
+    Build the (N, 18) observation matrix for every recording in `folder`, using the same
+    color extraction as ColorEnv and seeded engagement metrics.
+    """
+    env = ColorEnv(json_folder=folder, files=sorted(list_recordings(folder)))
+    colors, files = [], []
+    for i, filename in enumerate(env.files):
+        try:
+            colors.append(env.load_json(i))
+            files.append(filename)
+        except Exception as e:
+            print(f"Skipping unreadable recording {filename}: {e}")
+
+    colors = np.array(colors, dtype=np.float32)
+    engagement = np.random.default_rng(seed).random((len(colors), 3)).astype(np.float32)
+    return np.concatenate([colors, engagement], axis=1), files
+
+
+def step_rewards(obs, actions):
+    """Vectorized ColorEnv.step: returns (next_obs, rewards) for a batch of observations/actions."""
+    next_obs = obs.copy()
+    next_obs[:, :15] = np.clip(obs[:, :15] + actions, 0, 1)
+
+    rewards = calculate_reward_batch(next_obs)
+    rewards += obs[:, 15] * 0.5
+    rewards += obs[:, 16] * 0.3
+    rewards -= obs[:, 17] * 0.2
+    rewards += 0.5 - np.mean(np.abs(actions), axis=1)
+    return next_obs, rewards
+
+
+def contrast_violations(obs):
+    """Boolean arrays for the constraints calculate_reward penalises."""
+    navbar_avg = obs[:, 3:6].mean(axis=1)
+    background_avg = obs[:, 6:9].mean(axis=1)
+    return {
+        "low_navbar_background_contrast": np.abs(navbar_avg - background_avg) < 0.2,
+        "dark_navbar": ~np.all(obs[:, 3:6] > 0.3, axis=1),
+        "dark_shepherd_button": ~np.all(obs[:, 12:15] > 0.3, axis=1),
+    }
+
+
+def evaluate(model_path, obs, deterministic=True):
+    """Predict actions for the whole corpus in one batched call and summarise the outcome."""
+    model = PPO.load(model_path)
+
+    start = time.perf_counter()
+    actions, _ = model.predict(obs, deterministic=deterministic)
+    predict_seconds = time.perf_counter() - start
+    next_obs, rewards = step_rewards(obs, actions)
+
+    drift = np.abs(next_obs[:, :15] - obs[:, :15]).reshape(-1, 5, 3).mean(axis=2) * 255
+    before = contrast_violations(obs)
+    after = contrast_violations(next_obs)
+
+    return {
+        "model": model_path,
+        "recordings": len(obs),
+        "predict_seconds": round(predict_seconds, 4),
+        "reward": {
+            "mean": float(rewards.mean()),
+            "std": float(rewards.std()),
+            "min": float(rewards.min()),
+            "max": float(rewards.max()),
+            **{f"p{p}": float(v) for p, v in zip(PERCENTILES, np.percentile(rewards, PERCENTILES))},
+        },
+        "color_drift": {
+            name: {"mean": float(drift[:, i].mean()), "max": float(drift[:, i].max())}
+            for i, name in enumerate(ELEMENT_NAMES)
+        },
+        "violation_rate": {
+            name: {"before": float(before[name].mean()), "after": float(after[name].mean())}
+            for name in before
+        },
+    }
+
+
+def compare(report_a, report_b):
+    """Differences (b - a) of the headline metrics of two reports."""
+    return {
+        "mean_reward": report_b["reward"]["mean"] - report_a["reward"]["mean"],
+        "median_reward": report_b["reward"]["p50"] - report_a["reward"]["p50"],
+        "violation_rate": {
+            name: report_b["violation_rate"][name]["after"] - report_a["violation_rate"][name]["after"]
+            for name in report_a["violation_rate"]
+        },
+        "mean_color_drift": {
+            name: report_b["color_drift"][name]["mean"] - report_a["color_drift"][name]["mean"]
+            for name in report_a["color_drift"]
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate saved policies offline on the whole recording corpus.")
+    parser.add_argument("models", nargs="+", help="model zip paths or model store versions ('current' for the live one)")
+    parser.add_argument("--json-folder", default=json_folder)
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic engagement metrics")
+    parser.add_argument("--stochastic", action="store_true", help="sample actions instead of using the policy mean")
+    parser.add_argument("--out", default=None, help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    obs, files = load_corpus(args.json_folder, seed=args.seed)
+    load_seconds = time.perf_counter() - start
+    print(f"Loaded {len(files)} recordings in {load_seconds:.2f}s")
+
+    reports = [evaluate(resolve_model_path(m), obs, deterministic=not args.stochastic) for m in args.models]
+    result = {"load_seconds": round(load_seconds, 4), "reports": reports}
+    if len(reports) == 2:
+        result["comparison"] = compare(reports[0], reports[1])
+
+    output = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output)
+        print(f"Report written to {args.out}")
+    else:
+        print(output)
@@ -0,0 +1,108 @@
+import io
+import os
+import sys
+import time
+import pstats
+import threading
+import tracemalloc
+from collections import Counter
+
+# Leaf frames of threads that are blocked waiting rather than doing work
+IDLE_LEAVES = {
+    "threading.py:wait",
+    "threading.py:_wait_for_tstate_lock",
+    "selectors.py:select",
+    "socketserver.py:serve_forever",
+    "socket.py:readinto",
+    "queues.py:get",
+    "connection.py:_recv",
+}
+
+# Only one profiling session per process at a time
+_session_lock = threading.Lock()
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+def run_exclusive(fn, *args, **kwargs):
+    """Run a profiling session, or raise ProfilerBusy if another one is in progress."""
+    if not _session_lock.acquire(blocking=False):
+        raise ProfilerBusy("A profiling session is already running")
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _session_lock.release()
+
+
+def _frame_name(frame):
+    return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}"
+
+
+def sample_stacks(seconds, interval=0.005, thread_ids=None, include_idle=False):
+    """
+    Sample the Python stacks of the running threads every `interval` seconds via
+    sys._current_frames(). Nothing is installed in the sampled threads, so the cost is
+    limited to the sampling thread while a session runs. Returns a Counter of
+    "thread;outer;...;inner" stacks.
+    """
+    own = threading.get_ident()
+    counts = Counter()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own or (thread_ids is not None and thread_id not in thread_ids):
+                continue
+            if not include_idle and _frame_name(frame) in IDLE_LEAVES:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            stack.append(names.get(thread_id, str(thread_id)))
+            counts[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return counts
+
+
+def collapsed_stacks(counts):
+    """Render sample counts in the collapsed format read by flamegraph.pl / speedscope."""
+    return "\n".join(f"{stack} {count}" for stack, count in counts.most_common()) + "\n"
+
+
+def cprofile_report(profile, limit=50, sort="cumulative"):
+    """Text pstats listing of a cProfile.Profile, sorted by `sort`."""
+    stream = io.StringIO()
+    pstats.Stats(profile, stream=stream).sort_stats(sort).print_stats(limit)
+    return stream.getvalue()
+
+
+def tracemalloc_top(seconds=10.0, limit=25, key_type="lineno"):
+    """
+    Top allocators by live size. If tracemalloc isn't already tracing, it is started
+    for `seconds` (so only allocations made during that window are seen) and stopped
+    again afterwards.
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+        time.sleep(seconds)
+    snapshot = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ])
+    current, peak = tracemalloc.get_traced_memory()
+    if started:
+        tracemalloc.stop()
+
+    return {
+        "traced_seconds": seconds if started else None,
+        "traced_current_bytes": current,
+        "traced_peak_bytes": peak,
+        "top": [
+            {"location": str(stat.traceback[0]), "size_bytes": stat.size, "count": stat.count}
+            for stat in snapshot.statistics(key_type)[:limit]
+        ],
+    }
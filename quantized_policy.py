@@ -0,0 +1,204 @@
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+# Activations MlpPolicy can be built with, as NumPy functions
+ACTIVATIONS = {
+    "Tanh": np.tanh,
+    "ReLU": lambda x: np.maximum(x, 0),
+}
+
+PRECISIONS = ["int8", "fp16", "torch-int8"]
+
+
+def actor_layers(policy):
+    """[[weight, bias, activation name or None], ...] of the actor: mlp_extractor.policy_net + action_net."""
+    import torch.nn as nn
+
+    layers = []
+    for module in list(policy.mlp_extractor.policy_net) + [policy.action_net]:
+        if isinstance(module, nn.Linear):
+            layers.append([module.weight.detach().cpu().numpy(), module.bias.detach().cpu().numpy(), None])
+        elif type(module).__name__ in ACTIVATIONS and layers:
+            layers[-1][2] = type(module).__name__
+        else:
+            raise ValueError(f"Unsupported actor layer: {module}")
+    return layers
+
+
+class QuantizedPolicy:
+    """
+    Low-precision copy of a PPO model's actor for CPU inference, with the same predict()
+    signature as the model. "int8" stores per-output-channel int8 weights and quantizes
+    activations per row on the fly; "fp16" runs the layers in
+    float16; "torch-int8" uses torch dynamic quantization of the Linear layers.
+    """
+
+    def __init__(self, model, precision="int8", seed=None):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision '{precision}', expected one of {PRECISIONS}")
+        policy = model.policy
+        self.precision = precision
+        self.low = model.action_space.low
+        self.high = model.action_space.high
+        self.std = np.exp(policy.log_std.detach().cpu().numpy())
+        self.rng = np.random.default_rng(seed)
+
+        layers = actor_layers(policy)
+        self.layers = []
+        if precision == "torch-int8":
+            self.torch_actor = self._torch_actor(layers)
+            return
+        for weight, bias, activation in layers:
+            if precision == "int8":
+                scale = np.abs(weight).max(axis=1) / 127.0
+                scale[scale == 0] = 1.0
+                weight = np.round(weight / scale[:, None]).astype(np.int8).T.copy()
+                self.layers.append((weight, scale.astype(np.float32), bias.astype(np.float32), activation))
+            else:
+                self.layers.append((weight.T.astype(np.float16), None, bias.astype(np.float16), activation))
+
+    @staticmethod
+    def _torch_actor(layers):
+        import torch
+        import torch.nn as nn
+
+        modules = []
+        for weight, bias, activation in layers:
+            linear = nn.Linear(weight.shape[1], weight.shape[0])
+            linear.weight.data = torch.as_tensor(weight)
+            linear.bias.data = torch.as_tensor(bias)
+            modules.append(linear)
+            if activation is not None:
+                modules.append(getattr(nn, activation)())
+        return torch.ao.quantization.quantize_dynamic(nn.Sequential(*modules).eval(), {nn.Linear}, dtype=torch.qint8)
+
+    def forward(self, obs):
+        """Deterministic actions (the Gaussian mean) for an (N, obs_dim) batch."""
+        if self.precision == "torch-int8":
+            import torch
+            with torch.no_grad():
+                return self.torch_actor(torch.as_tensor(obs, dtype=torch.float32)).numpy()
+
+        x = obs.astype(np.float16 if self.precision == "fp16" else np.float32)
+        for weight, scale, bias, activation in self.layers:
+            if self.precision == "int8":
+                x_scale = np.abs(x).max(axis=1, keepdims=True) / 127.0
+                x_scale[x_scale == 0] = 1.0
+                # int8 x int8 products summed in float32 are exact (|sum| < 2**24), and use BLAS
+                x_q = np.round(x / x_scale)
+                x = (x_q @ weight.astype(np.float32)) * (x_scale * scale) + bias
+            else:
+                x = x @ weight + bias
+            if activation is not None:
+                x = ACTIVATIONS[activation](x)
+        return x.astype(np.float32)
+
+    def predict(self, observation, state=None, episode_start=None, deterministic=False):
+        obs = np.asarray(observation, dtype=np.float32)
+        single = obs.ndim == 1
+        actions = self.forward(obs[None] if single else obs)
+        if not deterministic:
+            actions = actions + self.rng.standard_normal(actions.shape).astype(np.float32) * self.std
+        actions = np.clip(actions, self.low, self.high)
+        return (actions[0] if single else actions), state
+
+    def nbytes(self):
+        if self.precision == "torch-int8":
+            # Packed quantized weights aren't plain tensors; measure the serialized state instead
+            import io
+            import torch
+            buffer = io.BytesIO()
+            torch.save(self.torch_actor.state_dict(), buffer)
+            return buffer.getbuffer().nbytes
+        return sum(weight.nbytes + bias.nbytes + (scale.nbytes if scale is not None else 0)
+                   for weight, scale, bias, _ in self.layers)
+
+
+def served_rgb(obs, actions):
+    """The 0-255 colors /run-rl returns for these observations and actions."""
+    return (np.clip(obs[:, :15] + actions, 0, 1) * 255).astype(np.int32)
+
+
+def check_accuracy(model, quantized, obs, tolerance=1):
+    """Compare the served RGB values of the float32 model and `quantized` on every observation."""
+    reference, _ = model.predict(obs, deterministic=True)
+    candidate, _ = quantized.predict(obs, deterministic=True)
+    diff = np.abs(served_rgb(obs, reference) - served_rgb(obs, candidate))
+    return {
+        "observations": len(obs),
+        "tolerance": tolerance,
+        "max_rgb_diff": int(diff.max()) if diff.size else 0,
+        "exact_fraction": round(float((diff == 0).mean()), 4) if diff.size else 1.0,
+        "max_action_diff": float(np.abs(reference - candidate).max()) if diff.size else 0.0,
+        "passed": bool(diff.size == 0 or diff.max() <= tolerance),
+    }
+
+
+def time_predict(policy, obs, repeat=200):
+    """Mean milliseconds of a single-observation predict (as /run-rl does) and of a full-batch predict."""
+    start = time.perf_counter()
+    for i in range(repeat):
+        policy.predict(obs[i % len(obs)], deterministic=True)
+    single = (time.perf_counter() - start) / repeat
+    start = time.perf_counter()
+    for _ in range(max(1, repeat // 20)):
+        policy.predict(obs, deterministic=True)
+    batch = (time.perf_counter() - start) / max(1, repeat // 20)
+    return {"single_ms": round(single * 1000, 4), "batch_ms": round(batch * 1000, 4)}
+
+
+def actor_nbytes(model):
+    return sum(weight.nbytes + bias.nbytes for weight, bias, _ in actor_layers(model.policy))
+
+
+def quantize_checked(model, precision, json_folder, tolerance=1):
+    """
+    Return a QuantizedPolicy for `model` if its served colors stay within `tolerance` of the
+    float32 model on every recording in `json_folder`, otherwise the float32 model itself.
+    """
+    from offline_eval import load_corpus
+
+    quantized = QuantizedPolicy(model, precision)
+    obs, _ = load_corpus(json_folder)
+    report = check_accuracy(model, quantized, obs, tolerance)
+    if not report["passed"]:
+        print(f"{precision} inference off by up to {report['max_rgb_diff']} RGB levels, serving float32 instead")
+        return model
+    print(f"Serving {precision} inference (max RGB difference {report['max_rgb_diff']} on {report['observations']} recordings)")
+    return quantized
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check and benchmark low-precision inference of a PPO model.")
+    parser.add_argument("model", nargs="?", default="current", help="model zip path or store version (default: current)")
+    parser.add_argument("--precision", nargs="+", default=PRECISIONS, choices=PRECISIONS)
+    parser.add_argument("--json-folder", default="./filtered_recordings")
+    parser.add_argument("--tolerance", type=int, default=1, help="allowed difference in served RGB values")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    import torch
+    from stable_baselines3 import PPO
+    from offline_eval import load_corpus, resolve_model_path
+
+    torch.set_num_threads(1)
+    model = PPO.load(resolve_model_path(args.model), device="cpu")
+    obs, _ = load_corpus(args.json_folder)
+
+    report = {"model": args.model, "float32": {"bytes": actor_nbytes(model), **time_predict(model, obs)}}
+    for precision in args.precision:
+        quantized = QuantizedPolicy(model, precision)
+        report[precision] = {
+            "bytes": quantized.nbytes(),
+            **time_predict(quantized, obs),
+            "accuracy": check_accuracy(model, quantized, obs, args.tolerance),
+        }
+
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    sys.exit(0 if all(report[p]["accuracy"]["passed"] for p in args.precision) else 1)
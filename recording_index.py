@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import shutil
+import argparse
+import threading
+from datetime import datetime, timezone
+from dedup import INDEX_FILENAME as SNAPSHOT_INDEX_FILENAME, SnapshotIndex
+from recordings import list_recordings
+from samplers import recording_timestamp
+
+INDEX_FILENAME = ".recording_index.json"
+DAY_FORMAT = "%Y-%m-%d"
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def partition_day(timestamp):
+    """UTC day ('2024-11-24') of an epoch timestamp in seconds."""
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime(DAY_FORMAT)
+
+
+class RecordingIndex:
+    """
+    Recordings of a folder partitioned by UTC day, stored next to them as
+    .recording_index.json: {day: {filename: epoch seconds}}. The timestamp comes from
+    the filename (see samplers.recording_timestamp) or, failing that, the file's mtime.
+    Time-window queries and retention only read this index. Every writer of a recordings
+    folder adds its files as it writes them; refresh() catches up with anything else
+    (e.g. files copied in by hand) and only lists the folder when it changed since the
+    index was last saved.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.path = os.path.join(folder, INDEX_FILENAME)
+        self.partitions = {}
+        self._lock = threading.Lock()
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                self.partitions = json.load(f)
+
+    def add(self, filename, timestamp=None):
+        if timestamp is None:
+            timestamp = recording_timestamp(filename)
+        if timestamp is None:
+            timestamp = os.path.getmtime(os.path.join(self.folder, filename))
+        with self._lock:
+            self.partitions.setdefault(partition_day(timestamp), {})[filename] = timestamp
+
+    def redate(self, timestamps):
+        """
+        Move known recordings to the partition of a later time, given {filename: epoch
+        seconds}: a deduplicated snapshot is dated by the last time it was recorded (see
+        dedup.SnapshotIndex.last_seen), so windows and retention treat it as that recent.
+        """
+        with self._lock:
+            current = {f: (day, ts) for day, files in self.partitions.items() for f, ts in files.items()}
+            for filename, timestamp in timestamps.items():
+                if filename not in current or timestamp <= current[filename][1]:
+                    continue
+                day = current[filename][0]
+                del self.partitions[day][filename]
+                if not self.partitions[day]:
+                    del self.partitions[day]
+                self.partitions.setdefault(partition_day(timestamp), {})[filename] = timestamp
+
+    def save(self):
+        with self._lock:
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.partitions, f)
+            os.replace(tmp_path, self.path)
+            # Touch the index after the rename, so the folder (whose mtime the rename bumped)
+            # doesn't look newer than it in refresh()
+            os.utime(self.path)
+
+    def sync(self):
+        """Index new recordings and forget deleted ones (the one call that lists the folder)."""
+        on_disk = set(list_recordings(self.folder))
+        with self._lock:
+            known = {f for files in self.partitions.values() for f in files}
+            for day in list(self.partitions):
+                files = self.partitions[day]
+                for filename in [f for f in files if f not in on_disk]:
+                    del files[filename]
+                if not files:
+                    del self.partitions[day]
+        added = sorted(on_disk - known)
+        for filename in added:
+            self.add(filename)
+        self.save()
+        return added
+
+    def is_stale(self):
+        """Whether files may have been added to or removed from the folder since the last save."""
+        try:
+            # Equal times count as stale: on coarse-grained filesystems a write may share the tick
+            return os.stat(self.folder).st_mtime_ns >= os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return True
+
+    def refresh(self):
+        """sync() if the folder changed since the index was saved; returns the newly indexed files."""
+        return self.sync() if self.is_stale() else []
+
+    def days(self):
+        return sorted(self.partitions)
+
+    def select(self, last_days=None, since=None, until=None, now=None):
+        """
+        Recordings (oldest first) whose timestamp is within the last `last_days` days
+        before `now`, and/or in [since, until) (epoch seconds, e.g. the last checkpoint).
+        Partitions entirely outside the window are skipped without looking at their files.
+        """
+        now = time.time() if now is None else now
+        if last_days is not None:
+            since = max(since or 0, now - last_days * SECONDS_PER_DAY)
+        first_day = partition_day(since) if since is not None else None
+        last_day = partition_day(until) if until is not None else None
+        selected = []
+        with self._lock:
+            for day in sorted(self.partitions):
+                if (first_day and day < first_day) or (last_day and day > last_day):
+                    continue
+                selected.extend((ts, f) for f, ts in self.partitions[day].items()
+                                if (since is None or ts >= since) and (until is None or ts < until))
+        return [f for _, f in sorted(selected)]
+
+    def apply_retention(self, keep_days, archive_dir=None, now=None):
+        """
+        Drop every day partition older than `keep_days` days: its recordings are moved to
+        `archive_dir/<day>/` when given, deleted otherwise, and forgotten by the folder's
+        snapshot index (see dedup.py). Returns {day: file count}.
+        """
+        cutoff = partition_day((time.time() if now is None else now) - keep_days * SECONDS_PER_DAY)
+        with self._lock:
+            expired = {day: self.partitions.pop(day) for day in sorted(self.partitions) if day < cutoff}
+        for day, files in expired.items():
+            target = os.path.join(archive_dir, day) if archive_dir else None
+            if target:
+                os.makedirs(target, exist_ok=True)
+            for filename in files:
+                path = os.path.join(self.folder, filename)
+                if not os.path.exists(path):
+                    continue
+                if target:
+                    shutil.move(path, os.path.join(target, filename))
+                else:
+                    os.remove(path)
+        if expired:
+            self.save()
+            if os.path.exists(os.path.join(self.folder, SNAPSHOT_INDEX_FILENAME)):
+                snapshot_index = SnapshotIndex(self.folder)
+                snapshot_index.forget(f for files in expired.values() for f in files)
+                snapshot_index.save()
+            print(f"Retention {'archived' if archive_dir else 'deleted'} {sum(len(f) for f in expired.values())} "
+                  f"recordings from {len(expired)} day partitions of {self.folder}")
+        return {day: len(files) for day, files in expired.items()}
+
+    def stats(self):
+        with self._lock:
+            return {day: len(files) for day, files in sorted(self.partitions.items())}
+
+
+def recording_window(folder, last_days=None, since=None, until=None):
+    """Recordings of `folder` in a time window, first indexing any files the index doesn't know yet."""
+    index = RecordingIndex(folder)
+    index.refresh()
+    return index.select(last_days=last_days, since=since, until=until)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and query the day-partitioned index of a recordings folder.")
+    parser.add_argument("folder", nargs="?", default="./filtered_recordings")
+    parser.add_argument("--last-days", type=float, default=None, help="list the recordings of the last N days")
+    parser.add_argument("--since", type=float, default=None, help="list the recordings since this epoch time (s)")
+    parser.add_argument("--keep-days", type=float, default=None, help="apply retention, keeping N days")
+    parser.add_argument("--archive-dir", default=None, help="move expired partitions here instead of deleting them")
+    args = parser.parse_args()
+
+    index = RecordingIndex(args.folder)
+    added = index.sync()
+    print(f"Indexed {len(added)} new recordings; partitions: {json.dumps(index.stats())}")
+    if args.keep_days is not None:
+        print(json.dumps(index.apply_retention(args.keep_days, args.archive_dir)))
+    if args.last_days is not None or args.since is not None:
+        print("\n".join(index.select(last_days=args.last_days, since=args.since)))
@@ -0,0 +1,129 @@
+import os
+import re
+import gzip
+import json
+import shutil
+import colorsys
+
+# zstd support is optional; gzip is always available
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Compression applied when writing recordings: "none", "gzip" or "zstd"
+RECORDING_COMPRESSION = os.getenv('RECORDING_COMPRESSION', 'gzip')
+
+COMPRESSION_EXTENSIONS = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+RECORDING_EXTENSIONS = (".json", ".json.gz", ".json.zst")
+
+# CSS color keywords understood by extract_rgb
+NAMED_COLORS = {
+    "black": (0, 0, 0), "white": (255, 255, 255), "red": (255, 0, 0), "green": (0, 128, 0),
+    "blue": (0, 0, 255), "gray": (128, 128, 128), "grey": (128, 128, 128), "silver": (192, 192, 192),
+    "navy": (0, 0, 128), "teal": (0, 128, 128), "purple": (128, 0, 128), "orange": (255, 165, 0),
+    "yellow": (255, 255, 0), "lime": (0, 255, 0), "maroon": (128, 0, 0), "olive": (128, 128, 0),
+}
+
+
+def sanitize_filename(filename):
+    """Replace characters that are invalid in filenames with underscores."""
+    return re.sub(r'[<>:"/\\|?*]', '_', filename)
+
+
+def is_recording(filename):
+    """True for .json / .json.gz / .json.zst files that aren't dotfiles (such as the snapshot index)."""
+    return filename.endswith(RECORDING_EXTENSIONS) and not filename.startswith('.')
+
+
+def list_recordings(folder):
+    """Recording files in `folder`, compressed or not."""
+    return [f for f in os.listdir(folder) if is_recording(f)]
+
+
+def recording_stem(filename):
+    """Strip the .json[.gz|.zst] extension from a recording filename."""
+    for extension in sorted(RECORDING_EXTENSIONS, key=len, reverse=True):
+        if filename.endswith(extension):
+            return filename[:-len(extension)]
+    return filename
+
+
+def recording_filename(stem, compression=None):
+    """Filename for a recording written with `compression` (defaults to RECORDING_COMPRESSION)."""
+    compression = _resolve_compression(compression)
+    return stem + ".json" + COMPRESSION_EXTENSIONS[compression]
+
+
+def _resolve_compression(compression):
+    compression = compression or RECORDING_COMPRESSION
+    if compression not in COMPRESSION_EXTENSIONS:
+        raise ValueError(f"Unknown recording compression '{compression}'")
+    if compression == "zstd" and zstandard is None:
+        print("zstandard is not installed, falling back to gzip")
+        return "gzip"
+    return compression
+
+
+def open_recording(path, mode='rt'):
+    """Open a recording, transparently (de)compressing based on its extension."""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode)
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is required to read {path}")
+        return zstandard.open(path, mode)
+    return open(path, mode)
+
+
+def load_recording(path):
+    """Load a (possibly compressed) JSON recording, decompressing as it is parsed."""
+    with open_recording(path, 'rt') as f:
+        return json.load(f)
+
+
+def dump_recording(data, path):
+    """
+    Write `data` to `path`, compressing according to its extension. Uncompressed files
+    keep the pretty-printed layout; compressed ones are written compactly.
+    """
+    with open_recording(path, 'wt') as f:
+        if path.endswith(".json"):
+            json.dump(data, f, indent=2)
+        else:
+            json.dump(data, f, separators=(',', ':'))
+
+
+def save_stream(stream, path):
+    """Copy a binary stream (e.g. an S3 object body) to `path`, compressing by extension."""
+    with open_recording(path, 'wb') as f:
+        shutil.copyfileobj(stream, f, length=1024 * 1024)
+
+
+def extract_rgb(color_str):
+    """
+    Extract RGB values from an 'rgb(x,x,x)' / 'rgba(x,x,x,x)' string, or from the other
+    CSS forms inline styles use: '#rgb' / '#rrggbb[aa]', 'hsl(h, s%, l%)' / 'hsla(...)'
+    and the NAMED_COLORS.
+    """
+    color = color_str.strip().lower()
+    if color.startswith('#'):
+        digits = color[1:]
+        if len(digits) in (3, 4):
+            digits = "".join(c * 2 for c in digits[:3])
+        return [int(digits[i:i + 2], 16) for i in (0, 2, 4)]
+    if color.startswith('hsl'):
+        parts = color[color.index('(') + 1:color.rindex(')')].replace(',', ' ').replace('/', ' ').split()
+        hue = float(parts[0].replace('deg', '')) % 360 / 360
+        saturation, lightness = (float(p.rstrip('%')) / 100 for p in parts[1:3])
+        return [round(c * 255) for c in colorsys.hls_to_rgb(hue, lightness, saturation)]
+    if color in NAMED_COLORS:
+        return list(NAMED_COLORS[color])
+
+    # Remove 'rgb(' or 'rgba(' and the closing ')'
+    color_str = color_str.replace('rgba(', '').replace('rgb(', '').replace(')', '')
+
+    # Split the color values by commas and take the first 3 values (R, G, B)
+    rgb_values = color_str.split(',')[:3]  # Ignore alpha channel if present
+
+    return [int(x.strip()) for x in rgb_values]
@@ -2,7 +2,12 @@ from flask import Flask, jsonify, abort
 from flask_cors import CORS
 from stable_baselines3 import PPO
 from environment import ColorEnv
+from train_worker import TrainingWorker
+from model_store import ModelStore
+from recordings import list_recordings, load_recording
+from feature_schema import DEFAULT_SCHEMA
 import numpy as np
+import torch
 import json
 import os
 import time
@@ -25,6 +30,18 @@ if not os.path.exists(new_json_folder):
 rrweb_data_folder = os.path.abspath('./filtered_recordings')
 print("Absolute path to filtered_recordings:", rrweb_data_folder)
 
+# Training runs in a separate process pinned to TRAINING_CPU_SET (e.g. "2,3") so that
+# retraining doesn't compete with request handling
+model_store = ModelStore("saved_model", keep=int(os.getenv('MODEL_RETENTION', '5')))
+staging_model_path = "saved_model/staging/ppo_model.zip"
+TRAINING_CPU_SET = os.getenv('TRAINING_CPU_SET')
+TRAINING_TORCH_THREADS = int(os.getenv('TRAINING_TORCH_THREADS', '1'))
+torch.set_num_threads(int(os.getenv('SERVE_TORCH_THREADS', '1')))
+
+# Model used for predictions; swapped in place when the training worker publishes
+model_lock = threading.Lock()
+current_model = None
+
 
 
 def validate_ssl_context(cert_path, key_path):
@@ -105,29 +122,53 @@ def generate_self_signed_cert():
     except Exception as e:
         logging.error(f"Certificate generation error: {e}")
 
+def publish_model(path):
+    # Store a new version atomically, then load it from the store
+    version = model_store.publish(path, move=True)
+    load_model_version(version)
+
+def load_model_version(version):
+    global current_model
+    model = PPO.load(model_store.path(version))
+    with model_lock:
+        current_model = model
+    print(f"Model version {version} loaded.")
+
+training_worker = TrainingWorker(
+    "./filtered_recordings",
+    model_path=staging_model_path,
+    total_timesteps=50000,   # Adjust timesteps as needed
+    cpu_set=TRAINING_CPU_SET,
+    torch_threads=TRAINING_TORCH_THREADS,
+    on_progress=lambda event: print(f"Training progress: {event['timesteps']}/{event['total_timesteps']} timesteps"),
+    on_publish=publish_model,
+)
+
+training_start_lock = threading.Lock()
+
+def start_training():
+    """Start the training worker in the background unless it is already running."""
+    with training_start_lock:
+        if training_worker.is_running():
+            return False
+        print("Starting training in a worker process...")
+        training_worker.start()
+        return True
+
 # Modify
 # Function to run model training
 def train_model():
     try:
-        print("Starting training...")
-
-        # Define PPO model with specified configuration
-        model = PPO(
-            policy="MlpPolicy",
-            env=env,
-            n_steps=4096,
-            batch_size=128,
-            n_epochs=20,
-            learning_rate=1e-4,
-            gamma=0.995,
-            gae_lambda=0.95,
-            clip_range=0.2,
-            verbose=1
-        )
-        model.learn(total_timesteps=50000)   # Adjust timesteps as needed
-        model.save("saved_model/ppo_model")  # Save the trained model
+        # Train with the shared configuration (see training.PPO_PARAMS), stopping
+        # early once the reward on held-out recordings plateaus; a run already
+        # started by a request is waited for instead of started again
+        start_training()
+        status = training_worker.wait()
+        if status["state"] != "published":
+            print(f"Training failed: {status.get('error')}")
+            return None
         print("Training complete, model saved.")
-        return model
+        return current_model
     except Exception as e:
         print(f"Error during training: {e}")
         return None
@@ -153,17 +194,23 @@ def test_model(model):
         print(f"Error during testing: {e}")
         return None
 
-# Check if the model exists and load it, or train if it doesn't exist
+class ModelNotReady(RuntimeError):
+    pass
+
+# Check if the model exists and load it, or start training in the background if it doesn't exist
 def load_or_train_model():
-    model_path = "saved_model/ppo_model.zip"
-    if os.path.exists(model_path):
+    if current_model is not None:
+        return current_model
+    version = model_store.current_version()
+    if version is None and os.path.exists(model_store.legacy_path):
+        version = model_store.publish(model_store.legacy_path)
+    if version is not None:
         print("Model found, loading the model...")
-        model = PPO.load(model_path)
-        print("Model loaded.")
-        return model
-    else:
-        print("Model not found, starting training...")
-        return train_model()
+        load_model_version(version)
+        return current_model
+    # Requests must not wait for a whole training run: they get 503 until it publishes
+    start_training()
+    raise ModelNotReady("Model not ready yet, try again later")
 
 # Background thread function to retrain the model every 2 minutes
 def background_retrain_model():
@@ -172,6 +219,10 @@ def background_retrain_model():
         model = train_model()
         time.sleep(120)  # Wait for 2 minutes before retraining again
 
+@app.route("/training/status", methods=["GET"])
+def training_status():
+    return jsonify(training_worker.status)
+
 @app.route("/run-rl", methods=["GET"])
 def run_rl_service():
     try:
@@ -189,13 +240,15 @@ def run_rl_service():
 
         return jsonify({"message": "New color scheme generated", "data": output_data})
 
+    except ModelNotReady as e:
+        abort(503, description=str(e))
     except Exception as e:
         print(f"Error occurred: {e}")
         abort(500, description=str(e))
 
 def load_latest_rrweb_json(folder_path):
     try:
-        files = [f for f in os.listdir(folder_path) if f.endswith('.json')]
+        files = list_recordings(folder_path)  # .json, .json.gz or .json.zst
         files.sort(key=lambda x: os.path.getmtime(os.path.join(folder_path, x)), reverse=True)
 
         if not files:
@@ -203,47 +256,15 @@ def load_latest_rrweb_json(folder_path):
             raise IndexError("No files found")
 
         latest_file = os.path.join(folder_path, files[0])
-        with open(latest_file, 'r') as f:
-            return json.load(f)
+        return load_recording(latest_file)
 
     except (IndexError, FileNotFoundError) as e:
         print(f"Error loading rrweb JSON: {e}")
         abort(404, description="No rrweb data files found in the directory.")
 
 def extract_color_data_from_rrweb(rrweb_json):
-    elements = rrweb_json[0]['data']['elements']
-
-    button_color = [0, 0, 0]
-    navbar_color = [0, 0, 0]
-    background_color = [0, 0, 0]
-    shepherd_header_color = [0, 0, 0]
-    shepherd_button_color = [0, 0, 0]
-
-    for element in elements:
-        style = element.get('attributes', {}).get('style', {})
-        if element['type'] == 'button':
-            button_color = extract_rgb(style.get('background-color', 'rgb(0,0,0)'))
-        elif element['type'] == 'navbar':
-            navbar_color = extract_rgb(style.get('background-color', 'rgb(0,0,0)'))
-        elif element['type'] == 'background':
-            background_color = extract_rgb(style.get('background-color', 'rgb(255,255,255)'))
-        elif element['type'] == 'shepherd_header':
-            shepherd_header_color = extract_rgb(style.get('background-color', 'rgb(0,0,0)'))
-        elif element['type'] == 'shepherd_button':
-            shepherd_button_color = extract_rgb(style.get('background-color', 'rgb(0,0,0)'))
-
-    return {
-        "button_color": button_color,
-        "navbar_color": navbar_color,
-        "background_color": background_color,
-        "shepherd_header_color": shepherd_header_color,
-        "shepherd_button_color": shepherd_button_color
-    }
-
-def extract_rgb(color_str):
-    color_str = color_str.replace('rgba(', '').replace('rgb(', '').replace(')', '')
-    rgb_values = color_str.split(',')[:3]
-    return [int(x.strip()) for x in rgb_values]
+    # Same element names and defaults as the env (see feature_schema.py)
+    return DEFAULT_SCHEMA.extract_named(rrweb_json)
 
 if __name__ == '__main__':
     logging.basicConfig(level=logging.INFO)
@@ -0,0 +1,291 @@
+import os
+import sys
+import json
+from recordings import load_recording
+from feature_schema import extract_colors, NAVBAR, BUTTON, BACKGROUND, SHEPHERD_HEADER, SHEPHERD_BUTTONS
+
+# Filter with replay_rrweb_data (one row per color change) instead of full snapshots only
+REPLAY_MUTATIONS = os.getenv('REPLAY_MUTATIONS', '0') == '1'
+
+# rrweb event / node / incremental source types
+FULL_SNAPSHOT = 2
+INCREMENTAL_SNAPSHOT = 3
+ELEMENT_NODE = 2
+MUTATION_SOURCE = 0
+
+# Fallback background colors per tracked element type, as used by filter.filter_rrweb_data
+DEFAULT_COLORS = {
+    NAVBAR: ("navbar", "rgb(0, 0, 255)"),
+    BUTTON: (None, "rgb(255, 0, 0)"),
+    SHEPHERD_HEADER: ("backgroundColor", "rgb(100, 100, 100)"),
+    SHEPHERD_BUTTONS: ("backgroundColor", "rgb(0, 128, 0)"),
+    BACKGROUND: ("background", "rgb(245, 245, 245)"),
+}
+
+
+def parse_style(style):
+    """'background-color: rgb(1, 2, 3); color: white' -> {'background-color': 'rgb(1, 2, 3)', ...}"""
+    declarations = {}
+    for declaration in (style or "").split(";"):
+        name, _, value = declaration.partition(":")
+        if name.strip() and value.strip():
+            declarations[name.strip().lower()] = value.strip()
+    return declarations
+
+
+def classify(tag_name, class_list):
+    """Element type tracked for tag/classes, following filter.filter_rrweb_data (None if untracked)."""
+    if tag_name == "nav":
+        return NAVBAR
+    if tag_name in ("button", "a") and "btn" in class_list:
+        return BUTTON
+    if tag_name == "header" and "shepherd-header" in class_list:
+        return SHEPHERD_HEADER
+    if tag_name == "button" and "shepherd-button" in class_list:
+        return SHEPHERD_BUTTONS
+    if tag_name == "body":
+        return BACKGROUND
+    return None
+
+
+class DomStateTracker:
+    """
+    Incremental DOM state for one rrweb session. A full snapshot is indexed once into a
+    flat {id: node} map; type-3 mutations then add, remove and restyle nodes by id, so
+    each event only touches the nodes it changes instead of re-walking the document.
+    Only the element types that feed ColorEnv's features are tracked, each with its
+    current background color.
+
+    Colors follow filter.filter_rrweb_data, so a snapshot row has the same features
+    with or without replay: elements take their color from the recording's `colors`
+    metadata (buttons consume colors["buttons"] in document order across the session),
+    not from their inline styles. Only an inline background-color set by a mutation
+    (a style change, or a node added with one) overrides the metadata color.
+    """
+
+    def __init__(self, colors=None, fonts=None):
+        self.colors = colors or {}
+        self.fonts = fonts or {}
+        # Shared by every snapshot of the session, as in the filter
+        self._button_colors = list(self.colors.get("buttons") or [])
+        self.reset()
+
+    def reset(self):
+        self.nodes = {}      # id -> {"tag", "classes", "style", "inline", "parent", "children"[, "default"]}
+        self.roots = []      # ids of nodes without a known parent, in insertion order
+        self.tracked = {}    # element type -> {id: background color}
+        self.last = {}       # element type -> id of its last tracked node in document order, while known
+        self.changed = True  # Set whenever a tracked element is added, removed or restyled
+
+    def load_snapshot(self, root):
+        self.reset()
+        self._add_node(root, None)
+
+    def _add_node(self, node, parent_id, inline=False, next_id=None):
+        # Iterative pre-order walk: snapshots can be deeper than the recursion limit
+        stack = [(node, parent_id)]
+        top_id = node.get("id")
+        while stack:
+            node, parent_id = stack.pop()
+            node_id = node.get("id")
+            if node_id is None:
+                continue
+            attributes = node.get("attributes", {}) if node.get("type") == ELEMENT_NODE else {}
+            self.nodes[node_id] = {
+                "tag": node.get("tagName"),
+                "classes": set(str(attributes.get("class") or "").split()),
+                "style": parse_style(attributes.get("style")) if isinstance(attributes.get("style"), str) else {},
+                # Whether the inline background-color counts (only for nodes added by mutations)
+                "inline": inline,
+                "parent": parent_id,
+                "children": [],
+            }
+            if parent_id in self.nodes:
+                siblings = self.nodes[parent_id]["children"]
+                # Mutations insert the added node before its next sibling (nextId), if any
+                if node_id == top_id and next_id in siblings:
+                    siblings.insert(siblings.index(next_id), node_id)
+                else:
+                    siblings.append(node_id)
+            else:
+                self.roots.append(node_id)
+            self._track(node_id)
+            stack.extend((child, node_id) for child in reversed(node.get("childNodes", [])))
+
+    def _remove_node(self, node_id):
+        node = self.nodes.get(node_id)
+        if node is None:
+            return
+        parent = self.nodes.get(node["parent"])
+        if parent is not None and node_id in parent["children"]:
+            parent["children"].remove(node_id)
+        if node_id in self.roots:
+            self.roots.remove(node_id)
+        stack = [node_id]
+        while stack:
+            removed_id = stack.pop()
+            removed = self.nodes.pop(removed_id, None)
+            if removed is not None:
+                stack.extend(removed["children"])
+                for element_type, ids in self.tracked.items():
+                    if ids.pop(removed_id, None) is not None:
+                        self._untracked(element_type, removed_id)
+
+    def _track(self, node_id):
+        """(Re)classify a node and store its current background color if it is tracked."""
+        node = self.nodes[node_id]
+        element_type = classify(node["tag"], node["classes"])
+        for tracked_type, ids in self.tracked.items():
+            if tracked_type != element_type and ids.pop(node_id, None) is not None:
+                self._untracked(tracked_type, node_id)
+        if element_type is None:
+            return
+        ids = self.tracked.setdefault(element_type, {})
+        color = node["style"].get("background-color") if node["inline"] else None
+        if color is None:
+            # Without an inline color the node keeps the fallback it was first given for this type
+            if node.get("default", (None,))[0] != element_type:
+                node["default"] = (element_type, self._default_color(element_type))
+            color = node["default"][1]
+        if node_id not in ids:
+            self._tracked(element_type, node_id)
+        if ids.get(node_id) != color:
+            ids[node_id] = color
+            self.changed = True
+
+    def _tracked(self, element_type, node_id):
+        # A new node only displaces the last one if it comes after it; while a snapshot loads
+        # nothing is known yet and elements() finds the last node once, after the load
+        last_id = self.last.get(element_type)
+        if last_id is not None and self._document_position(node_id) > self._document_position(last_id):
+            self.last[element_type] = node_id
+        self.changed = True
+
+    def _untracked(self, element_type, node_id):
+        if self.last.get(element_type) == node_id:
+            del self.last[element_type]
+        self.changed = True
+
+    def _default_color(self, element_type):
+        if element_type == BUTTON:
+            # Buttons take the reported button colors in document order, like the filter
+            if self._button_colors:
+                return self._button_colors.pop(0).get("backgroundColor", DEFAULT_COLORS[BUTTON][1])
+            return DEFAULT_COLORS[BUTTON][1]
+        key, default = DEFAULT_COLORS[element_type]
+        return self.colors.get(key, default)
+
+    def apply_mutation(self, data):
+        """Apply one rrweb mutation (incremental source 0): removes, then adds, then attributes."""
+        for removal in data.get("removes", []):
+            self._remove_node(removal.get("id"))
+        for addition in data.get("adds", []):
+            node = addition.get("node", {})
+            if node.get("id") in self.nodes:
+                self._remove_node(node["id"])
+            self._add_node(node, addition.get("parentId"), inline=True, next_id=addition.get("nextId"))
+        for change in data.get("attributes", []):
+            node = self.nodes.get(change.get("id"))
+            if node is None:
+                continue
+            attributes = change.get("attributes", {})
+            if "class" in attributes:
+                node["classes"] = set(str(attributes["class"] or "").split())
+            if "style" in attributes:
+                style = attributes["style"]
+                if isinstance(style, dict):
+                    # Style diff: false removes a property, lists are [value, priority]
+                    for name, value in style.items():
+                        if value is False or value is None:
+                            node["style"].pop(name, None)
+                        else:
+                            node["style"][name] = value[0] if isinstance(value, list) else value
+                else:
+                    node["style"] = parse_style(style)
+                node["inline"] = True
+            if "class" in attributes or "style" in attributes:
+                self._track(change["id"])
+
+    def _document_position(self, node_id):
+        """
+        Sort key of a node in document (pre-)order: the child indexes on its path from the
+        root. rrweb ids follow insertion order, not document order, once mutations add nodes.
+        """
+        path = []
+        while True:
+            parent_id = self.nodes[node_id]["parent"]
+            parent = self.nodes.get(parent_id)
+            if parent is None:
+                path.append(self.roots.index(node_id) if node_id in self.roots else len(self.roots))
+                return path[::-1]
+            path.append(parent["children"].index(node_id))
+            node_id = parent_id
+
+    def elements(self):
+        """
+        The tracked elements in filter.filter_rrweb_data's format. One element per type:
+        the last one in document order, which is the one extract_colors would pick. It is
+        only searched for again after a snapshot load or the removal of the previous one.
+        """
+        elements = []
+        for element_type, ids in self.tracked.items():
+            if ids:
+                if element_type not in self.last:
+                    self.last[element_type] = max(ids, key=self._document_position)
+                node_id = self.last[element_type]
+                elements.append({
+                    "type": element_type,
+                    "id": node_id,
+                    "attributes": {"style": {"background-color": ids[node_id]}},
+                })
+        if not self.tracked.get(BACKGROUND):
+            elements.append({
+                "type": BACKGROUND,
+                "id": 301,
+                "attributes": {"style": {"background-color": self._default_color(BACKGROUND)}},
+            })
+        return elements
+
+
+def replay_rrweb_data(events, colors=None, fonts=None):
+    """
+    Like filter.filter_rrweb_data, but also replays incremental mutations: returns one
+    filtered event per full snapshot plus one per mutation that changes the color of a
+    tracked element, so a single session yields many training rows.
+    """
+    tracker = DomStateTracker(colors, fonts)
+    filtered_events = []
+    last_features = None
+    loaded = False
+    for event in events:
+        if event.get("type") == FULL_SNAPSHOT:
+            tracker.load_snapshot(event.get("data", {}).get("node", {}))
+            loaded = True
+            last_features = None
+        elif (loaded and event.get("type") == INCREMENTAL_SNAPSHOT
+              and event.get("data", {}).get("source") == MUTATION_SOURCE):
+            tracker.apply_mutation(event["data"])
+        else:
+            continue
+        if not tracker.changed:
+            continue
+        tracker.changed = False
+
+        elements = tracker.elements()
+        row = {"timestamp": event.get("timestamp"), "data": {"elements": elements}}
+        try:
+            features = tuple(extract_colors(row))
+        except (AttributeError, KeyError, TypeError, ValueError):
+            continue
+        if features != last_features:
+            filtered_events.append(row)
+            last_features = features
+    return filtered_events
+
+
+if __name__ == "__main__":
+    # Usage: python rrweb_replay.py RAW_RECORDING
+    raw_data = load_recording(sys.argv[1])
+    rows = replay_rrweb_data(raw_data.get("events", []), raw_data.get("colors"), raw_data.get("font-family"))
+    print(json.dumps({"events": len(raw_data.get("events", [])), "rows": len(rows),
+                      "features": [extract_colors(row) for row in rows]}, indent=2))
@@ -0,0 +1,253 @@
+import re
+import numpy as np
+
+# Epoch timestamps embedded in recording filenames, e.g. recording-1732426610312-filtered.json
+# (milliseconds) or 1732427757_colors.json (seconds)
+TIMESTAMP_MS_PATTERN = re.compile(r'(?<!\d)(\d{13})(?!\d)')
+TIMESTAMP_S_PATTERN = re.compile(r'(?<!\d)(\d{10})(?!\d)')
+
+
+def recording_timestamp(filename):
+    """Return the epoch timestamp (in seconds) embedded in a recording filename, or None."""
+    match = TIMESTAMP_MS_PATTERN.search(filename)
+    if match:
+        return int(match.group(1)) / 1000.0
+    match = TIMESTAMP_S_PATTERN.search(filename)
+    if match:
+        return float(match.group(1))
+    return None
+
+
+class AliasTable:
+    """Vose's alias table over a fixed weight vector: O(n) to build, O(1) to sample."""
+
+    def __init__(self, weights):
+        weights = np.asarray(weights, dtype=np.float64)
+        n = len(weights)
+        self.total = float(weights.sum())
+        self.prob = np.ones(n)
+        self.alias = np.arange(n)
+        if n == 0 or self.total <= 0:
+            return
+
+        scaled = weights * (n / self.total)
+        small = [i for i in range(n) if scaled[i] < 1.0]
+        large = [i for i in range(n) if scaled[i] >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        # Leftovers are 1.0 up to floating point error
+        for i in small + large:
+            self.prob[i] = 1.0
+
+    def sample(self, rng=np.random):
+        i = int(rng.random() * len(self.prob))
+        return i if rng.random() < self.prob[i] else int(self.alias[i])
+
+
+class BlockedAliasSampler:
+    """
+    Weighted sampler over a growing set of items. Items are grouped into fixed-size
+    blocks, each with its own alias table, plus a top-level alias table over upper
+    bounds of the block totals: a block drawn from it is accepted with probability
+    total / bound, so the draw stays exact while the totals drift below their bounds.
+    Adding an item or changing a weight only rebuilds the affected block; the top-level
+    table is rebuilt when a block outgrows its bound or the bounds overstate the total
+    weight by more than `max_slack`, so sampling stays O(1) expected and updates cost
+    O(block_size) amortized.
+    """
+
+    def __init__(self, block_size=256, headroom=0.25, max_slack=2.0):
+        self.block_size = block_size
+        self.headroom = headroom
+        self.max_slack = max_slack
+        self.weights = np.zeros(block_size)
+        self.size = 0
+        self.blocks = []
+        self.totals = []
+        self.total = 0.0
+        self.top = None
+        self.bounds = np.zeros(0)
+        self.bound_total = 0.0
+        self.top_rebuilds = 0
+        self._dirty_blocks = set()
+
+    def __len__(self):
+        return self.size
+
+    def add(self, weight):
+        """Append an item with `weight` and return its index."""
+        if self.size == len(self.weights):
+            self.weights = np.concatenate([self.weights, np.zeros(len(self.weights))])
+        index = self.size
+        self.weights[index] = weight
+        self.size += 1
+        if index // self.block_size == len(self.blocks):
+            self.blocks.append(None)
+            self.totals.append(0.0)
+        self._dirty_blocks.add(index // self.block_size)
+        return index
+
+    def update(self, index, weight):
+        self.weights[index] = weight
+        self._dirty_blocks.add(index // self.block_size)
+
+    def rebuild_all(self, weights):
+        """Replace every weight at once (used when all weights must be rescaled)."""
+        self.weights[:self.size] = weights
+        self._dirty_blocks.update(range(len(self.blocks)))
+
+    def _refresh(self):
+        outgrown = len(self.bounds) != len(self.blocks)
+        for b in self._dirty_blocks:
+            start = b * self.block_size
+            self.blocks[b] = AliasTable(self.weights[start:min(start + self.block_size, self.size)])
+            self.total += self.blocks[b].total - self.totals[b]
+            self.totals[b] = self.blocks[b].total
+            outgrown = outgrown or self.totals[b] > self.bounds[b]
+        self._dirty_blocks.clear()
+        if outgrown or self.bound_total > self.total * self.max_slack:
+            # Also resums the running total, so it doesn't accumulate rounding errors
+            self.total = float(sum(self.totals))
+            self.bounds = np.asarray(self.totals) * (1.0 + self.headroom)
+            self.bound_total = float(self.bounds.sum())
+            self.top = AliasTable(self.bounds)
+            self.top_rebuilds += 1
+
+    def sample(self, rng=np.random):
+        if self.size == 0:
+            raise IndexError("Cannot sample from an empty sampler")
+        if self._dirty_blocks:
+            self._refresh()
+        if self.total <= 0:
+            return int(rng.random() * self.size)
+        while True:
+            b = self.top.sample(rng)
+            if rng.random() * self.bounds[b] < self.totals[b]:
+                return b * self.block_size + self.blocks[b].sample(rng)
+
+
+class RecordingSampler:
+    """Base class for pluggable ColorEnv recording samplers. Subclasses define `weight()`."""
+
+    def __init__(self, block_size=256):
+        self.table = BlockedAliasSampler(block_size)
+        self.files = []
+
+    def __len__(self):
+        return len(self.files)
+
+    def weight(self, filename):
+        raise NotImplementedError
+
+    def add_files(self, files):
+        for filename in files:
+            self.files.append(filename)
+            self.table.add(self.weight(filename))
+
+    def sample(self, rng=np.random):
+        """Return the index (into `self.files`) of the next recording to play."""
+        return self.table.sample(rng)
+
+    def update(self, index, episode_reward):
+        """Feedback hook called with the total reward of the episode played on `index`."""
+        pass
+
+
+class UniformSampler(RecordingSampler):
+    def weight(self, filename):
+        return 1.0
+
+
+class RecencySampler(RecordingSampler):
+    """
+    Weight recordings by 2 ** (age / half_life) using the timestamp in the filename.
+    Weights are relative to a reference timestamp rather than the wall clock, so
+    adding newer recordings never requires reweighting the older ones.
+    """
+
+    MAX_EXPONENT = 500  # Rebase before weights overflow float64
+
+    def __init__(self, half_life_hours=72.0, block_size=256):
+        super().__init__(block_size)
+        self.half_life = half_life_hours * 3600.0
+        self.reference = None
+        self.timestamps = []
+
+    def weight(self, filename):
+        timestamp = recording_timestamp(filename)
+        if timestamp is None:
+            timestamp = self.reference if self.reference is not None else 0.0
+        if self.reference is None:
+            self.reference = timestamp
+        self.timestamps.append(timestamp)
+
+        exponent = (timestamp - self.reference) / self.half_life
+        if exponent > self.MAX_EXPONENT:
+            self._rebase(timestamp)
+            exponent = 0.0
+        return 2.0 ** max(exponent, -self.MAX_EXPONENT)
+
+    def _rebase(self, reference):
+        self.reference = reference
+        exponents = (np.array(self.timestamps[:-1]) - reference) / self.half_life
+        self.table.rebuild_all(2.0 ** np.maximum(exponents, -self.MAX_EXPONENT))
+
+
+class PrioritySampler(RecordingSampler):
+    """
+    Prioritise recordings whose last episode reward was furthest from the running mean
+    episode reward: weight = (|error| + eps) ** alpha. Unplayed recordings get the
+    highest priority seen so far so that every recording is visited at least once.
+    """
+
+    def __init__(self, alpha=0.6, eps=0.01, baseline_decay=0.99, block_size=256):
+        super().__init__(block_size)
+        self.alpha = alpha
+        self.eps = eps
+        self.baseline_decay = baseline_decay
+        self.baseline = None
+        self.max_priority = 1.0
+
+    def weight(self, filename):
+        return self.max_priority
+
+    def update(self, index, episode_reward):
+        if self.baseline is None:
+            self.baseline = episode_reward
+        error = episode_reward - self.baseline
+        self.baseline = self.baseline_decay * self.baseline + (1 - self.baseline_decay) * episode_reward
+
+        priority = (abs(error) + self.eps) ** self.alpha
+        self.max_priority = max(self.max_priority, priority)
+        self.table.update(index, priority)
+
+
+class CountSampler(RecordingSampler):
+    """Weight each unique snapshot by the number of recordings it stands for (see dedup.py)."""
+
+    def __init__(self, counts, block_size=256):
+        super().__init__(block_size)
+        self.counts = counts
+
+    def weight(self, filename):
+        return float(self.counts.get(filename, 1))
+
+
+SAMPLERS = {
+    "uniform": UniformSampler,
+    "recency": RecencySampler,
+    "priority": PrioritySampler,
+}
+
+
+def make_sampler(sampler):
+    """Return a RecordingSampler from an instance, a name in SAMPLERS, or None."""
+    if sampler is None or isinstance(sampler, RecordingSampler):
+        return sampler
+    if sampler not in SAMPLERS:
+        raise ValueError(f"Unknown sampler '{sampler}', expected one of {sorted(SAMPLERS)}")
+    return SAMPLERS[sampler]()
@@ -0,0 +1,173 @@
+import json
+import time
+import argparse
+import threading
+import numpy as np
+from offline_eval import step_rewards, contrast_violations
+
+# Served color slices of the observation, as returned by /run-rl
+SCHEME_SLICES = {
+    "button_color": slice(0, 3),
+    "navbar_color": slice(3, 6),
+    "background_color": slice(6, 9),
+    "shepherd_header_color": slice(9, 12),
+    "shepherd_button_color": slice(12, 15),
+}
+
+# Foreground/background pairs checked by the optional WCAG contrast filter
+CONTRAST_PAIRS = [("navbar_color", "background_color"), ("button_color", "background_color"),
+                  ("shepherd_button_color", "shepherd_header_color")]
+
+
+def scheme_colors(obs):
+    """The /run-rl color dict (0-255 RGB lists) for one observation."""
+    return {name: [int(value * 255) for value in obs[s]] for name, s in SCHEME_SLICES.items()}
+
+
+def relative_luminance(rgb):
+    """WCAG relative luminance of (..., 3) sRGB values in [0, 1]."""
+    linear = np.where(rgb <= 0.03928, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+    return linear @ np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+
+
+def contrast_ratios(obs):
+    """{'fg/bg': (N,) WCAG contrast ratios} for the CONTRAST_PAIRS of an (N, 18) batch."""
+    ratios = {}
+    for fg, bg in CONTRAST_PAIRS:
+        a = relative_luminance(obs[:, SCHEME_SLICES[fg]])
+        b = relative_luminance(obs[:, SCHEME_SLICES[bg]])
+        ratios[f"{fg}/{bg}"] = (np.maximum(a, b) + 0.05) / (np.minimum(a, b) + 0.05)
+    return ratios
+
+
+def sample_candidates(model, obs, k):
+    """
+    Candidate actions from one batched forward pass: `k` stochastic samples for a single
+    observation, or one sample per row when `obs` is already an (N, obs_dim) batch
+    (e.g. K different recordings). Returns (observations, actions).
+    """
+    obs = np.asarray(obs, dtype=np.float32)
+    batch = np.repeat(obs[None], k, axis=0) if obs.ndim == 1 else obs
+    actions, _ = model.predict(batch, deterministic=False)
+    return batch, actions
+
+
+def rank_candidates(obs, actions, top_n=1, min_contrast=0.0):
+    """
+    Score every candidate with the vectorized env reward and return the `top_n` best,
+    best first. With `min_contrast` > 0, candidates whose CONTRAST_PAIRS fall below that
+    WCAG ratio (or that trip the env's own contrast penalties) rank after all passing ones.
+    """
+    next_obs, rewards = step_rewards(obs, actions)
+    failing = np.zeros(len(obs), dtype=bool)
+    if min_contrast > 0:
+        for violated in contrast_violations(next_obs).values():
+            failing |= violated
+        for ratio in contrast_ratios(next_obs).values():
+            failing |= ratio < min_contrast
+
+    order = np.lexsort((-rewards, failing))[:top_n]
+    return [{
+        "index": int(i),
+        "action": actions[i],
+        "obs": next_obs[i],
+        "reward": float(rewards[i]),
+        "passes_contrast": bool(not failing[i]),
+    } for i in order]
+
+
+class AdaptiveK:
+    """
+    Number of candidates per request, adjusted so ranking stays within `budget_ms`:
+    an EWMA of the measured latency halves K when it exceeds the budget and grows it
+    by one while it stays under `headroom` of it. Without a budget K stays at `k_max`.
+    """
+
+    def __init__(self, k_max, budget_ms=None, k_min=1, alpha=0.2, headroom=0.7):
+        self.k_min = max(1, k_min)
+        self.k_max = max(self.k_min, k_max)
+        self.budget_ms = budget_ms
+        self.alpha = alpha
+        self.headroom = headroom
+        self.k = self.k_max
+        self.latency_ms = None
+        self._lock = threading.Lock()
+
+    def current(self):
+        with self._lock:
+            return self.k
+
+    def observe(self, elapsed_ms):
+        with self._lock:
+            if self.latency_ms is None:
+                self.latency_ms = elapsed_ms
+            else:
+                self.latency_ms += self.alpha * (elapsed_ms - self.latency_ms)
+            if not self.budget_ms:
+                return self.k
+            if self.latency_ms > self.budget_ms:
+                self.k = max(self.k_min, self.k // 2)
+                # Start the average over at the new K instead of waiting for it to decay
+                self.latency_ms = None
+            elif self.latency_ms < self.budget_ms * self.headroom:
+                self.k = min(self.k_max, self.k + 1)
+            return self.k
+
+    def stats(self):
+        with self._lock:
+            return {"k": self.k, "k_min": self.k_min, "k_max": self.k_max, "budget_ms": self.budget_ms,
+                    "latency_ms": None if self.latency_ms is None else round(self.latency_ms, 3)}
+
+
+def best_of_k(model, obs, k, top_n=1, min_contrast=0.0):
+    """Sample `k` candidates for one observation and return the `top_n` best (see rank_candidates)."""
+    batch, actions = sample_candidates(model, obs, k)
+    return rank_candidates(batch, actions, top_n, min_contrast)
+
+
+def benchmark(model, corpus, ks, min_contrast=0.0, seed=0):
+    """Mean served reward and per-request latency of best-of-K over every recording in `corpus`."""
+    import torch
+    report = {}
+    for k in ks:
+        torch.manual_seed(seed)
+        rewards, passing, latencies = [], [], []
+        for obs in corpus:
+            start = time.perf_counter()
+            best = best_of_k(model, obs, k, min_contrast=min_contrast)[0]
+            latencies.append((time.perf_counter() - start) * 1000)
+            rewards.append(best["reward"])
+            passing.append(best["passes_contrast"])
+        report[k] = {
+            "mean_reward": round(float(np.mean(rewards)), 4),
+            "min_reward": round(float(np.min(rewards)), 4),
+            "contrast_pass_rate": round(float(np.mean(passing)), 4),
+            "mean_ms": round(float(np.mean(latencies)), 4),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 4),
+        }
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare best-of-K scheme ranking against single-sample serving.")
+    parser.add_argument("model", nargs="?", default="current", help="model zip path or store version (default: current)")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--min-contrast", type=float, default=0.0, help="WCAG contrast ratio candidates must meet")
+    parser.add_argument("--json-folder", default="./filtered_recordings")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    import torch
+    from stable_baselines3 import PPO
+    from offline_eval import load_corpus, resolve_model_path
+
+    torch.set_num_threads(1)
+    model = PPO.load(resolve_model_path(args.model), device="cpu")
+    corpus, _ = load_corpus(args.json_folder)
+    report = {"model": args.model, "recordings": len(corpus),
+              "best_of_k": benchmark(model, corpus, args.k, args.min_contrast)}
+
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,103 @@
+import json
+import time
+import hashlib
+import threading
+from collections import deque
+
+
+class SchemeBroadcaster:
+    """
+    Fan-out of newly generated color schemes to any number of idle subscribers.
+    Every published scheme gets an increasing integer id and is kept in a short
+    replay log, so a client that reconnects with its last seen id resumes where it
+    left off. Subscribers block on a single shared condition instead of polling,
+    so idle connections use no CPU until the next publish.
+
+    Each open stream still holds one server thread for as long as the client stays
+    connected (Flask / Werkzeug are thread-per-request), so streams are capped at
+    `max_subscribers` (0 = no cap): subscribe() fails once they are all taken.
+    """
+
+    def __init__(self, history=256, max_subscribers=0):
+        self.events = deque(maxlen=history)
+        self.last_id = 0
+        self.max_subscribers = max_subscribers
+        self.subscribers = 0
+        self.condition = threading.Condition()
+
+    def subscribe(self):
+        """Take a stream slot; False when `max_subscribers` streams are already open."""
+        with self.condition:
+            if self.max_subscribers and self.subscribers >= self.max_subscribers:
+                return False
+            self.subscribers += 1
+            return True
+
+    def unsubscribe(self):
+        with self.condition:
+            self.subscribers = max(0, self.subscribers - 1)
+
+    def publish(self, data, event="scheme"):
+        """Append a scheme to the log, wake every waiting subscriber and return its id."""
+        with self.condition:
+            self.last_id += 1
+            self.events.append({"id": self.last_id, "event": event, "data": data, "time": time.time()})
+            self.condition.notify_all()
+            return self.last_id
+
+    def latest(self):
+        with self.condition:
+            return self.events[-1] if self.events else None
+
+    def _since(self, last_id):
+        if last_id is None:
+            return []
+        return [e for e in self.events if e["id"] > last_id]
+
+    def wait(self, last_id=None, timeout=30.0):
+        """
+        Events published after `last_id`, blocking up to `timeout` seconds until there
+        is at least one. With no `last_id` the caller only gets events published from
+        now on. Ids only live as long as the process, so a `last_id` ahead of ours comes
+        from before a restart and gets the latest event right away. Returns an empty
+        list on timeout.
+        """
+        with self.condition:
+            if last_id is None:
+                last_id = self.last_id
+            elif last_id > self.last_id:
+                last_id = self.events[-1]["id"] - 1 if self.events else self.last_id
+            self.condition.wait_for(lambda: self.last_id > last_id, timeout=timeout)
+            return self._since(last_id)
+
+    def stream(self, last_id=None, heartbeat=15.0):
+        """Generator of Server-Sent Events text; sends a comment line as keep-alive when idle."""
+        if last_id is None:
+            last_id = self.last_id
+        yield "retry: 5000\n\n"
+        while True:
+            events = self.wait(last_id, timeout=heartbeat)
+            if not events:
+                yield ": keep-alive\n\n"
+                continue
+            for e in events:
+                yield format_sse(e)
+                last_id = e["id"]
+
+
+def format_sse(event):
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+def scheme_etag(data):
+    """Strong ETag for a scheme: the serving model version plus a hash of the canonical JSON."""
+    digest = hashlib.sha1(json.dumps(data, sort_keys=True, separators=(",", ":")).encode()).hexdigest()[:16]
+    return f"{data.get('model_version', 'unknown')}-{digest}"
+
+
+def parse_last_event_id(value):
+    """Parse a Last-Event-ID header / query value, returning None when missing or invalid."""
+    try:
+        return int(value) if value not in (None, "") else None
+    except ValueError:
+        return None
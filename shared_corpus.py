@@ -0,0 +1,212 @@
+import os
+import json
+import time
+import fcntl
+import argparse
+import threading
+import numpy as np
+from recordings import list_recordings, load_recording
+from feature_schema import DEFAULT_SCHEMA
+
+# Let ColorEnv read observations from the shared corpus of its json_folder instead of parsing files
+SHARED_CORPUS = os.getenv('SHARED_CORPUS', '0') == '1'
+
+CORPUS_DIRNAME = ".corpus"
+INDEX_FILENAME = "index.json"
+LOCK_FILENAME = ".lock"
+
+
+def corpus_dir_for(json_folder):
+    return os.path.join(json_folder, CORPUS_DIRNAME)
+
+
+def _read_index(corpus_dir):
+    with open(os.path.join(corpus_dir, INDEX_FILENAME), 'r') as f:
+        return json.load(f)
+
+
+def _write_index(corpus_dir, index):
+    path = os.path.join(corpus_dir, INDEX_FILENAME)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, path)
+
+
+def _recording_rows(path, schema):
+    """Every row's features (0-255) of a filtered recording: one row per snapshot event."""
+    data = load_recording(path)
+    rows = data if isinstance(data, list) and data else [data]
+    return [schema.extract(row) for row in rows]
+
+
+class CorpusWriter:
+    """
+    Materializes the features of every recording in `json_folder` into one append-only
+    float32 file (rows x features, 0-255) plus an index of {file: [first row, end row]}.
+    Readers memory-map the file, so N processes share one copy through the page cache
+    instead of each parsing the whole folder. update() appends only new recordings and
+    bumps the index generation; the index is swapped with os.replace(), so readers
+    always see either the old or the new generation. rebuild() writes a new data file
+    and keeps the previous one until the next rebuild, for readers that read the old
+    index just before the swap. Writers in different processes are serialized with a
+    lock file.
+    """
+
+    def __init__(self, json_folder, corpus_dir=None, schema=DEFAULT_SCHEMA):
+        self.json_folder = json_folder
+        self.corpus_dir = corpus_dir or corpus_dir_for(json_folder)
+        self.schema = schema
+        self._lock = threading.Lock()
+        os.makedirs(self.corpus_dir, exist_ok=True)
+
+    def _locked(self):
+        lock_file = open(os.path.join(self.corpus_dir, LOCK_FILENAME), 'w')
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    def _index(self):
+        if not os.path.exists(os.path.join(self.corpus_dir, INDEX_FILENAME)):
+            return None
+        index = _read_index(self.corpus_dir)
+        if index["columns"] != len(self.schema.names) * 3:
+            return None  # Built for another schema: start over
+        return index
+
+    def rebuild(self):
+        """Write a fresh data file for the current folder contents (drops removed recordings)."""
+        with self._lock, self._locked():
+            return self._rebuild()
+
+    def _rebuild(self):
+        index = self._index()
+        generation = index["generation"] + 1 if index else 1
+        data_file = f"features-{generation}.f32"
+        new_index = {"generation": generation, "data": data_file, "columns": len(self.schema.names) * 3,
+                     "rows": 0, "files": {}, "errors": {}, "updated_at": time.time()}
+        open(os.path.join(self.corpus_dir, data_file), 'wb').close()
+        self._append(new_index, sorted(list_recordings(self.json_folder)))
+        _write_index(self.corpus_dir, new_index)
+        # Readers that still map an older data file keep their open mapping; the previous one
+        # is kept a generation longer for readers that read its index but haven't mapped it yet
+        keep = {data_file, index["data"] if index else None}
+        for name in os.listdir(self.corpus_dir):
+            if name.startswith("features-") and name not in keep:
+                os.remove(os.path.join(self.corpus_dir, name))
+        return new_index
+
+    def update(self):
+        """Append recordings added to the folder since the last update; returns the new filenames."""
+        with self._lock, self._locked():
+            index = self._index()
+            if index is None:
+                return list(self._rebuild()["files"])
+            known = set(index["files"]) | set(index["errors"])
+            new_files = sorted(f for f in list_recordings(self.json_folder) if f not in known)
+            if not new_files:
+                return []
+            added = self._append(index, new_files)
+            index["generation"] += 1
+            index["updated_at"] = time.time()
+            _write_index(self.corpus_dir, index)
+            return added
+
+    def _append(self, index, filenames):
+        added = []
+        with open(os.path.join(self.corpus_dir, index["data"]), 'ab') as f:
+            for filename in filenames:
+                try:
+                    rows = np.asarray(_recording_rows(os.path.join(self.json_folder, filename), self.schema),
+                                      dtype=np.float32)
+                except Exception as e:
+                    index["errors"][filename] = str(e)
+                    continue
+                f.write(rows.tobytes())
+                index["files"][filename] = [index["rows"], index["rows"] + len(rows)]
+                index["rows"] += len(rows)
+                added.append(filename)
+        return added
+
+
+def ensure_corpus(json_folder):
+    """With SHARED_CORPUS, bring `json_folder`'s corpus up to date before starting processes that read it."""
+    if not SHARED_CORPUS:
+        return []
+    added = CorpusWriter(json_folder).update()
+    if added:
+        print(f"Added {len(added)} recordings to the shared corpus of {json_folder}")
+    return added
+
+
+class SharedCorpus:
+    """
+    Read-only view of a corpus written by CorpusWriter. refresh() is a stat() of the
+    index unless its generation changed, in which case the (longer) data file is mapped
+    again and the newly appended recordings become visible without re-reading the rest.
+    """
+
+    def __init__(self, json_folder, corpus_dir=None):
+        self.corpus_dir = corpus_dir or corpus_dir_for(json_folder)
+        self.generation = 0
+        self.files = {}
+        self.data = np.zeros((0, 0), dtype=np.float32)
+        self._index_mtime = None
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self, attempts=3):
+        """Pick up a newer generation if there is one; returns the filenames it added."""
+        index_path = os.path.join(self.corpus_dir, INDEX_FILENAME)
+        with self._lock:
+            for _ in range(attempts):
+                try:
+                    mtime = os.stat(index_path).st_mtime_ns
+                    if mtime == self._index_mtime:
+                        return []
+                    index = _read_index(self.corpus_dir)
+                    if index["generation"] == self.generation:
+                        self._index_mtime = mtime
+                        return []
+                    if index["rows"]:
+                        data = np.memmap(os.path.join(self.corpus_dir, index["data"]), dtype=np.float32, mode='r',
+                                         shape=(index["rows"], index["columns"]))
+                    else:
+                        data = np.zeros((0, index["columns"]), dtype=np.float32)
+                except FileNotFoundError:
+                    # No corpus yet, or rebuilds removed the data file this index names: read the index again
+                    continue
+                added = [f for f in index["files"] if f not in self.files]
+                self.data, self.files, self.generation = data, index["files"], index["generation"]
+                self._index_mtime = mtime
+                return added
+            # Keep serving the current generation; the next refresh tries again
+            return []
+
+    def __contains__(self, filename):
+        return filename in self.files
+
+    def __len__(self):
+        return len(self.files)
+
+    def rows(self, filename):
+        """(n_rows, features) read-only view of a recording's features (0-255)."""
+        start, end = self.files[filename]
+        return self.data[start:end]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or update the shared feature corpus of a recordings folder.")
+    parser.add_argument("json_folder", nargs="?", default="./filtered_recordings")
+    parser.add_argument("--rebuild", action="store_true", help="rewrite the corpus instead of appending new recordings")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    writer = CorpusWriter(args.json_folder)
+    if args.rebuild:
+        added = list(writer.rebuild()["files"])
+    else:
+        added = writer.update()
+    corpus = SharedCorpus(args.json_folder)
+    print(json.dumps({"generation": corpus.generation, "recordings": len(corpus), "rows": len(corpus.data),
+                      "added": len(added), "bytes": corpus.data.nbytes,
+                      "seconds": round(time.perf_counter() - start, 3)}, indent=2))
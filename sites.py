@@ -0,0 +1,39 @@
+import os
+import re
+
+# Recordings and models without a site live in the original, unpartitioned folders
+DEFAULT_SITE = "default"
+# Per-site data sits in <folder>/sites/<site>/
+SITES_DIR = "sites"
+
+
+def clean_site(site):
+    """Site name safe to use as a directory name, or DEFAULT_SITE for empty values."""
+    site = re.sub(r'[^A-Za-z0-9._-]', '_', str(site or "").strip()).strip('.')
+    return site or DEFAULT_SITE
+
+
+def site_from_key(key, prefix="events/"):
+    """'events/<site>/<file>.json' -> '<site>'; None for keys directly under the prefix."""
+    relative = key[len(prefix):] if key.startswith(prefix) else key
+    parts = relative.split("/")
+    return clean_site(parts[0]) if len(parts) > 1 else None
+
+
+def site_from_recording(raw_data):
+    """Site named in a raw recording's metadata ({"site": ...}), if any."""
+    site = raw_data.get("site") if isinstance(raw_data, dict) else None
+    return clean_site(site) if site else None
+
+
+def site_dir(folder, site):
+    """Folder holding `site`'s files: `folder` itself for the default site."""
+    site = clean_site(site)
+    return folder if site == DEFAULT_SITE else os.path.join(folder, SITES_DIR, site)
+
+
+def list_sites(folder):
+    """Sites with a folder under `folder`, including the default one."""
+    root = os.path.join(folder, SITES_DIR)
+    sites = sorted(s for s in os.listdir(root) if not s.startswith('.')) if os.path.isdir(root) else []
+    return [DEFAULT_SITE] + [s for s in sites if s != DEFAULT_SITE]
@@ -0,0 +1,197 @@
+import os
+import json
+import math
+import time
+import random
+import shutil
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Note: torch / stable-baselines3 are imported inside the worker functions so the
+# thread limits set by `_init_worker` are in place before torch initialises.
+
+json_folder = "./filtered_recordings"
+sweeps_dir = "./sweeps"
+
+# Values sampled for each PPO hyperparameter
+SEARCH_SPACE = {
+    "n_steps": [1024, 2048, 4096],
+    "batch_size": [64, 128, 256],
+    "n_epochs": [5, 10, 20],
+    "learning_rate": [3e-5, 1e-4, 3e-4, 1e-3],
+    "gamma": [0.95, 0.99, 0.995],
+    "gae_lambda": [0.9, 0.95, 0.98],
+    "clip_range": [0.1, 0.2, 0.3],
+}
+
+
+def sample_configs(n_configs, seed=0):
+    """Draw `n_configs` distinct configurations from SEARCH_SPACE."""
+    rng = random.Random(seed)
+    max_configs = math.prod(len(values) for values in SEARCH_SPACE.values())
+    configs = []
+    seen = set()
+    while len(configs) < min(n_configs, max_configs):
+        config = {name: rng.choice(values) for name, values in SEARCH_SPACE.items()}
+        key = tuple(sorted(config.items()))
+        if key not in seen:
+            seen.add(key)
+            configs.append(config)
+    return configs
+
+
+def _init_worker(threads_per_worker):
+    """Limit the CPU threads used by each worker so parallel trials don't thrash each other."""
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads_per_worker)
+
+    import torch
+    torch.set_num_threads(threads_per_worker)
+    torch.set_num_interop_threads(1)
+
+
+def _run_trial(trial_id, params, steps, checkpoint_path, folder, eval_episodes, seed, eval_seed, train_files,
+               holdout_files):
+    """
+    Train one configuration (seeded with `seed`) on `train_files` for `steps` more timesteps,
+    checkpoint it and return its score on `holdout_files`, evaluated with `eval_seed`.
+    """
+    from stable_baselines3 import PPO
+    from environment import ColorEnv
+    from training import build_model, evaluate_model
+
+    env = ColorEnv(json_folder=folder, files=train_files)
+    if os.path.exists(checkpoint_path):
+        model = PPO.load(checkpoint_path, env=env)
+        model.learn(total_timesteps=steps, reset_num_timesteps=False)
+    else:
+        model = build_model(env, verbose=0, seed=seed, **params)
+        model.learn(total_timesteps=steps)
+    model.save(checkpoint_path)
+
+    eval_env = ColorEnv(json_folder=folder, files=holdout_files)
+    score = evaluate_model(model, eval_env, n_episodes=eval_episodes, seed=eval_seed)
+    return trial_id, score, int(model.num_timesteps)
+
+
+def successive_halving(configs, out_dir, workers=2, threads_per_worker=1, min_steps=4096,
+                       max_steps=50000, eta=3, eval_episodes=10, folder=json_folder, seed=0, holdout_fraction=0.1):
+    """
+    Train `configs` in parallel with successive halving: every rung trains the
+    surviving trials up to the rung budget, then keeps the best 1/eta of them. Trials
+    train on the same split of `folder` and are scored on its held-out recordings, all
+    with the same evaluation seed, so a rung ranks the configurations and not the
+    reward noise of their episodes.
+    """
+    from training import split_recordings
+
+    os.makedirs(out_dir, exist_ok=True)
+    train_files, holdout_files = split_recordings(folder, holdout_fraction, seed=seed)
+    if not holdout_files:
+        print("Warning: too few recordings for a held-out split, scoring trials on their training data")
+        holdout_files = train_files
+    trials = {
+        trial_id: {
+            "trial_id": trial_id,
+            "params": params,
+            "checkpoint": os.path.join(out_dir, f"trial_{trial_id}.zip"),
+            "timesteps": 0,
+            "score": None,
+            "rung": -1,
+            "status": "running",
+        }
+        for trial_id, params in enumerate(configs)
+    }
+    survivors = list(trials)
+
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                             initializer=_init_worker, initargs=(threads_per_worker,)) as pool:
+        rung = 0
+        while survivors:
+            budget = min(max_steps, min_steps * eta ** rung)
+            print(f"Rung {rung}: training {len(survivors)} trial(s) up to {budget} timesteps...")
+
+            futures = [
+                pool.submit(_run_trial, trial_id, trials[trial_id]["params"],
+                            max(0, budget - trials[trial_id]["timesteps"]), trials[trial_id]["checkpoint"],
+                            folder, eval_episodes, seed + trial_id, seed, train_files, holdout_files)
+                for trial_id in survivors
+            ]
+            for future in as_completed(futures):
+                try:
+                    trial_id, score, timesteps = future.result()
+                except Exception as e:
+                    print(f"Trial failed: {e}")
+                    continue
+                trials[trial_id].update(score=score, timesteps=timesteps, rung=rung)
+                print(f"Trial {trial_id}: score={score:.3f} after {timesteps} timesteps")
+
+            for trial_id in survivors:
+                if trials[trial_id]["rung"] != rung:
+                    trials[trial_id]["status"] = "failed"
+            scored = sorted((t for t in survivors if trials[t]["rung"] == rung),
+                            key=lambda t: trials[t]["score"], reverse=True)
+
+            if budget >= max_steps or len(scored) <= 1:
+                for trial_id in scored:
+                    trials[trial_id]["status"] = "finished"
+                break
+
+            keep = max(1, len(scored) // eta)
+            for trial_id in scored[keep:]:
+                trials[trial_id]["status"] = "stopped"
+            survivors = scored[:keep]
+            rung += 1
+
+    return write_leaderboard(list(trials.values()), out_dir)
+
+
+def write_leaderboard(trials, out_dir):
+    """Rank trials by (rung reached, score), write leaderboard.json and copy the best checkpoint."""
+    leaderboard = sorted(
+        trials,
+        key=lambda t: (t["rung"], t["score"] if t["score"] is not None else -math.inf),
+        reverse=True,
+    )
+    with open(os.path.join(out_dir, "leaderboard.json"), 'w') as f:
+        json.dump(leaderboard, f, indent=2)
+
+    best = leaderboard[0] if leaderboard else None
+    if best and best["score"] is not None:
+        shutil.copyfile(best["checkpoint"], os.path.join(out_dir, "best_model.zip"))
+        print(f"Best trial {best['trial_id']}: score={best['score']:.3f} params={best['params']}")
+    return leaderboard
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel PPO hyperparameter sweep with successive halving.")
+    parser.add_argument("--configs", type=int, default=27, help="number of configurations to sample")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--threads-per-worker", type=int, default=1)
+    parser.add_argument("--min-steps", type=int, default=4096, help="timesteps per trial in the first rung")
+    parser.add_argument("--max-steps", type=int, default=50000, help="timesteps for trials in the final rung")
+    parser.add_argument("--eta", type=int, default=3, help="keep the best 1/eta trials at each rung")
+    parser.add_argument("--eval-episodes", type=int, default=10)
+    parser.add_argument("--json-folder", default=json_folder)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--holdout-fraction", type=float, default=0.1, help="share of recordings trials are scored on")
+    parser.add_argument("--out", default=None, help="output directory (default: ./sweeps/<timestamp>)")
+    args = parser.parse_args()
+
+    out_dir = args.out or os.path.join(sweeps_dir, str(int(time.time())))
+    successive_halving(
+        sample_configs(args.configs, seed=args.seed),
+        out_dir,
+        workers=args.workers,
+        threads_per_worker=args.threads_per_worker,
+        min_steps=args.min_steps,
+        max_steps=args.max_steps,
+        eta=args.eta,
+        eval_episodes=args.eval_episodes,
+        folder=args.json_folder,
+        seed=args.seed,
+        holdout_fraction=args.holdout_fraction,
+    )
+    print(f"Sweep complete. Leaderboard written to {out_dir}/leaderboard.json")
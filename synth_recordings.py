@@ -0,0 +1,346 @@
+import os
+import json
+import time
+import random
+import argparse
+import colorsys
+from recording_index import RecordingIndex
+from recordings import NAMED_COLORS, recording_filename, open_recording, dump_recording
+from feature_schema import NAVBAR, BUTTON, BACKGROUND, SHEPHERD_HEADER, SHEPHERD_BUTTONS
+
+# Color notations written into styles and the "colors" metadata (all understood by extract_rgb)
+COLOR_FORMATS = ["rgb", "rgba", "hex", "hsl", "named"]
+
+# rrweb event / node / incremental source types
+META = 4
+FULL_SNAPSHOT = 2
+INCREMENTAL_SNAPSHOT = 3
+DOCUMENT_NODE, ELEMENT_NODE, TEXT_NODE = 0, 2, 3
+MUTATION_SOURCE, MOUSE_MOVE_SOURCE, SCROLL_SOURCE = 0, 1, 3
+
+CONTAINER_TAGS = ["div", "section", "main", "article", "ul", "li"]
+TEXT_TAGS = ["p", "span", "div"]
+
+
+def random_rgb(rng):
+    return [rng.randint(0, 255) for _ in range(3)]
+
+
+def format_color(rng, rgb, fmt):
+    """`rgb` written in notation `fmt` ('named' picks a random keyword, ignoring `rgb`)."""
+    r, g, b = rgb
+    if fmt == "rgb":
+        return f"rgb({r}, {g}, {b})"
+    if fmt == "rgba":
+        return f"rgba({r}, {g}, {b}, {rng.choice(['1', '0.9', '0.5'])})"
+    if fmt == "hex":
+        return f"#{r:02x}{g:02x}{b:02x}"
+    if fmt == "hsl":
+        # Integer hsl() doesn't round-trip exactly, which is fine for synthetic data
+        h, lightness, s = colorsys.rgb_to_hls(r / 255, g / 255, b / 255)
+        return f"hsl({round(h * 360)}, {round(s * 100)}%, {round(lightness * 100)}%)"
+    if fmt == "named":
+        return rng.choice(sorted(NAMED_COLORS))
+    raise ValueError(f"Unknown color format '{fmt}', expected one of {COLOR_FORMATS}")
+
+
+def random_color(rng, formats):
+    return format_color(rng, random_rgb(rng), rng.choice(formats))
+
+
+class _DomBuilder:
+    """Builds a full-snapshot node tree with sequential ids and remembers the tracked nodes."""
+
+    def __init__(self, rng, formats, text_bytes):
+        self.rng = rng
+        self.formats = formats
+        self.text_bytes = text_bytes
+        self.next_id = 1
+        self.tracked = []     # (id, element type) of nodes whose color mutations matter
+        self.containers = []  # ids of nodes new elements can be added under
+
+    def _id(self):
+        self.next_id += 1
+        return self.next_id - 1
+
+    def text(self):
+        words = " ".join(self.rng.choice(["lorem", "ipsum", "dolor", "sit", "amet"]) for _ in range(8))
+        return {"type": TEXT_NODE, "textContent": (words * (self.text_bytes // len(words) + 1))[:self.text_bytes],
+                "id": self._id()}
+
+    def element(self, tag, classes="", style=None, children=None):
+        attributes = {}
+        if classes:
+            attributes["class"] = classes
+        if style:
+            attributes["style"] = style
+        return {"type": ELEMENT_NODE, "tagName": tag, "attributes": attributes, "childNodes": children or [],
+                "id": self._id()}
+
+    def tracked_element(self, element_type):
+        style = f"background-color: {random_color(self.rng, self.formats)};"
+        if element_type == NAVBAR:
+            node = self.element("nav", "navbar", style, [self.text()])
+        elif element_type == BUTTON:
+            node = self.element(self.rng.choice(["button", "a"]), "btn btn-primary", style, [self.text()])
+        elif element_type == SHEPHERD_HEADER:
+            node = self.element("header", "shepherd-header", style, [self.text()])
+        else:
+            node = self.element("button", "shepherd-button", style, [self.text()])
+        self.tracked.append((node["id"], element_type))
+        return node
+
+    def tree(self, depth, fanout):
+        """Containers nested `depth` levels deep with `fanout` children each; leaves hold text."""
+        root = self.element(self.rng.choice(CONTAINER_TAGS))
+        self.containers.append(root["id"])
+        level = [root]
+        for current_depth in range(1, depth):
+            next_level = []
+            for parent in level:
+                for _ in range(fanout):
+                    if current_depth == depth - 1:
+                        child = self.element(self.rng.choice(TEXT_TAGS), children=[self.text()])
+                    else:
+                        child = self.element(self.rng.choice(CONTAINER_TAGS))
+                        self.containers.append(child["id"])
+                        next_level.append(child)
+                    parent["childNodes"].append(child)
+            level = next_level
+        return root
+
+    def insert_randomly(self, root, node):
+        """Append `node` under a random container of the tree rooted at `root`."""
+        containers, stack = [], [root]
+        while stack:
+            current = stack.pop()
+            if current.get("tagName") in CONTAINER_TAGS:
+                containers.append(current)
+            stack.extend(current.get("childNodes", []))
+        self.rng.choice(containers)["childNodes"].append(node)
+
+
+def _snapshot(builder, depth, fanout, buttons, navs, shepherd):
+    body_tree = builder.tree(depth, fanout)
+    for _ in range(navs):
+        builder.insert_randomly(body_tree, builder.tracked_element(NAVBAR))
+    for _ in range(buttons):
+        builder.insert_randomly(body_tree, builder.tracked_element(BUTTON))
+    if builder.rng.random() < shepherd:
+        dialog = builder.element("div", "shepherd-element", children=[
+            builder.tracked_element(SHEPHERD_HEADER),
+            builder.tracked_element(SHEPHERD_BUTTONS),
+        ])
+        body_tree["childNodes"].append(dialog)
+
+    body = builder.element("body", style=f"background-color: {random_color(builder.rng, builder.formats)};",
+                           children=[body_tree])
+    builder.tracked.append((body["id"], BACKGROUND))
+    head = builder.element("head", children=[builder.element("meta")])
+    html = builder.element("html", children=[head, body])
+    return {"type": DOCUMENT_NODE, "childNodes": [html], "id": builder._id()}
+
+
+def iter_raw_events(rng, start_ms, events=100, depth=6, fanout=4, buttons=3, navs=1, shepherd=0.5,
+                    formats=COLOR_FORMATS, mutation_ratio=0.3, text_bytes=16, site=None):
+    """
+    Yield one session's rrweb events: a meta event, a full snapshot of a generated DOM,
+    then `events - 2` incremental events. A `mutation_ratio` share of them are
+    mutations (restyling a tracked element, or adding / removing a button); the rest
+    are mouse moves and scrolls. Events are generated lazily, so sessions of any size
+    can be written without holding them in memory.
+    """
+    timestamp = start_ms
+    builder = _DomBuilder(rng, formats, text_bytes)
+    yield {"type": META, "data": {"href": f"https://{site or 'synthetic.example'}/", "width": 1536, "height": 742},
+           "timestamp": timestamp}
+    timestamp += rng.randint(5, 50)
+    yield {"type": FULL_SNAPSHOT, "data": {"node": _snapshot(builder, depth, fanout, buttons, navs, shepherd),
+                                           "initialOffset": {"left": 0, "top": 0}},
+           "timestamp": timestamp}
+
+    added_buttons = []
+    for _ in range(max(0, events - 2)):
+        timestamp += rng.randint(10, 500)
+        if rng.random() >= mutation_ratio:
+            if rng.random() < 0.8:
+                data = {"source": MOUSE_MOVE_SOURCE, "positions": [
+                    {"x": rng.randint(0, 1536), "y": rng.randint(0, 742), "id": rng.randint(1, builder.next_id),
+                     "timeOffset": -rng.randint(0, 500)} for _ in range(rng.randint(1, 6))]}
+            else:
+                data = {"source": SCROLL_SOURCE, "id": 1, "x": 0, "y": rng.randint(0, 5000)}
+        else:
+            data = {"source": MUTATION_SOURCE, "texts": [], "attributes": [], "removes": [], "adds": []}
+            choice = rng.random()
+            if choice < 0.1 and builder.containers:
+                button = builder.tracked_element(BUTTON)
+                added_buttons.append(button["id"])
+                data["adds"].append({"parentId": rng.choice(builder.containers), "nextId": None, "node": button})
+            elif choice < 0.15 and added_buttons:
+                data["removes"].append({"parentId": builder.containers[0], "id": added_buttons.pop()})
+            else:
+                node_id, _ = rng.choice(builder.tracked)
+                style = {"background-color": random_color(rng, formats)}
+                data["attributes"].append({"id": node_id, "attributes": {"style": style}})
+        yield {"type": INCREMENTAL_SNAPSHOT, "data": data, "timestamp": timestamp}
+
+
+def _metadata(rng, formats, site):
+    metadata = {
+        "colors": {
+            "navbar": random_color(rng, formats),
+            "background": random_color(rng, formats),
+            "backgroundColor": random_color(rng, formats),
+            "text": random_color(rng, formats),
+            "buttons": [{"backgroundColor": random_color(rng, formats), "color": random_color(rng, formats)}
+                        for _ in range(rng.randint(0, 4))],
+        },
+        "font-family": {"navbar": "Arial, sans-serif", "button": "Helvetica, sans-serif", "text": "Georgia, serif"},
+    }
+    if site:
+        metadata["site"] = site
+    return metadata
+
+
+def generate_raw_recording(seed, start_ms=1732400000000, site=None, formats=COLOR_FORMATS, **params):
+    """One raw recording (as uploaded to S3) as a dict; see iter_raw_events for `params`."""
+    rng = random.Random(seed)
+    metadata = _metadata(rng, formats, site)
+    events = list(iter_raw_events(rng, start_ms, formats=formats, site=site, **params))
+    return {"sessionId": f"synthetic-{seed}", "timeStamp": start_ms, **metadata, "events": events}
+
+
+def write_raw_recording(path, seed, start_ms=1732400000000, site=None, formats=COLOR_FORMATS, target_bytes=None,
+                        **params):
+    """
+    Stream a raw recording to `path` (compressed by extension) event by event. With
+    `target_bytes` the session keeps adding incremental events until its JSON reaches
+    that size, whatever `events` says. Returns the uncompressed size in bytes.
+    """
+    rng = random.Random(seed)
+    metadata = _metadata(rng, formats, site)
+    if target_bytes:
+        params["events"] = 2 ** 62
+    head = json.dumps({"sessionId": f"synthetic-{seed}", "timeStamp": start_ms, **metadata})
+    written = 0
+    with open_recording(path, 'wt') as f:
+        written += f.write(head[:-1] + ', "events": [')
+        for i, event in enumerate(iter_raw_events(rng, start_ms, formats=formats, site=site, **params)):
+            written += f.write((", " if i else "") + json.dumps(event, separators=(',', ':')))
+            if target_bytes and written >= target_bytes and i >= 1:
+                break
+        written += f.write("]}")
+    return written
+
+
+def generate_filtered_recording(seed, rows=1, start_ms=1732400000000, formats=COLOR_FORMATS, shepherd=0.5,
+                                buttons=3):
+    """
+    A filtered recording in filter.filter_rrweb_data's output format with `rows` rows,
+    each restyling one element of the previous row (like mutation replay produces).
+    """
+    rng = random.Random(seed)
+    elements = [{"type": NAVBAR}, {"type": BACKGROUND}]
+    elements += [{"type": BUTTON} for _ in range(buttons)]
+    if rng.random() < shepherd:
+        elements += [{"type": SHEPHERD_HEADER}, {"type": SHEPHERD_BUTTONS}]
+    for i, element in enumerate(elements):
+        element["id"] = 100 + i
+        element["attributes"] = {"style": {"background-color": random_color(rng, formats)}}
+
+    filtered, timestamp = [], start_ms
+    for row in range(rows):
+        if row:
+            rng.choice(elements)["attributes"]["style"]["background-color"] = random_color(rng, formats)
+            timestamp += rng.randint(10, 5000)
+        filtered.append({"timestamp": timestamp, "data": {"elements": json.loads(json.dumps(elements))}})
+    return filtered
+
+
+def write_corpus(out_dir, count, seed=0, kind="raw", start_ms=1732400000000, interval_ms=60000,
+                 compression=None, **params):
+    """
+    Write `count` recordings to `out_dir`. Recording i uses seed "<seed>-<i>" and the
+    epoch-ms timestamp start_ms + i * interval_ms in its filename, so a corpus is
+    reproducible file by file and spreads over predictable day partitions.
+    Returns {"files": n, "bytes": total uncompressed bytes}.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    recording_index = RecordingIndex(out_dir)
+    total = 0
+    for i in range(count):
+        timestamp = start_ms + i * interval_ms
+        if kind == "raw":
+            path = os.path.join(out_dir, recording_filename(f"recording-{timestamp}", compression))
+            total += write_raw_recording(path, f"{seed}-{i}", start_ms=timestamp, **params)
+        else:
+            path = os.path.join(out_dir, recording_filename(f"recording-{timestamp}-filtered", compression))
+            data = generate_filtered_recording(f"{seed}-{i}", start_ms=timestamp, **params)
+            dump_recording(data, path)
+            total += len(json.dumps(data))
+        recording_index.add(os.path.basename(path))
+    recording_index.save()
+    return {"files": count, "bytes": total}
+
+
+def benchmark(out_dir, kind):
+    """Time filtering (raw) or ColorEnv resets (filtered) over a generated corpus."""
+    from recordings import list_recordings, load_recording
+    files = sorted(list_recordings(out_dir))
+    if kind == "raw":
+        from filter import filter_rrweb_data
+        from rrweb_replay import replay_rrweb_data
+        report = {}
+        for name, fn in (("filter_rrweb_data", filter_rrweb_data), ("replay_rrweb_data", replay_rrweb_data)):
+            start, rows = time.perf_counter(), 0
+            for filename in files:
+                raw = load_recording(os.path.join(out_dir, filename))
+                rows += len(fn(raw["events"], raw.get("colors"), raw.get("font-family")))
+            report[name] = {"seconds": round(time.perf_counter() - start, 3), "rows": rows}
+        return report
+
+    from environment import ColorEnv
+    env = ColorEnv(json_folder=out_dir, files=files, sample_rows=True)
+    start = time.perf_counter()
+    for _ in range(len(files)):
+        env.reset()
+    return {"env_resets": len(files), "seconds": round(time.perf_counter() - start, 3)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate a reproducible synthetic rrweb corpus. For ingest benchmarks, write raw recordings "
+                    "to <root>/<bucket>/events and run ingest_pipeline.py --local-s3 <root> --bucket <bucket>.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--kind", choices=["raw", "filtered"], default="raw")
+    parser.add_argument("--count", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compression", choices=["none", "gzip", "zstd"], default="none")
+    parser.add_argument("--formats", nargs="+", choices=COLOR_FORMATS, default=COLOR_FORMATS)
+    parser.add_argument("--events", type=int, default=100, help="events per raw recording")
+    parser.add_argument("--target-bytes", type=float, default=None, help="grow each raw recording to about this size")
+    parser.add_argument("--depth", type=int, default=6, help="DOM depth")
+    parser.add_argument("--fanout", type=int, default=4, help="children per DOM container")
+    parser.add_argument("--buttons", type=int, default=3)
+    parser.add_argument("--navs", type=int, default=1)
+    parser.add_argument("--shepherd", type=float, default=0.5, help="probability of a shepherd tour dialog")
+    parser.add_argument("--mutation-ratio", type=float, default=0.3)
+    parser.add_argument("--rows", type=int, default=1, help="rows per filtered recording")
+    parser.add_argument("--site", default=None, help="site named in the raw recordings' metadata")
+    parser.add_argument("--bench", action="store_true", help="time filtering / env resets on the generated corpus")
+    args = parser.parse_args()
+
+    if args.kind == "raw":
+        params = {"events": args.events, "depth": args.depth, "fanout": args.fanout, "buttons": args.buttons,
+                  "navs": args.navs, "shepherd": args.shepherd, "mutation_ratio": args.mutation_ratio,
+                  "target_bytes": int(args.target_bytes) if args.target_bytes else None, "site": args.site}
+    else:
+        params = {"rows": args.rows, "buttons": args.buttons, "shepherd": args.shepherd}
+
+    start = time.perf_counter()
+    result = write_corpus(args.out_dir, args.count, seed=args.seed, kind=args.kind, compression=args.compression,
+                          formats=args.formats, **params)
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    if args.bench:
+        result["bench"] = benchmark(args.out_dir, args.kind)
+    print(json.dumps(result, indent=2))
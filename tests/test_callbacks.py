@@ -0,0 +1,67 @@
+import numpy as np
+import callbacks
+from recordings import list_recordings
+from callbacks import ConvergenceStopCallback, make_eval_env
+from synth_recordings import write_corpus
+
+
+class FakeModel:
+    num_timesteps = 0
+    logger = None
+
+    def get_env(self):
+        return None
+
+
+class FakeEvalEnv:
+    def __init__(self):
+        self.seeds = []
+
+    def seed(self, seed=None):
+        self.seeds.append(seed)
+
+
+def run_evaluations(callback, model, n):
+    """Advance training by one eval_freq at a time; returns the on_step results."""
+    results = []
+    for _ in range(n):
+        model.num_timesteps += callback.eval_freq
+        results.append(callback.on_step())
+    return results
+
+
+def test_flat_reward_stops_after_patience_evaluations(monkeypatch):
+    monkeypatch.setattr(callbacks, "evaluate_policy", lambda *args, **kwargs: (1.0, 11.0))
+    eval_env, model = FakeEvalEnv(), FakeModel()
+    callback = ConvergenceStopCallback(eval_env, eval_freq=100, patience=3, verbose=0, eval_seed=5)
+    callback.init_callback(model)
+    callback.on_training_start({"total_timesteps": 10000}, {})
+
+    # The first evaluation sets the baseline, then `patience` evaluations without improvement
+    assert run_evaluations(callback, model, 4) == [True, True, True, False]
+    assert callback.converged
+    assert eval_env.seeds == [5, 5, 5, 5]
+
+
+def test_improving_reward_keeps_training(monkeypatch):
+    rewards = iter(np.arange(10, dtype=float))
+    monkeypatch.setattr(callbacks, "evaluate_policy", lambda *args, **kwargs: (next(rewards), 0.0))
+    model = FakeModel()
+    callback = ConvergenceStopCallback(FakeEvalEnv(), eval_freq=100, patience=2, verbose=0)
+    callback.init_callback(model)
+    callback.on_training_start({"total_timesteps": 10000}, {})
+    assert all(run_evaluations(callback, model, 5))
+    assert not callback.converged
+
+
+def test_reseeded_eval_env_replays_the_same_episodes(tmp_path):
+    folder = str(tmp_path)
+    write_corpus(folder, 6, kind="filtered", compression="none")
+    env = make_eval_env(folder, sorted(list_recordings(folder)), n_envs=2)
+
+    def observations():
+        env.seed(3)
+        first = env.reset()
+        return np.concatenate([first] + [env.step(np.zeros((2, 15), dtype=np.float32))[0] for _ in range(3)])
+
+    assert np.array_equal(observations(), observations())
@@ -0,0 +1,36 @@
+import os
+from dedup import SnapshotIndex, build_index, snapshot_hash
+from recordings import dump_recording
+
+
+def snapshot(button="rgb(1, 2, 3)", element_id=1):
+    return [{"data": {"elements": [{"type": "button", "id": element_id,
+                                     "attributes": {"style": {"background-color": button}}}]}}]
+
+
+def test_hash_ignores_ids_but_not_colors():
+    assert snapshot_hash(snapshot(element_id=1)) == snapshot_hash(snapshot(element_id=7))
+    assert snapshot_hash(snapshot()) != snapshot_hash(snapshot("rgb(3, 2, 1)"))
+    assert snapshot_hash([{"data": {"elements": [{"type": "button", "attributes": {"style": {
+        "background-color": "not a color"}}}]}}]) is None
+
+
+def test_add_counts_duplicates_once_per_source(tmp_path):
+    index = SnapshotIndex(str(tmp_path))
+    assert index.add(snapshot(), "a.json")
+    dump_recording(snapshot(), str(tmp_path / "a.json"))
+    assert not index.add(snapshot(element_id=2), "b.json")
+    assert not index.add(snapshot(), "b.json")  # Re-ingesting a duplicate doesn't count it twice
+    assert index.add(snapshot(), "a.json")     # The stored recording itself is always kept
+    assert index.add(snapshot("rgb(9, 9, 9)"), "c.json")
+    assert index.counts() == {"a.json": 2}     # c.json was never written
+    assert index.stats()["duplicates"] == 1
+
+
+def test_index_survives_save_and_build_prunes_duplicates(tmp_path):
+    folder = str(tmp_path)
+    for name in ("a.json", "b.json", "c.json"):
+        dump_recording(snapshot("rgb(5, 5, 5)" if name == "c.json" else "rgb(1, 2, 3)"), os.path.join(folder, name))
+    index, removed = build_index(folder, prune=True)
+    assert removed == 1 and not os.path.exists(os.path.join(folder, "b.json"))
+    assert SnapshotIndex(folder).counts() == {"a.json": 2, "c.json": 1}
@@ -0,0 +1,23 @@
+import pytest
+import distributed
+from synth_recordings import write_corpus
+
+
+def test_non_loopback_address_requires_authkey(monkeypatch):
+    monkeypatch.setattr(distributed, "DISTRIBUTED_AUTHKEY", None)
+    assert distributed.authkey(("127.0.0.1", 6100)) == distributed.LOCAL_AUTHKEY.encode()
+    with pytest.raises(ValueError):
+        distributed.authkey(("0.0.0.0", 6100))
+    monkeypatch.setattr(distributed, "DISTRIBUTED_AUTHKEY", "secret")
+    assert distributed.authkey(("10.0.0.5", 6100)) == b"secret"
+
+
+def test_run_local_trains_with_one_worker(tmp_path):
+    folder = str(tmp_path / "recordings")
+    write_corpus(folder, 12, kind="filtered", compression="none")
+    model_path = str(tmp_path / "model.zip")
+    model, stats = distributed.run_local(1, folder, total_timesteps=128, model_path=model_path,
+                                         rollout_steps=64, rollouts_per_update=2)
+    assert model.num_timesteps >= 128
+    assert stats["workers_joined"] == 1 and stats["updates"] >= 1
+    assert (tmp_path / "model.zip").exists()
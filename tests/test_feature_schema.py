@@ -0,0 +1,41 @@
+import pytest
+from feature_schema import DEFAULT_SCHEMA, FEATURES, FeatureSchema, extract_colors
+
+
+def element(element_type, background=None, **style):
+    if background is not None:
+        style["background-color"] = background
+    return {"type": element_type, "id": 1, "attributes": {"style": style}}
+
+
+def snapshot(*elements):
+    return [{"data": {"elements": list(elements)}}]
+
+
+def test_aliases_map_to_the_canonical_element_types():
+    data = snapshot(element("shepherd-header", "rgb(1,2,3)"), element("shepherd_button", "rgb(4,5,6)"))
+    named = DEFAULT_SCHEMA.extract_named(data)
+    assert named["shepherd_header_color"] == [1, 2, 3]
+    assert named["shepherd_button_color"] == [4, 5, 6]
+    assert DEFAULT_SCHEMA.keeps("shepherd-header") and not DEFAULT_SCHEMA.keeps("link")
+
+
+def test_defaults_missing_values_and_last_aggregate():
+    data = snapshot(element("button", "rgb(10,10,10)"), element("button", "rgb(20,20,20)"), element("navbar"))
+    named = DEFAULT_SCHEMA.extract_named(data)
+    assert named["button_color"] == [20, 20, 20]
+    assert named["navbar_color"] == [0, 0, 0]          # present but lacking the property
+    assert named["background_color"] == [0, 0, 0]      # absent: the feature default
+    assert len(extract_colors(data)) == 3 * len(FEATURES)
+
+
+def test_project_keeps_only_schema_properties():
+    projected = DEFAULT_SCHEMA.project(element("shepherd-header", "red", color="blue"))
+    assert projected["type"] == "shepherdHeader"
+    assert projected["attributes"]["style"] == {"background-color": "red"}
+    assert DEFAULT_SCHEMA.project(element("link", "red")) is None
+
+
+def test_unknown_aggregate_is_rejected():
+    with pytest.raises(ValueError):
+        FeatureSchema(features=[dict(FEATURES[0], aggregate="median")])
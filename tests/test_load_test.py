@@ -0,0 +1,19 @@
+from load_test import parse_mix, summarize
+
+
+def test_parse_mix_defaults_weights_to_one():
+    assert parse_mix("/run-rl:1, /scheme/current:4") == (["/run-rl", "/scheme/current"], [1.0, 4.0])
+    assert parse_mix("/run-rl") == (["/run-rl"], [1.0])
+
+
+def test_summarize_counts_errors_and_percentiles():
+    samples = [(i / 1000, i != 50) for i in range(1, 101)]
+    summary = summarize(samples, duration=10.0)
+    assert summary["requests"] == 100 and summary["errors"] == 1
+    assert summary["error_rate"] == 0.01 and summary["throughput_rps"] == 10.0
+    assert summary["latency_ms"]["max"] == 100.0
+    assert summary["latency_ms"]["p50"] == 50.5
+
+
+def test_summarize_without_samples():
+    assert summarize([], duration=5.0) == {"requests": 0, "errors": 0, "error_rate": 0.0, "throughput_rps": 0.0}
@@ -0,0 +1,51 @@
+import memory_budget
+from memory_budget import LOW_WATER, MB, SOFT_LIMIT, BatchSizer, MemoryGovernor
+
+BUDGET = 1000 * MB
+
+
+def governor_at(monkeypatch, rss, limit=8):
+    governor = MemoryGovernor(BUDGET, limit, interval=0)
+    monkeypatch.setattr(memory_budget, "tree_rss", lambda: [rss[0]])
+    return governor
+
+
+def test_governor_halves_over_the_soft_limit_and_grows_back(monkeypatch):
+    rss = [BUDGET * (SOFT_LIMIT + 0.1)]
+    governor = governor_at(monkeypatch, rss)
+    limits = []
+    for _ in range(4):
+        governor._check()
+        limits.append(governor.limit)
+    assert limits == [4, 2, 1, 1]
+    assert governor.throttled == 3
+
+    rss[0] = BUDGET * (LOW_WATER - 0.1)
+    for _ in range(3):
+        governor._check()
+    assert governor.limit == 4
+    rss[0] = BUDGET * (LOW_WATER + SOFT_LIMIT) / 2  # Between the marks: hold
+    governor._check()
+    assert governor.limit == 4
+
+
+def test_governor_without_budget_keeps_its_limit():
+    governor = MemoryGovernor(None, 3)
+    for _ in range(3):
+        governor.acquire()
+    assert governor.in_flight == 3 and governor.limit == 3
+    for _ in range(3):
+        governor.release()
+    assert governor.stats()["budget_mb"] is None
+
+
+def test_batch_sizer_halves_to_minimums_and_doubles_back():
+    sizer = BatchSizer(BUDGET, {"n_steps": 2048, "batch_size": 128}, {"n_steps": 512, "batch_size": 32})
+    high, low = BUDGET * (SOFT_LIMIT + 0.1), BUDGET * (LOW_WATER - 0.1)
+    assert sizer.observe(high) == {"n_steps": 1024, "batch_size": 64}
+    assert sizer.observe(high) == {"n_steps": 512, "batch_size": 32}
+    assert sizer.observe(high) == {"n_steps": 512, "batch_size": 32}
+    assert sizer.observe(BUDGET * (LOW_WATER + SOFT_LIMIT) / 2) == {"n_steps": 512, "batch_size": 32}
+    assert sizer.observe(low) == {"n_steps": 1024, "batch_size": 64}
+    assert sizer.observe(low) == {}
+    assert BatchSizer(None, {"n_steps": 2048}, {"n_steps": 512}).observe(10 * BUDGET) == {}
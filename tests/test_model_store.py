@@ -0,0 +1,93 @@
+import os
+import time
+import pytest
+from model_store import ModelRegistry, ModelStore
+
+
+def publish(store, tmp_path, content):
+    source = tmp_path / f"{content}.zip"
+    source.write_text(content)
+    return store.publish(str(source))
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def test_publish_makes_version_current_and_updates_legacy_copy(tmp_path):
+    store = ModelStore(str(tmp_path / "models"))
+    version = publish(store, tmp_path, "first")
+    assert store.current_version() == version
+    assert store.list_versions() == [version]
+    assert store.metadata(version)["version"] == version
+    assert read(store.legacy_path) == "first"
+
+
+def test_rollback_restores_previous_version(tmp_path):
+    store = ModelStore(str(tmp_path / "models"))
+    first = publish(store, tmp_path, "first")
+    second = publish(store, tmp_path, "second")
+    assert store.current_version() == second
+
+    assert store.rollback() == first
+    assert store.current_version() == first
+    assert read(store.legacy_path) == "first"
+    with pytest.raises(ValueError):
+        store.rollback()
+
+
+def test_prune_keeps_newest_current_and_pinned(tmp_path):
+    store = ModelStore(str(tmp_path / "models"), keep=2)
+    versions = [publish(store, tmp_path, f"model{i}") for i in range(3)]
+    assert store.list_versions() == versions[1:]
+
+    store.pinned.add(versions[1])
+    store.set_current(versions[1])
+    newer = [publish(store, tmp_path, f"model{i}") for i in range(3, 5)]
+    assert store.list_versions() == [versions[1]] + newer
+    assert os.path.exists(store.path(versions[1]))
+
+
+def test_set_current_rejects_unknown_version(tmp_path):
+    store = ModelStore(str(tmp_path / "models"))
+    with pytest.raises(ValueError):
+        store.set_current("v0")
+
+
+def failing_load(site):
+    raise FileNotFoundError(f"No model for {site}")
+
+
+def test_registry_caps_failed_sites():
+    registry = ModelRegistry(failing_load, max_failed=3)
+    for i in range(10):
+        registry.get(f"site{i}", wait=5)
+    assert list(registry.summary()["failed"]) == ["site7", "site8", "site9"]
+    assert registry.stats["load_errors"] == 10
+
+
+def test_registry_expires_failed_sites(monkeypatch):
+    registry = ModelRegistry(failing_load, retry_after=60.0)
+    registry.get("old", wait=5)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 120)
+    registry.get("new", wait=5)
+    assert list(registry.summary()["failed"]) == ["new"]
+
+
+def test_read_only_store_creates_nothing(tmp_path):
+    root = tmp_path / "models"
+    store = ModelStore(str(root), read_only=True)
+    assert store.current_version() is None and store.list_versions() == []
+    assert not root.exists()
+    with pytest.raises(ValueError):
+        publish(store, tmp_path, "first")
+
+
+def test_resolve_model_path_is_read_only(tmp_path, monkeypatch):
+    import offline_eval
+    monkeypatch.setattr(offline_eval, "model_dir", str(tmp_path / "saved_model"))
+    with pytest.raises(FileNotFoundError):
+        offline_eval.resolve_model_path("current")
+    assert not (tmp_path / "saved_model").exists()
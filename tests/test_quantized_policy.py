@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from environment import ColorEnv
+from quantized_policy import PRECISIONS, QuantizedPolicy, actor_nbytes, check_accuracy
+from synth_recordings import write_corpus
+from training import build_model
+
+
+@pytest.fixture(scope="module")
+def model(tmp_path_factory):
+    folder = str(tmp_path_factory.mktemp("recordings"))
+    write_corpus(folder, 5, kind="filtered", compression="none")
+    return build_model(ColorEnv(json_folder=folder), verbose=0, seed=0)
+
+
+@pytest.fixture(scope="module")
+def obs(model):
+    rng = np.random.default_rng(0)
+    low, high = model.observation_space.low, model.observation_space.high
+    return rng.uniform(low, high, size=(256, len(low))).astype(np.float32)
+
+
+@pytest.mark.parametrize("precision", PRECISIONS)
+def test_quantized_actions_match_float32(model, obs, precision):
+    quantized = QuantizedPolicy(model, precision)
+    report = check_accuracy(model, quantized, obs, tolerance=1)
+    assert report["passed"], report
+    assert report["max_action_diff"] < 0.02
+
+
+def test_single_observation_predict_keeps_shape_and_bounds(model, obs):
+    quantized = QuantizedPolicy(model, "int8", seed=0)
+    action, _ = quantized.predict(obs[0])
+    assert action.shape == model.action_space.shape
+    assert np.all(action >= model.action_space.low) and np.all(action <= model.action_space.high)
+
+
+def test_int8_weights_are_smaller(model):
+    assert QuantizedPolicy(model, "int8").nbytes() < actor_nbytes(model) / 2
+
+
+def test_unknown_precision_is_rejected(model):
+    with pytest.raises(ValueError):
+        QuantizedPolicy(model, "int4")
@@ -0,0 +1,111 @@
+import os
+import filter as filter_module
+from dedup import SnapshotIndex
+from filter import filter_all_recordings
+from recording_index import SECONDS_PER_DAY, RecordingIndex, recording_window
+from recordings import dump_recording
+from synth_recordings import write_corpus
+
+NOW = 1732500000.0
+
+
+def add_recording(folder, timestamp):
+    filename = f"recording-{int(timestamp * 1000)}-filtered.json"
+    dump_recording([{"data": {"elements": []}}], os.path.join(folder, filename))
+    return filename
+
+
+def test_select_windows_and_orders_by_time(tmp_path):
+    folder = str(tmp_path)
+    old = add_recording(folder, NOW - 3 * SECONDS_PER_DAY)
+    recent = add_recording(folder, NOW - 3600)
+    newest = add_recording(folder, NOW - 60)
+    index = RecordingIndex(folder)
+    index.sync()
+    assert index.select(last_days=1, now=NOW) == [recent, newest]
+    assert index.select(since=NOW - 4 * SECONDS_PER_DAY, until=NOW - 120, now=NOW) == [old, recent]
+    assert len(index.days()) == 2
+
+
+def test_retention_archives_expired_partitions(tmp_path):
+    folder, archive = str(tmp_path / "recordings"), str(tmp_path / "archive")
+    os.makedirs(folder)
+    old = add_recording(folder, NOW - 10 * SECONDS_PER_DAY)
+    recent = add_recording(folder, NOW - 60)
+    index = RecordingIndex(folder)
+    index.sync()
+    expired = index.apply_retention(7, archive_dir=archive, now=NOW)
+    assert sum(expired.values()) == 1
+    assert sorted(os.listdir(folder)) == [".recording_index.json", recent]
+    day = next(iter(expired))
+    assert os.listdir(os.path.join(archive, day)) == [old]
+    assert RecordingIndex(folder).select(now=NOW) == [recent]
+
+
+def test_window_sees_files_added_after_the_index_was_built(tmp_path):
+    folder = str(tmp_path)
+    first = add_recording(folder, NOW - 60)
+    assert recording_window(folder, since=0) == [first]
+    # Copied in by hand: no writer added it to the index
+    second = add_recording(folder, NOW - 30)
+    assert recording_window(folder, since=0) == [first, second]
+    os.remove(os.path.join(folder, first))
+    assert recording_window(folder, since=0) == [second]
+
+
+def test_filter_script_indexes_what_it_writes(tmp_path, monkeypatch):
+    raw, filtered = str(tmp_path / "raw"), str(tmp_path / "filtered")
+    write_corpus(raw, 3, events=10, compression="none")
+    os.makedirs(filtered)
+    monkeypatch.setattr(filter_module, "recordings_dir", raw)
+    monkeypatch.setattr(filter_module, "filtered_recordings_dir", filtered)
+    filter_all_recordings()
+    # Read the saved index as is, without listing the folder
+    assert sorted(RecordingIndex(filtered).select(since=0)) == sorted(f for f in os.listdir(filtered) if not f.startswith("."))
+
+
+def ingest(folder, timestamp, snapshot_index, recording_index):
+    """Write a recording the way the filter does: only if its snapshot is new."""
+    filename = f"recording-{int(timestamp * 1000)}-filtered.json"
+    events = [{"data": {"elements": []}}]
+    if snapshot_index.add(events, filename):
+        dump_recording(events, os.path.join(folder, filename))
+        recording_index.add(filename)
+    recording_index.redate(snapshot_index.last_seen())
+    recording_index.save()
+    snapshot_index.save()
+    return filename
+
+
+def test_repeated_snapshot_is_dated_by_its_newest_recording(tmp_path):
+    folder = str(tmp_path)
+    snapshots, index = SnapshotIndex(folder), RecordingIndex(folder)
+    stored = ingest(folder, NOW - 10 * SECONDS_PER_DAY, snapshots, index)
+    ingest(folder, NOW - 3600, snapshots, index)
+    assert os.listdir(folder).count(stored) == 1
+    assert RecordingIndex(folder).select(last_days=1, now=NOW) == [stored]
+    assert RecordingIndex(folder).apply_retention(7, now=NOW) == {}
+    assert SnapshotIndex(folder).counts() == {stored: 2}
+
+
+def test_snapshot_dropped_by_retention_is_stored_again(tmp_path):
+    folder = str(tmp_path)
+    snapshots, index = SnapshotIndex(folder), RecordingIndex(folder)
+    old = ingest(folder, NOW - 10 * SECONDS_PER_DAY, snapshots, index)
+    assert sum(RecordingIndex(folder).apply_retention(7, now=NOW).values()) == 1
+    assert SnapshotIndex(folder).snapshots == {}
+
+    new = ingest(folder, NOW - 60, SnapshotIndex(folder), RecordingIndex(folder))
+    assert new != old and os.path.exists(os.path.join(folder, new))
+    assert RecordingIndex(folder).select(last_days=1, now=NOW) == [new]
+
+
+def test_missing_stored_file_counts_as_new(tmp_path):
+    folder = str(tmp_path)
+    snapshots = SnapshotIndex(folder)
+    events = [{"data": {"elements": []}}]
+    assert snapshots.add(events, "recording-1732400000000-filtered.json")
+    # Never written (or removed behind the index's back)
+    assert snapshots.add(events, "recording-1732490000000-filtered.json")
+    assert snapshots.counts() == {}
+    assert snapshots.last_seen() == {"recording-1732490000000-filtered.json": 1732490000.0}
@@ -0,0 +1,38 @@
+import pytest
+import recordings
+from recordings import extract_rgb, dump_recording, load_recording, recording_filename, recording_stem
+
+DATA = [{"timestamp": 1, "data": {"elements": [{"type": "button", "id": 1}]}}]
+
+
+@pytest.mark.parametrize("compression", ["none", "gzip", "zstd"])
+def test_dump_load_round_trip(tmp_path, compression):
+    if compression == "zstd" and recordings.zstandard is None:
+        pytest.skip("zstandard is not installed")
+    filename = recording_filename("recording-1732400000000", compression)
+    assert recording_stem(filename) == "recording-1732400000000"
+    path = str(tmp_path / filename)
+    dump_recording(DATA, path)
+    assert load_recording(path) == DATA
+    if compression != "none":
+        with open(path, 'rb') as f:
+            assert f.read(4) != b'[{"t'
+
+
+def test_unknown_compression_is_rejected():
+    with pytest.raises(ValueError):
+        recording_filename("recording", "lz4")
+
+
+@pytest.mark.parametrize("color, rgb", [
+    ("rgb(1, 2, 3)", [1, 2, 3]),
+    ("rgba(1,2,3,0.5)", [1, 2, 3]),
+    ("#0a0b0c", [10, 11, 12]),
+    ("#abc", [170, 187, 204]),
+    ("#0a0b0cff", [10, 11, 12]),
+    ("hsl(0, 100%, 50%)", [255, 0, 0]),
+    ("hsla(240deg 100% 25% / 0.5)", [0, 0, 128]),
+    (" Navy ", [0, 0, 128]),
+])
+def test_extract_rgb_formats(color, rgb):
+    assert extract_rgb(color) == rgb
@@ -0,0 +1,98 @@
+import copy
+import pytest
+from feature_schema import extract_colors
+from filter import filter_rrweb_data
+from rrweb_replay import DomStateTracker, replay_rrweb_data
+from synth_recordings import generate_raw_recording
+
+
+def element(node_id, tag, classes="", style=None, children=()):
+    attributes = {"class": classes} if classes else {}
+    if style:
+        attributes["style"] = style
+    return {"type": 2, "id": node_id, "tagName": tag, "attributes": attributes, "childNodes": list(children)}
+
+
+def snapshot(root, timestamp=1):
+    return {"type": 2, "timestamp": timestamp, "data": {"node": root}}
+
+
+def mutation(timestamp, **data):
+    return {"type": 3, "timestamp": timestamp, "data": {"source": 0, **data}}
+
+
+COLORS = {"navbar": "rgb(10, 20, 30)", "background": "rgb(40, 50, 60)", "backgroundColor": "rgb(70, 80, 90)",
+          "buttons": [{"backgroundColor": "rgb(1, 1, 1)"}, {"backgroundColor": "rgb(2, 2, 2)"},
+                      {"backgroundColor": "rgb(3, 3, 3)"}]}
+
+
+def both(events, colors):
+    # filter_rrweb_data consumes colors["buttons"], so each path gets its own copy
+    return (filter_rrweb_data(events, copy.deepcopy(colors), {}),
+            replay_rrweb_data(events, copy.deepcopy(colors), {}))
+
+
+@pytest.mark.parametrize("seed", range(25))
+def test_snapshot_rows_match_the_filter(seed):
+    raw = generate_raw_recording(seed, events=40)
+    filtered, replayed = both(raw["events"], raw["colors"])
+    assert extract_colors(replayed[0]) == extract_colors(filtered[0])
+
+
+def test_every_snapshot_matches_the_filter():
+    page = element(1, "html", children=[element(2, "body", style="background-color: #123456", children=[
+        element(3, "nav", style="background-color: red"),
+        element(4, "button", "btn", style="background-color: blue"),
+    ])])
+    events = [snapshot(page, 1), snapshot(copy.deepcopy(page), 2)]
+    filtered, replayed = both(events, COLORS)
+    snapshot_rows = [row for row in replayed if row["timestamp"] in (1, 2)]
+    assert [extract_colors(row) for row in snapshot_rows] == [extract_colors(row) for row in filtered]
+    # The second snapshot's button takes the next reported button color, as in the filter
+    assert extract_colors(snapshot_rows[1])[:3] == [2, 2, 2]
+
+
+def test_mutated_inline_color_overrides_metadata():
+    page = element(1, "html", children=[element(2, "body", children=[element(3, "nav")])])
+    events = [snapshot(page), mutation(2, attributes=[{"id": 3, "attributes": {"style": {"background-color": "#ff0000"}}}])]
+    _, replayed = both(events, COLORS)
+    assert [extract_colors(row)[3:6] for row in replayed] == [[10, 20, 30], [255, 0, 0]]
+
+
+def test_last_element_is_taken_in_document_order_not_by_id():
+    page = element(1, "html", children=[element(2, "body", children=[
+        element(3, "button", "btn"),
+        element(4, "button", "btn"),
+    ])])
+    # Added with a higher id, but inserted before the first button
+    added = element(9, "button", "btn", style="background-color: rgb(200, 200, 200)")
+    events = [snapshot(page), mutation(2, adds=[{"parentId": 2, "nextId": 3, "node": added}])]
+    _, replayed = both(events, COLORS)
+    # Button 4 is still last in the document and keeps the second reported color
+    assert extract_colors(replayed[-1])[:3] == [2, 2, 2]
+
+
+def test_appended_element_becomes_last_and_removal_falls_back():
+    page = element(1, "html", children=[element(2, "body", children=[element(3, "button", "btn")])])
+    added = element(9, "button", "btn", style="background-color: rgb(200, 200, 200)")
+    events = [snapshot(page), mutation(2, adds=[{"parentId": 2, "nextId": None, "node": added}]),
+              mutation(3, removes=[{"parentId": 2, "id": 9}])]
+    _, replayed = both(events, COLORS)
+    assert [extract_colors(row)[:3] for row in replayed] == [[1, 1, 1], [200, 200, 200], [1, 1, 1]]
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_cached_last_elements_match_a_full_search(seed):
+    recording = generate_raw_recording(seed=seed, mutation_ratio=0.8)
+    tracker = DomStateTracker(recording["colors"], recording["font-family"])
+    for event in recording["events"]:
+        if event.get("type") == 2:
+            tracker.load_snapshot(event["data"]["node"])
+        elif event.get("type") == 3 and event["data"].get("source") == 0:
+            tracker.apply_mutation(event["data"])
+        else:
+            continue
+        picked = {e["type"]: e["id"] for e in tracker.elements()}
+        for element_type, ids in tracker.tracked.items():
+            if ids:
+                assert picked[element_type] == max(ids, key=tracker._document_position)
@@ -0,0 +1,68 @@
+import numpy as np
+from samplers import AliasTable, BlockedAliasSampler
+
+
+def frequencies(sample, n, draws=40000, seed=0):
+    rng = np.random.default_rng(seed)
+    counts = np.bincount([sample(rng) for _ in range(draws)], minlength=n)
+    return counts / draws
+
+
+def test_alias_table_matches_weights():
+    weights = np.array([1.0, 0.0, 3.0, 6.0])
+    table = AliasTable(weights)
+    assert np.allclose(frequencies(table.sample, len(weights)), weights / weights.sum(), atol=0.01)
+
+
+def test_blocked_sampler_tracks_adds_and_updates_across_blocks():
+    sampler = BlockedAliasSampler(block_size=4)
+    weights = [1.0, 2.0, 0.0, 1.0, 4.0, 1.0, 0.0, 1.0, 2.0, 3.0]
+    for weight in weights:
+        sampler.add(weight)
+    assert len(sampler) == len(weights)
+    expected = np.array(weights) / sum(weights)
+    assert np.allclose(frequencies(sampler.sample, len(weights)), expected, atol=0.01)
+
+    sampler.update(2, 5.0)
+    weights[2] = 5.0
+    expected = np.array(weights) / sum(weights)
+    assert np.allclose(frequencies(sampler.sample, len(weights), seed=1), expected, atol=0.01)
+
+
+def test_blocked_sampler_falls_back_to_uniform_when_all_weights_are_zero():
+    sampler = BlockedAliasSampler(block_size=2)
+    for _ in range(3):
+        sampler.add(0.0)
+    assert np.allclose(frequencies(sampler.sample, 3, draws=9000), 1 / 3, atol=0.02)
+
+
+def test_small_updates_only_rebuild_their_block():
+    sampler = BlockedAliasSampler(block_size=16)
+    for _ in range(1024):
+        sampler.add(1.0)
+    rng = np.random.default_rng(0)
+    sampler.sample(rng)
+    rebuilds = sampler.top_rebuilds
+    for i in range(0, 1024, 7):
+        sampler.update(i, 1.2)
+        sampler.sample(rng)
+    assert sampler.top_rebuilds == rebuilds
+
+
+def test_sampling_stays_exact_while_bounds_are_stale():
+    sampler = BlockedAliasSampler(block_size=2)
+    weights = [4.0, 4.0, 1.0, 1.0]
+    for weight in weights:
+        sampler.add(weight)
+    sampler.sample(np.random.default_rng(0))
+    # Shrink the first block without growing any other: the top table is kept
+    sampler.update(0, 1.0)
+    weights[0] = 1.0
+    expected = np.array(weights) / sum(weights)
+    assert np.allclose(frequencies(sampler.sample, len(weights)), expected, atol=0.01)
+    assert sampler.top_rebuilds == 1
+
+    # Growing a block past its bound rebuilds the top table
+    sampler.update(3, 10.0)
+    sampler.sample(np.random.default_rng(0))
+    assert sampler.top_rebuilds == 2
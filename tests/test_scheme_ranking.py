@@ -0,0 +1,28 @@
+from scheme_ranking import AdaptiveK
+
+
+def test_k_stays_at_max_without_a_budget():
+    adaptive = AdaptiveK(k_max=16)
+    for _ in range(5):
+        assert adaptive.observe(1000.0) == 16
+
+
+def test_k_halves_over_budget_down_to_min():
+    adaptive = AdaptiveK(k_max=16, budget_ms=10.0, k_min=3)
+    assert [adaptive.observe(50.0) for _ in range(4)] == [8, 4, 3, 3]
+    # The average restarts after each halving
+    assert adaptive.stats()["latency_ms"] is None
+
+
+def test_k_grows_back_under_headroom_up_to_max():
+    adaptive = AdaptiveK(k_max=4, budget_ms=10.0)
+    adaptive.observe(50.0)
+    adaptive.observe(50.0)
+    assert adaptive.current() == 1
+    assert [adaptive.observe(2.0) for _ in range(4)] == [2, 3, 4, 4]
+
+
+def test_k_holds_between_headroom_and_budget():
+    adaptive = AdaptiveK(k_max=8, budget_ms=10.0, headroom=0.7)
+    adaptive.observe(50.0)
+    assert [adaptive.observe(8.0) for _ in range(3)] == [4, 4, 4]
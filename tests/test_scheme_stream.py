@@ -0,0 +1,47 @@
+import threading
+import time
+from scheme_stream import SchemeBroadcaster, parse_last_event_id
+
+
+def test_wait_times_out_with_no_new_events():
+    broadcaster = SchemeBroadcaster()
+    broadcaster.publish({"n": 1})
+    start = time.perf_counter()
+    assert broadcaster.wait(timeout=0.05) == []
+    assert time.perf_counter() - start >= 0.05
+
+
+def test_wait_returns_events_after_last_id():
+    broadcaster = SchemeBroadcaster()
+    for n in range(3):
+        broadcaster.publish({"n": n})
+    assert [e["id"] for e in broadcaster.wait(1, timeout=0)] == [2, 3]
+
+
+def test_wait_wakes_on_publish():
+    broadcaster = SchemeBroadcaster()
+    threading.Timer(0.05, broadcaster.publish, args=({"n": 1},)).start()
+    events = broadcaster.wait(timeout=5)
+    assert [e["data"] for e in events] == [{"n": 1}]
+
+
+def test_id_from_before_a_restart_gets_the_latest_event():
+    broadcaster = SchemeBroadcaster()
+    broadcaster.publish({"n": 1})
+    broadcaster.publish({"n": 2})
+    events = broadcaster.wait(57, timeout=0)
+    assert [e["data"] for e in events] == [{"n": 2}]
+    # Nothing published yet: wait for the next event as usual
+    assert SchemeBroadcaster().wait(57, timeout=0) == []
+
+
+def test_subscriber_cap():
+    broadcaster = SchemeBroadcaster(max_subscribers=1)
+    assert broadcaster.subscribe() and not broadcaster.subscribe()
+    broadcaster.unsubscribe()
+    assert broadcaster.subscribe()
+
+
+def test_parse_last_event_id():
+    assert parse_last_event_id("12") == 12
+    assert parse_last_event_id("abc") is None and parse_last_event_id("") is None
@@ -0,0 +1,83 @@
+import os
+import threading
+import numpy as np
+import shared_corpus
+from feature_schema import extract_colors
+from recordings import load_recording
+from shared_corpus import CorpusWriter, SharedCorpus
+from synth_recordings import write_corpus
+
+
+def corpus_folder(tmp_path, count, seed=0):
+    folder = str(tmp_path)
+    write_corpus(folder, count, seed=seed, kind="filtered", compression="none")
+    return folder
+
+
+def test_update_appends_and_refresh_sees_new_recordings(tmp_path):
+    folder = corpus_folder(tmp_path, 3)
+    writer = CorpusWriter(folder)
+    assert len(writer.update()) == 3
+    corpus = SharedCorpus(folder)
+    assert len(corpus) == 3
+    filename = sorted(corpus.files)[0]
+    rows = load_recording(os.path.join(folder, filename))
+    assert np.array_equal(corpus.rows(filename)[0], extract_colors(rows[0]))
+
+    write_corpus(folder, 2, seed=1, kind="filtered", compression="none", start_ms=1732500000000)
+    assert len(writer.update()) == 2
+    assert len(corpus.refresh()) == 2 and len(corpus) == 5
+    assert corpus.refresh() == []
+
+
+def test_rebuild_keeps_the_previous_data_file_for_one_generation(tmp_path):
+    folder = corpus_folder(tmp_path, 3)
+    writer = CorpusWriter(folder)
+    first = writer.rebuild()["data"]
+    second = writer.rebuild()["data"]
+    data_files = sorted(f for f in os.listdir(writer.corpus_dir) if f.startswith("features-"))
+    assert data_files == sorted([first, second])
+    writer.rebuild()
+    assert first not in os.listdir(writer.corpus_dir)
+
+
+def test_refresh_rereads_the_index_when_its_data_file_is_gone(tmp_path, monkeypatch):
+    folder = corpus_folder(tmp_path, 3)
+    writer = CorpusWriter(folder)
+    stale = writer.rebuild()
+    writer.rebuild()
+    writer.rebuild()  # removes the stale index's data file
+    reads = iter([stale])
+    read_index = shared_corpus._read_index
+    # The first read returns the index as it was before the rebuilds
+    monkeypatch.setattr(shared_corpus, "_read_index", lambda corpus_dir: next(reads, None) or read_index(corpus_dir))
+    corpus = SharedCorpus(folder)
+    assert corpus.generation == stale["generation"] + 2 and len(corpus) == 3
+
+
+def test_readers_keep_working_while_the_corpus_is_rebuilt(tmp_path):
+    folder = corpus_folder(tmp_path, 4)
+    writer = CorpusWriter(folder)
+    writer.rebuild()
+    errors, done = [], threading.Event()
+
+    def read():
+        corpus = SharedCorpus(folder)
+        while not done.is_set():
+            try:
+                corpus.refresh()
+                for filename in list(corpus.files):
+                    assert len(corpus.rows(filename))
+            except Exception as e:
+                errors.append(e)
+                return
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    for _ in range(30):
+        writer.rebuild()
+    done.set()
+    for reader in readers:
+        reader.join()
+    assert errors == []
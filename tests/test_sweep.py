@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+import sweep
+import training
+from environment import ColorEnv
+from synth_recordings import write_corpus
+
+
+@pytest.fixture
+def folder(tmp_path):
+    write_corpus(str(tmp_path), 20, kind="filtered", compression="none")
+    return str(tmp_path)
+
+
+class ZeroModel:
+    def predict(self, obs, deterministic=True):
+        return np.zeros(15, dtype=np.float32), None
+
+
+def test_env_seed_leaves_global_rng_alone(folder):
+    np.random.seed(123)
+    expected = np.random.random()
+    np.random.seed(123)
+    env = ColorEnv(json_folder=folder)
+    env.reset(seed=7)
+    assert np.random.random() == expected
+
+
+def test_seeded_evaluation_is_reproducible(folder):
+    scores = [training.evaluate_model(ZeroModel(), ColorEnv(json_folder=folder), n_episodes=3, seed=5)
+              for _ in range(2)]
+    assert scores[0] == scores[1]
+
+
+def test_trials_are_scored_on_held_out_recordings_with_the_shared_eval_seed(folder, tmp_path, monkeypatch):
+    train_files, holdout_files = training.split_recordings(folder, 0.2)
+    scored = []
+
+    def evaluate(model, env, n_episodes, seed=None):
+        scored.append((list(env.files), seed))
+        return 0.0
+
+    monkeypatch.setattr(training, "evaluate_model", evaluate)
+    for trial_id in range(2):
+        sweep._run_trial(trial_id, {"n_steps": 64, "batch_size": 32, "n_epochs": 1}, 64,
+                         str(tmp_path / f"trial_{trial_id}.zip"), folder, 1, 7 + trial_id, 7,
+                         train_files, holdout_files)
+    assert scored == [(holdout_files, 7), (holdout_files, 7)]
+    assert not set(holdout_files) & set(train_files)
@@ -0,0 +1,26 @@
+import os
+from recordings import list_recordings, load_recording
+from synth_recordings import generate_raw_recording, write_corpus
+
+
+def corpus(folder, seed, **params):
+    write_corpus(folder, 4, seed=seed, compression="none", **params)
+    return {f: load_recording(os.path.join(folder, f)) for f in sorted(list_recordings(folder))}
+
+
+def test_write_corpus_is_deterministic_for_a_seed(tmp_path):
+    first = corpus(str(tmp_path / "a"), seed=3)
+    assert first == corpus(str(tmp_path / "b"), seed=3)
+    assert first != corpus(str(tmp_path / "c"), seed=4)
+    assert len(first) == 4
+
+
+def test_filtered_corpus_is_deterministic_for_a_seed(tmp_path):
+    assert corpus(str(tmp_path / "a"), seed=1, kind="filtered") == corpus(str(tmp_path / "b"), seed=1, kind="filtered")
+
+
+def test_raw_recording_has_snapshot_and_metadata():
+    recording = generate_raw_recording(seed=0)
+    assert recording == generate_raw_recording(seed=0)
+    assert recording["events"][0]["type"] in (2, 4)
+    assert "colors" in recording and "buttons" in recording["colors"]
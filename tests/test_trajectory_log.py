@@ -0,0 +1,55 @@
+import time
+import numpy as np
+from trajectory_log import TrajectoryLog, read_trajectories
+
+
+def record_steps(log, n, recording_prefix="recording", version="v1"):
+    for i in range(n):
+        log.record(np.full(18, i, dtype=np.float32), np.full(15, -i, dtype=np.float32), float(i), version,
+                   f"{recording_prefix}-{i}")
+
+
+def test_record_flush_read_round_trip(tmp_path):
+    log = TrajectoryLog(str(tmp_path), flush_interval=3600)
+    record_steps(log, 5)
+    assert log.flush() is not None
+    log.close()
+    columns = read_trajectories(str(tmp_path))
+    assert columns["reward"].tolist() == [0, 1, 2, 3, 4]
+    assert columns["obs"][3].tolist() == [3.0] * 18 and columns["action"][3].tolist() == [-3.0] * 15
+    assert columns["model_version"].tolist() == ["v1"] * 5
+    assert columns["recording"].tolist() == [f"recording-{i}" for i in range(5)]
+
+
+def test_each_chunk_only_stores_the_strings_it_uses(tmp_path):
+    log = TrajectoryLog(str(tmp_path), flush_interval=3600)
+    record_steps(log, 50, "old")
+    first = log.flush()
+    record_steps(log, 2, "new", version="v2")
+    second = log.flush()
+    log.close()
+    with np.load(second) as chunk:
+        assert sorted(chunk["strings"]) == ["new-0", "new-1", "v2"]
+    with np.load(first) as chunk:
+        assert len(chunk["strings"]) == 51
+    columns = read_trajectories(str(tmp_path))
+    assert columns["recording"].tolist()[-2:] == ["new-0", "new-1"]
+    assert columns["model_version"].tolist()[-2:] == ["v2", "v2"]
+
+
+def test_since_skips_older_chunks_without_opening_them(tmp_path, monkeypatch):
+    log = TrajectoryLog(str(tmp_path), flush_interval=3600)
+    record_steps(log, 3, "old")
+    old = log.flush()
+    time.sleep(0.01)
+    record_steps(log, 3, "new")
+    new = log.flush()
+    log.close()
+    with np.load(new) as chunk:
+        since = float(chunk["time"][0])
+    opened = []
+    load = np.load
+    monkeypatch.setattr(np, "load", lambda path, *args, **kwargs: opened.append(path) or load(path, *args, **kwargs))
+    columns = read_trajectories(str(tmp_path), since=since)
+    assert columns["recording"].tolist() == ["new-0", "new-1", "new-2"]
+    assert opened == [new]
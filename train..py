@@ -2,16 +2,19 @@ import time
 import os
 from stable_baselines3 import PPO
 from environment import ColorEnv
+from callbacks import ConvergenceStopCallback, make_eval_env
+from training import split_recordings
 import subprocess  # Needed to run testing automatically
 
-# Load or create the environment
+# Load or create the environment, keeping a held-out slice of recordings for evaluation
 json_folder = "../Backend/filtered_recordings"
-env = ColorEnv(json_folder=json_folder)
+train_files, holdout_files = split_recordings(json_folder)
+env = ColorEnv(json_folder=json_folder, files=train_files)
 
 # Load the existing model or create a new one
 model_path = "saved_model/ppo_model"
 if os.path.exists(model_path):
-    model = PPO.load(model_path)
+    model = PPO.load(model_path, env=env)
 else:
     model = PPO("MlpPolicy", env, verbose=1)
 
@@ -19,10 +22,17 @@ else:
 train_interval = 36  # Time interval in seconds
 training_epochs = 10000
 
-while True:
+# Stop retraining once the held-out reward has plateaued for `patience` evaluations
+convergence = ConvergenceStopCallback(
+    make_eval_env(json_folder, holdout_files),
+    eval_freq=training_epochs // 2,
+    report_path="saved_model/training_report.json",
+)
+
+while not convergence.converged:
     # Train the model
     print("Training started...")
-    model.learn(total_timesteps=training_epochs)
+    model.learn(total_timesteps=training_epochs, callback=convergence, reset_num_timesteps=False)
     
     # Save the model after training
     model.save(model_path)
@@ -33,3 +43,5 @@ while True:
 
     # Sleep for the train_interval before retraining
     time.sleep(train_interval)
+
+print(f"Model converged, stopping retraining: {convergence.report['stop_reason']}")
@@ -0,0 +1,261 @@
+import os
+import time
+import queue
+import itertools
+import threading
+import multiprocessing
+from shared_corpus import ensure_corpus
+from trajectory_log import TRAJECTORY_LOG_DIR, TrajectoryLog
+
+# Note: torch / stable-baselines3 are only imported inside the worker process, after
+# its CPU affinity and thread limits have been applied.
+
+
+def parse_cpu_set(value):
+    """Parse a CPU list such as '2,3' or '0-3,6' into a set of ints (None/'' -> None)."""
+    if not value:
+        return None
+    cpus = set()
+    for part in str(value).split(','):
+        part = part.strip()
+        if '-' in part:
+            start, end = part.split('-')
+            cpus.update(range(int(start), int(end) + 1))
+        elif part:
+            cpus.add(int(part))
+    return cpus
+
+
+def _limit_resources(cpu_set, torch_threads):
+    if cpu_set and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpu_set)
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(torch_threads)
+
+    import torch
+    torch.set_num_threads(torch_threads)
+    torch.set_num_interop_threads(1)
+
+
+def _command_loop(commands, events, state):
+    """
+    Worker-side handler for debug commands sent by TrainingWorker.request(). Sampling and
+    tracemalloc run in this thread; cProfile sessions are handed to the training callback,
+    since cProfile can only trace the thread that enables it.
+    """
+    from profiling import sample_stacks, collapsed_stacks, tracemalloc_top
+
+    main_thread_id = threading.main_thread().ident
+    while True:
+        command = commands.get()
+        try:
+            if command["type"] == "memory":
+                result = tracemalloc_top(command["seconds"])
+            elif command.get("mode") == "sample":
+                result = collapsed_stacks(sample_stacks(command["seconds"], thread_ids={main_thread_id}))
+            else:
+                state["profile"] = command
+                continue
+            events.put({"type": "command_result", "id": command["id"], "result": result})
+        except Exception as e:
+            events.put({"type": "command_result", "id": command["id"], "error": str(e)})
+
+
+def _worker_main(events, commands, json_folder, model_path, total_timesteps, cpu_set, torch_threads, progress_every,
+                 window=None, ppo_overrides=None):
+    """Entry point of the training process: train, save atomically and report back over `events`."""
+    try:
+        _limit_resources(cpu_set, torch_threads)
+
+        import cProfile
+        from stable_baselines3.common.callbacks import BaseCallback
+        from training import train_until_converged
+        from profiling import cprofile_report
+
+        state = {"profile": None}
+        threading.Thread(target=_command_loop, args=(commands, events, state), daemon=True).start()
+
+        class ProgressCallback(BaseCallback):
+            def __init__(self):
+                super().__init__()
+                self._last_report = 0
+                self._profiler = None
+                self._profile_deadline = 0.0
+
+            def _profile_tick(self):
+                if self._profiler is None:
+                    self._profiler = cProfile.Profile()
+                    self._profile_deadline = time.perf_counter() + state["profile"]["seconds"]
+                    self._profiler.enable()
+                elif time.perf_counter() >= self._profile_deadline:
+                    self._finish_profile()
+
+            def _finish_profile(self):
+                self._profiler.disable()
+                events.put({"type": "command_result", "id": state["profile"]["id"],
+                            "result": cprofile_report(self._profiler)})
+                self._profiler = None
+                state["profile"] = None
+
+            def _on_step(self):
+                # Only a dict lookup per step unless a cProfile session was requested
+                if state["profile"] is not None:
+                    self._profile_tick()
+                if self.num_timesteps - self._last_report >= progress_every:
+                    self._last_report = self.num_timesteps
+                    events.put({"type": "progress", "timesteps": int(self.num_timesteps),
+                                "total_timesteps": total_timesteps, "time": time.time()})
+                return True
+
+            def _on_training_end(self):
+                if self._profiler is not None:
+                    self._finish_profile()
+
+        callbacks = [ProgressCallback()]
+        trajectory_log = None
+        if TRAJECTORY_LOG_DIR:
+            from callbacks import TrajectoryCallback
+            trajectory_log = TrajectoryLog(TRAJECTORY_LOG_DIR, source="train")
+            callbacks.append(TrajectoryCallback(trajectory_log))
+
+        events.put({"type": "started", "pid": os.getpid(), "time": time.time()})
+        try:
+            model, report = train_until_converged(json_folder, total_timesteps=total_timesteps,
+                                                  callbacks=callbacks, verbose=0, **(window or {}),
+                                                  **(ppo_overrides or {}))
+        finally:
+            if trajectory_log is not None:
+                trajectory_log.close()
+
+        # Write to a temporary file first so readers never see a partially written zip
+        os.makedirs(os.path.dirname(model_path) or ".", exist_ok=True)
+        tmp_path = f"{model_path}.{os.getpid()}.tmp.zip"
+        model.save(tmp_path)
+        os.replace(tmp_path, model_path)
+        events.put({"type": "published", "path": model_path, "report": report, "time": time.time()})
+    except Exception as e:
+        events.put({"type": "error", "error": str(e), "time": time.time()})
+
+
+class TrainingWorker:
+    """
+    Run a training cycle in a separate process so PPO's torch threads never compete with
+    the Flask process. Progress and the published model path are sent back over a
+    multiprocessing queue and dispatched to `on_progress` / `on_publish` in a listener thread.
+    """
+
+    def __init__(self, json_folder, model_path="saved_model/ppo_model.zip", total_timesteps=50000,
+                 cpu_set=None, torch_threads=1, progress_every=2048, on_progress=None, on_publish=None,
+                 last_days=None, since=None, ppo_overrides=None):
+        self.json_folder = json_folder
+        # Time window of recordings to train on (see recording_index.py), None for all of them
+        self.window = {"last_days": last_days, "since": since}
+        # PPO parameters overriding training.PPO_PARAMS for the next start() (e.g. smaller batches)
+        self.ppo_overrides = dict(ppo_overrides or {})
+        self.model_path = model_path
+        self.total_timesteps = total_timesteps
+        self.cpu_set = parse_cpu_set(cpu_set) if isinstance(cpu_set, str) else cpu_set
+        self.torch_threads = torch_threads
+        self.progress_every = progress_every
+        self.on_progress = on_progress
+        self.on_publish = on_publish
+
+        self.status = {"state": "idle"}
+        self._ctx = multiprocessing.get_context("spawn")
+        self._events = None
+        self._commands = None
+        self._pending = {}
+        self._command_ids = itertools.count(1)
+        self._process = None
+        self._listener = None
+        self._done = threading.Event()
+
+    def start(self):
+        if self.is_running():
+            raise RuntimeError("Training worker is already running")
+        self._done.clear()
+        # The worker's envs map the shared corpus instead of parsing every recording
+        ensure_corpus(self.json_folder)
+        self._events = self._ctx.Queue()
+        self._commands = self._ctx.Queue()
+        self._process = self._ctx.Process(
+            target=_worker_main,
+            args=(self._events, self._commands, self.json_folder, self.model_path, self.total_timesteps,
+                  self.cpu_set, self.torch_threads, self.progress_every, self.window, self.ppo_overrides),
+            daemon=True,
+        )
+        self._process.start()
+        self.status = {"state": "starting", "pid": self._process.pid, "started_at": time.time()}
+        self._listener = threading.Thread(target=self._listen, daemon=True)
+        self._listener.start()
+        return self
+
+    def is_running(self):
+        return self._process is not None and self._process.is_alive()
+
+    def wait(self, timeout=None):
+        """Block until the worker has published a model or failed. Returns the final status."""
+        self._done.wait(timeout)
+        return self.status
+
+    def request(self, command, timeout=60.0):
+        """
+        Send a debug command ({"type": "profile", "mode": "sample"|"cprofile", "seconds": n}
+        or {"type": "memory", "seconds": n}) to the running worker and wait for its result.
+        """
+        if not self.is_running():
+            raise RuntimeError("Training worker is not running")
+        command_id = next(self._command_ids)
+        waiter = {"done": threading.Event()}
+        self._pending[command_id] = waiter
+        self._commands.put({**command, "id": command_id})
+        if not waiter["done"].wait(timeout):
+            self._pending.pop(command_id, None)
+            raise TimeoutError("Training worker did not answer in time")
+        if "error" in waiter["response"]:
+            raise RuntimeError(waiter["response"]["error"])
+        return waiter["response"]["result"]
+
+    def _listen(self):
+        while True:
+            try:
+                event = self._events.get(timeout=1.0)
+            except queue.Empty:
+                if not self._process.is_alive():
+                    self.status = {**self.status, "state": "error",
+                                   "error": f"worker exited with code {self._process.exitcode}"}
+                    break
+                continue
+
+            if event["type"] == "command_result":
+                waiter = self._pending.pop(event["id"], None)
+                if waiter is not None:
+                    waiter["response"] = event
+                    waiter["done"].set()
+            elif event["type"] == "started":
+                self.status = {**self.status, "state": "training"}
+            elif event["type"] == "progress":
+                self.status = {**self.status, "state": "training", "timesteps": event["timesteps"],
+                               "total_timesteps": event["total_timesteps"]}
+                if self.on_progress:
+                    self.on_progress(event)
+            elif event["type"] == "published":
+                self.status = {**self.status, "state": "published", "model_path": event["path"],
+                               "report": event["report"], "finished_at": event["time"]}
+                if self.on_publish:
+                    try:
+                        self.on_publish(event["path"])
+                    except Exception as e:
+                        print(f"Error publishing trained model: {e}")
+                break
+            elif event["type"] == "error":
+                self.status = {**self.status, "state": "error", "error": event["error"]}
+                print(f"Error during training: {event['error']}")
+                break
+
+        self._process.join(timeout=10)
+        for waiter in self._pending.values():
+            waiter["response"] = {"error": "Training worker exited"}
+            waiter["done"].set()
+        self._pending.clear()
+        self._done.set()
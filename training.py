@@ -0,0 +1,84 @@
+import random
+import numpy as np
+from stable_baselines3 import PPO
+from environment import ColorEnv, list_recordings
+from recording_index import recording_window
+from callbacks import ConvergenceStopCallback, make_eval_env
+
+# Default PPO configuration shared by the training loops and the sweep runner
+PPO_PARAMS = {
+    "n_steps": 4096,
+    "batch_size": 128,
+    "n_epochs": 20,
+    "learning_rate": 1e-4,
+    "gamma": 0.995,
+    "gae_lambda": 0.95,
+    "clip_range": 0.2,
+}
+
+
+def build_model(env, verbose=1, **overrides):
+    """Create a PPO model on `env` using PPO_PARAMS, with optional overrides."""
+    params = dict(PPO_PARAMS)
+    params.update(overrides)
+    return PPO(policy="MlpPolicy", env=env, verbose=verbose, **params)
+
+
+def evaluate_model(model, env, n_episodes=10, max_steps=64, deterministic=True, seed=None):
+    """
+    Run `n_episodes` episodes (capped at `max_steps` steps) and return the mean episode
+    reward. With `seed` the first reset seeds the env, so the episodes are reproducible.
+    """
+    episode_rewards = []
+    for episode in range(n_episodes):
+        obs, _ = env.reset(seed=seed if episode == 0 else None)
+        total_reward = 0.0
+        for _ in range(max_steps):
+            action, _ = model.predict(obs, deterministic=deterministic)
+            obs, reward, terminated, truncated, _ = env.step(action)
+            total_reward += reward
+            if terminated or truncated:
+                break
+        episode_rewards.append(total_reward)
+    return float(np.mean(episode_rewards))
+
+
+def split_recordings(json_folder, holdout_fraction=0.1, seed=0, files=None):
+    """Split the recordings in `json_folder` (or `files`) into (train_files, holdout_files) with a seeded shuffle."""
+    files = sorted(list_recordings(json_folder) if files is None else files)
+    random.Random(seed).shuffle(files)
+    n_holdout = max(1, int(len(files) * holdout_fraction)) if len(files) > 1 else 0
+    return files[n_holdout:], files[:n_holdout]
+
+
+def train_until_converged(json_folder, total_timesteps=50000, holdout_fraction=0.1, eval_freq=4096,
+                          min_delta=0.05, patience=3, report_path="saved_model/training_report.json",
+                          sampler=None, callbacks=None, verbose=1, last_days=None, since=None, **overrides):
+    """
+    Train a fresh model on all but a held-out slice of `json_folder` (optionally only its
+    recordings of the last `last_days` days / since `since`), stopping early once the
+    held-out reward plateaus. Returns (model, report).
+    """
+    files = None
+    if last_days is not None or since is not None:
+        files = recording_window(json_folder, last_days=last_days, since=since)
+        if not files:
+            raise ValueError(f"No recordings in {json_folder} within the training window")
+    train_files, holdout_files = split_recordings(json_folder, holdout_fraction, files=files)
+    env = ColorEnv(json_folder=json_folder, files=train_files, sampler=sampler)
+    model = build_model(env, verbose=verbose, **overrides)
+
+    callbacks = list(callbacks or [])
+    if not holdout_files:
+        model.learn(total_timesteps=total_timesteps, callback=callbacks or None)
+        return model, None
+
+    callback = ConvergenceStopCallback(
+        make_eval_env(json_folder, holdout_files),
+        eval_freq=eval_freq,
+        min_delta=min_delta,
+        patience=patience,
+        report_path=report_path,
+    )
+    model.learn(total_timesteps=total_timesteps, callback=[callback] + callbacks)
+    return model, callback.report
@@ -0,0 +1,199 @@
+import os
+import re
+import glob
+import time
+import argparse
+import threading
+import numpy as np
+
+# Directory trajectory chunks are written to; unset disables logging
+TRAJECTORY_LOG_DIR = os.getenv('TRAJECTORY_LOG_DIR')
+TRAJECTORY_LOG_CAPACITY = int(os.getenv('TRAJECTORY_LOG_CAPACITY', '8192'))
+
+OBS_DIM = 18
+ACTION_DIM = 15
+
+# <source>-<pid>-<first ms>-<last ms>-<chunk>.npz; chunks written before the last time
+# was added to the name only carry the first one
+CHUNK_TIMES_PATTERN = re.compile(r'-(\d{13})(?:-(\d{13}))?-\d{6}\.npz$')
+
+
+class TrajectoryLog:
+    """
+    Records (observation, action, reward, model version, source recording) steps into
+    preallocated NumPy ring-buffer columns; a record() call is a few row assignments
+    under a lock. A background thread writes the rows recorded since its last pass to
+    a compressed .npz chunk every `flush_interval` seconds, or as soon as the buffer is
+    half full. If the writer falls more than `capacity` rows behind, the oldest unwritten
+    rows are overwritten and counted in `dropped`. Strings (versions, recordings) are
+    stored as int32 codes plus a lookup table of the strings the chunk uses; the codes
+    start over after every chunk, so the table doesn't grow with every string ever seen.
+    """
+
+    def __init__(self, directory, source="serve", capacity=TRAJECTORY_LOG_CAPACITY, flush_interval=5.0,
+                 obs_dim=OBS_DIM, action_dim=ACTION_DIM):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.source = source
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.time = np.zeros(capacity, dtype=np.float64)
+        self.obs = np.zeros((capacity, obs_dim), dtype=np.float32)
+        self.action = np.zeros((capacity, action_dim), dtype=np.float32)
+        self.reward = np.zeros(capacity, dtype=np.float32)
+        self.model_version = np.zeros(capacity, dtype=np.int32)
+        self.recording = np.zeros(capacity, dtype=np.int32)
+        self.strings = {"": 0}
+        self.written = 0      # Rows recorded so far
+        self.flushed = 0      # Rows handed to the writer so far
+        self.dropped = 0
+        self.chunks = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"trajectory-log-{source}", daemon=True)
+        self._thread.start()
+
+    def _code(self, value):
+        code = self.strings.get(value)
+        if code is None:
+            code = self.strings[value] = len(self.strings)
+        return code
+
+    def record(self, obs, action, reward, model_version="", recording=""):
+        with self._lock:
+            i = self.written % self.capacity
+            self.time[i] = time.time()
+            self.obs[i] = obs
+            self.action[i] = action
+            self.reward[i] = reward
+            self.model_version[i] = self._code(model_version or "")
+            self.recording[i] = self._code(recording or "")
+            self.written += 1
+            pending = self.written - self.flushed
+        if pending >= self.capacity // 2 and not self._wake.is_set():
+            self._wake.set()
+
+    def _take(self):
+        """Copy out the rows not yet flushed (oldest first) and mark them flushed."""
+        with self._lock:
+            start, end = self.flushed, self.written
+            if end - start > self.capacity:
+                self.dropped += end - start - self.capacity
+                start = end - self.capacity
+            self.flushed = end
+            if start == end:
+                return None
+            rows = np.arange(start, end) % self.capacity
+            # Re-encode the codes in use as indexes into this chunk's own table
+            by_code = np.array(sorted(self.strings, key=self.strings.get))
+            used, codes = np.unique(np.concatenate([self.model_version[rows], self.recording[rows]]),
+                                    return_inverse=True)
+            # Every recorded row has been taken, so no pending row refers to the old codes
+            self.strings = {"": 0}
+            return {
+                "time": self.time[rows], "obs": self.obs[rows], "action": self.action[rows],
+                "reward": self.reward[rows], "model_version": codes[:len(rows)].astype(np.int32),
+                "recording": codes[len(rows):].astype(np.int32), "strings": by_code[used],
+            }
+
+    def flush(self):
+        """Write the pending rows as one chunk now; returns its path (None if nothing was pending)."""
+        columns = self._take()
+        if columns is None:
+            return None
+        # The first time is rounded down and the last one up, so the range covers every row
+        first_ms, last_ms = int(columns['time'][0] * 1000), int(np.ceil(columns['time'][-1] * 1000))
+        name = f"{self.source}-{os.getpid()}-{first_ms}-{last_ms}-{self.chunks:06d}.npz"
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, **columns)
+        os.replace(tmp_path, path)
+        self.chunks += 1
+        return path
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error writing trajectory chunk: {e}")
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=10)
+        self.flush()
+
+    def stats(self):
+        return {"recorded": self.written, "pending": self.written - self.flushed, "dropped": self.dropped,
+                "chunks": self.chunks, "directory": self.directory}
+
+
+def read_trajectories(directory, source=None, since=None, until=None):
+    """
+    Concatenate the chunks in `directory` (optionally only `source`'s) into one dict of
+    columns, decoding model_version / recording back to strings. `since` / `until`
+    (epoch seconds) skip whole chunks by the time range in their filename before
+    filtering rows.
+    """
+    columns = {"time": [], "obs": [], "action": [], "reward": [], "model_version": [], "recording": []}
+    for path in sorted(glob.glob(os.path.join(directory, f"{source or '*'}-*.npz"))):
+        match = CHUNK_TIMES_PATTERN.search(os.path.basename(path))
+        if match is None:
+            continue
+        first_ms, last_ms = match.group(1), match.group(2)
+        if until is not None and int(first_ms) / 1000 >= until:
+            continue
+        if since is not None and last_ms is not None and int(last_ms) / 1000 < since:
+            continue
+        with np.load(path) as chunk:
+            keep = np.ones(len(chunk["time"]), dtype=bool)
+            if since is not None:
+                keep &= chunk["time"] >= since
+            if until is not None:
+                keep &= chunk["time"] < until
+            for name in ("time", "obs", "action", "reward"):
+                columns[name].append(chunk[name][keep])
+            for name in ("model_version", "recording"):
+                columns[name].append(chunk["strings"][chunk[name][keep]])
+    if not columns["time"]:
+        return {"time": np.zeros(0), "obs": np.zeros((0, OBS_DIM), dtype=np.float32),
+                "action": np.zeros((0, ACTION_DIM), dtype=np.float32), "reward": np.zeros(0, dtype=np.float32),
+                "model_version": np.array([], dtype=str), "recording": np.array([], dtype=str)}
+    return {name: np.concatenate(parts) for name, parts in columns.items()}
+
+
+def to_dataframe(columns):
+    """One row per step, with obs_0.. / action_0.. columns, for analysis in pandas."""
+    import pandas as pd
+
+    frame = pd.DataFrame({
+        "time": pd.to_datetime(columns["time"], unit="s"),
+        "reward": columns["reward"],
+        "model_version": columns["model_version"],
+        "recording": columns["recording"],
+    })
+    obs = pd.DataFrame(columns["obs"], columns=[f"obs_{i}" for i in range(columns["obs"].shape[1])])
+    action = pd.DataFrame(columns["action"], columns=[f"action_{i}" for i in range(columns["action"].shape[1])])
+    return pd.concat([frame, obs, action], axis=1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize logged trajectories.")
+    parser.add_argument("directory", nargs="?", default=TRAJECTORY_LOG_DIR or "./trajectories")
+    parser.add_argument("--source", default=None, help="only chunks from this source (serve, train)")
+    parser.add_argument("--since", type=float, default=None, help="epoch seconds")
+    parser.add_argument("--csv", default=None, help="write all steps to this CSV file")
+    args = parser.parse_args()
+
+    frame = to_dataframe(read_trajectories(args.directory, args.source, args.since))
+    print(f"{len(frame)} steps")
+    if len(frame):
+        print(frame.groupby("model_version")["reward"].describe())
+        print(frame.groupby("recording")["reward"].agg(["count", "mean"]).sort_values("mean").head(10))
+    if args.csv:
+        frame.to_csv(args.csv, index=False)